@@ -0,0 +1,56 @@
+"""
+bench_batch.py: Throughput of `batch.parse_from_corpora` as the number of workers grows.
+
+Usage:
+    python benchmarks/bench_batch.py
+    python benchmarks/bench_batch.py --documents 1000000 --workers 1 2 4 8
+"""
+import os
+import time
+import random
+import argparse
+
+from uk_postcodes_parsing.batch import parse_from_corpora
+
+WORDS = "please send the parcel to our office at or return it before friday".split()
+POSTCODES = ["EC1R 1UB", "e3 4ss", "SW1A 2AA", "eh16 50y", "HA0 1AQ", "ecir iub"]
+
+
+def documents(n: int, seed: int = 0):
+    """Yield `n` short documents, each mentioning one or two postcodes."""
+    rng = random.Random(seed)
+    for _ in range(n):
+        words = rng.choices(WORDS, k=30)
+        for _ in range(rng.randint(1, 2)):
+            words.insert(rng.randrange(len(words)), rng.choice(POSTCODES))
+        yield " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--chunksize", type=int, default=500)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()]
+    )
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'docs/s':>12} {'speed-up':>9}")
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        start = time.perf_counter()
+        results = parse_from_corpora(
+            documents(args.documents),
+            attempt_fix=True,
+            workers=workers,
+            chunksize=args.chunksize,
+        )
+        for _ in results:
+            pass
+        rate = args.documents / (time.perf_counter() - start)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>12,.0f} {rate / baseline:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
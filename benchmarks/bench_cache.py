@@ -0,0 +1,76 @@
+"""
+bench_cache.py: `parse_from_corpus` throughput with and without the memoization cache.
+
+The corpus draws postcodes from a Zipf-like distribution, so a few strings (letterheads,
+footers, regular customers) account for most occurrences, as in real OCR batches.
+
+Usage:
+    python benchmarks/bench_cache.py
+    python benchmarks/bench_cache.py --documents 50000 --distinct 20000 --maxsize 4096
+"""
+import time
+import random
+import logging
+import argparse
+
+from uk_postcodes_parsing import cache
+from uk_postcodes_parsing.ukpostcode import parse_from_corpus
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+WORDS = "please send the parcel to our office at or return it before friday".split()
+
+
+def noisy_postcode(rng: random.Random) -> str:
+    """A random postcode, sometimes with OCR mistakes (0/O, 1/I) and lower case."""
+    outcode = rng.choice(LETTERS) + rng.choice(LETTERS) + str(rng.randint(1, 99))
+    postcode = (
+        f"{outcode} {rng.randint(0, 9)}{rng.choice(LETTERS)}{rng.choice(LETTERS)}"
+    )
+    if rng.random() < 0.3:
+        postcode = postcode.replace("0", "O").replace("1", "I")
+    return postcode.lower() if rng.random() < 0.3 else postcode
+
+
+def corpus(documents: int, distinct: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    pool = [noisy_postcode(rng) for _ in range(distinct)]
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    texts = []
+    for _ in range(documents):
+        words = rng.choices(WORDS, k=20) + rng.choices(pool, weights, k=3)
+        rng.shuffle(words)
+        texts.append(" ".join(words))
+    return texts
+
+
+def run(texts: list) -> float:
+    start = time.perf_counter()
+    for text in texts:
+        parse_from_corpus(text, attempt_fix=True)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--documents", type=int, default=20_000)
+    parser.add_argument("--distinct", type=int, default=5_000)
+    parser.add_argument("--maxsize", type=int, default=65536)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)  # Per-call logging would dominate both runs
+
+    texts = corpus(args.documents, args.distinct)
+    uncached = run(texts)
+    cache.enable_cache(args.maxsize)
+    cached = run(texts)
+    info = cache.cache_info()["parse"]
+    cache.disable_cache()
+
+    print(f"{args.documents:,} documents, {args.distinct:,} distinct postcodes")
+    print(f"hit rate: {info.hits / (info.hits + info.misses):.1%}, {info}")
+    print(f"{'cache':<10} {'docs/s':>10}")
+    print(f"{'disabled':<10} {uncached:>10,.0f}")
+    print(f"{'enabled':<10} {cached:>10,.0f}  ({cached / uncached:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+bench_directory.py: Compare the binary postcode directory against a Python set literal.
+
+Measures, each in a fresh interpreter:
+    - RSS added by loading the directory, and after running the lookups
+    - time to load the directory
+    - membership lookup latency (hits and misses)
+
+Usage:
+    python benchmarks/bench_directory.py            # synthetic directory of 1.8M postcodes
+    python benchmarks/bench_directory.py --size 200000
+    python benchmarks/bench_directory.py --data src/uk_postcodes_parsing/data/postcodes.bin
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+from uk_postcodes_parsing.directory import PostcodeDirectory, write_directory
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+OUTCODE_FORMATS = ("LN", "LNN", "LNL", "LLN", "LLNN", "LLNL")
+
+WORKER = r"""
+import sys, json, time, random
+
+def rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+mode, location, queries = sys.argv[1], sys.argv[2], json.load(open(sys.argv[3]))
+from uk_postcodes_parsing.directory import PostcodeDirectory
+before = rss()
+start = time.perf_counter()
+if mode == "set":
+    sys.path.insert(0, location)
+    from postcodes_set import POSTCODES as directory
+else:
+    directory = PostcodeDirectory(location)
+load = time.perf_counter() - start
+after = rss()
+start = time.perf_counter()
+found = sum(postcode in directory for postcode in queries)
+lookup = (time.perf_counter() - start) / len(queries)
+touched = rss()
+print(json.dumps({
+    "rss": after - before, "rss_touched": touched - before,
+    "load": load, "lookup": lookup, "found": found,
+}))
+"""
+
+
+def random_postcodes(n: int, seed: int = 0) -> list:
+    """Generate `n` distinct, well-formed (not necessarily real) postcodes."""
+    rng = random.Random(seed)
+    postcodes = set()
+    while len(postcodes) < n:
+        fmt = rng.choice(OUTCODE_FORMATS)
+        outcode = "".join(
+            rng.choice(LETTERS) if c == "L" else rng.choice("0123456789") for c in fmt
+        )
+        incode = rng.choice("0123456789") + rng.choice(LETTERS) + rng.choice(LETTERS)
+        postcodes.add(f"{outcode} {incode}")
+    return list(postcodes)
+
+
+def run(mode: str, location: str, queries_path: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", WORKER, mode, location, queries_path],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--data", help="Existing binary directory to benchmark")
+    parser.add_argument("--size", type=int, default=1_800_000)
+    parser.add_argument("--queries", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.data:
+            postcodes = list(PostcodeDirectory(args.data))
+        else:
+            postcodes = random_postcodes(args.size)
+        binary = os.path.join(tmp, "postcodes.bin")
+        write_directory(postcodes, binary)
+        with open(os.path.join(tmp, "postcodes_set.py"), "w") as f:
+            f.write(f"POSTCODES = {set(postcodes)}")
+
+        rng = random.Random(1)
+        misses = random_postcodes(args.queries // 2, seed=2)
+        queries = rng.sample(postcodes, args.queries // 2) + misses
+        rng.shuffle(queries)
+        queries_path = os.path.join(tmp, "queries.json")
+        Path(queries_path).write_text(json.dumps(queries))
+
+        # First import compiles the set literal; report the cached (.pyc) import
+        run("set", tmp, queries_path)
+        results = {
+            "set": run("set", tmp, queries_path),
+            "binary": run("binary", binary, queries_path),
+        }
+
+    assert results["set"]["found"] == results["binary"]["found"]
+    print(f"{len(postcodes):,} postcodes, {len(queries):,} lookups (50% hits)")
+    print(
+        f"{'backend':<8} {'RSS (MB)':>10} {'RSS used (MB)':>14}"
+        f" {'load (ms)':>10} {'lookup (us)':>12}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<8} {result['rss'] / 2**20:>10.1f}"
+            f" {result['rss_touched'] / 2**20:>14.1f}"
+            f" {result['load'] * 1e3:>10.1f} {result['lookup'] * 1e6:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
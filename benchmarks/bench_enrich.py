@@ -0,0 +1,82 @@
+"""
+bench_enrich.py: Compare `enrich` against a pandas merge on normalised postcode strings.
+
+The merge is the usual notebook approach: normalise the column with `to_normalised`
+row by row, then merge it with a DataFrame of the directory and its attributes. `enrich`
+normalises and joins on encoded postcodes, `chunk_size` rows at a time.
+
+Usage:
+    python benchmarks/bench_enrich.py --rows 1000000
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from corpus import ocr_noise, sample_postcodes  # noqa: E402
+from uk_postcodes_parsing.country import COUNTRIES, get_countries  # noqa: E402
+from uk_postcodes_parsing.directory import get_directory  # noqa: E402
+from uk_postcodes_parsing.enrich import enrich  # noqa: E402
+from uk_postcodes_parsing.geo import get_coordinates  # noqa: E402
+from uk_postcodes_parsing.postcode_utils import to_normalised  # noqa: E402
+
+
+def merge(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    directory = get_directory()
+    coordinates = get_coordinates()
+    positions = np.arange(len(directory))
+    latitudes, longitudes = coordinates.arrays()
+    attributes = pd.DataFrame(
+        {
+            "key": list(directory),
+            "country": np.array(COUNTRIES, dtype=object)[
+                get_countries().indices(positions)
+            ],
+            "latitude": latitudes,
+            "longitude": longitudes,
+        }
+    )
+    keys = df[column].map(lambda value: to_normalised(value) if value else None)
+    return df.assign(key=keys).merge(attributes, on="key", how="left")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    postcodes = [
+        ocr_noise(postcode, rng, rate=0.1, confusions={})
+        for postcode in sample_postcodes(args.rows, rng)
+    ]
+    df = pd.DataFrame({"id": np.arange(args.rows), "postcode": postcodes})
+
+    attributes = ("country", "latitude", "longitude")
+    start = time.perf_counter()
+    enriched = enrich(df, "postcode", attributes, chunk_size=args.chunk_size)
+    enrich_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    merged = merge(df, "postcode")
+    merge_seconds = time.perf_counter() - start
+    assert (
+        enriched["postcode_country"].fillna("").tolist()
+        == merged["country"].fillna("").tolist()
+    )
+
+    print(f"{args.rows:,} rows")
+    print(f"{'method':<8} {'total (s)':>10} {'per row (us)':>13}")
+    for name, seconds in (("enrich", enrich_seconds), ("merge", merge_seconds)):
+        print(f"{name:<8} {seconds:>10.2f} {seconds / args.rows * 1e6:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
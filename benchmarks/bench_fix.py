@@ -0,0 +1,121 @@
+"""
+bench_fix.py: `fix` and `fix_with_options` with the outcode correction table vs patterns.
+
+The patterns coerce the raw outward code into every LNL/LNN/LLN or LLNL/LLNN shape and
+check each with a regex, so they also return outcodes that don't exist. The table maps
+every raw outward code OCR can produce from a real outcode to those outcodes, so a fix is
+one dictionary lookup. By default the outcodes are synthetic (~3,000, like the ONS
+directory); --directory uses the outcodes of the packaged directory.
+
+Usage:
+    python benchmarks/bench_fix.py
+    python benchmarks/bench_fix.py --outcodes 3000 --queries 100000
+    python benchmarks/bench_fix.py --directory
+"""
+import json
+import random
+import timeit
+import argparse
+import tempfile
+from pathlib import Path
+
+from uk_postcodes_parsing import registry
+from uk_postcodes_parsing.registry import MANIFEST_NAME
+from uk_postcodes_parsing.directory import get_directory
+from uk_postcodes_parsing.fix import LOOKALIKES, correction_table, fix, fix_with_options
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+OUTCODE_FORMATS = ("LN", "LNN", "LNL", "LLN", "LLNN", "LLNL")
+
+
+def random_outcodes(n: int, seed: int = 0) -> list:
+    """Generate `n` distinct, well-formed (not necessarily real) outcodes."""
+    rng = random.Random(seed)
+    outcodes = set()
+    while len(outcodes) < n:
+        outcodes.add(
+            "".join(
+                rng.choice(LETTERS) if c == "L" else rng.choice("0123456789")
+                for c in rng.choice(OUTCODE_FORMATS)
+            )
+        )
+    return sorted(outcodes)
+
+
+def noisy_postcodes(outcodes: list, n: int, seed: int = 0) -> list:
+    """Postcodes of `outcodes` with look-alike characters swapped, as OCR does."""
+    rng = random.Random(seed)
+    postcodes = []
+    for _ in range(n):
+        postcode = f"{rng.choice(outcodes)} {rng.randint(0, 9)}{rng.choice('AIO')}B"
+        postcodes.append(
+            "".join(
+                LOOKALIKES[c] if c in LOOKALIKES and rng.random() < 0.5 else c
+                for c in postcode
+            )
+        )
+    return postcodes
+
+
+def release_with(corrections, data_dir: Path) -> registry.Snapshot:
+    """A release holding only a correction table (or none), enough for `fix`."""
+    data_dir.mkdir()
+    (data_dir / MANIFEST_NAME).write_text(json.dumps({"release": "bench"}))
+    if corrections is not None:
+        data = {"release": "bench", "corrections": corrections}
+        (data_dir / "corrections.json").write_text(json.dumps(data))
+    return registry.Snapshot(data_dir)
+
+
+def per_call(func, inputs, repeat: int = 5) -> float:
+    """Best time over `inputs`, in microseconds per call."""
+    best = min(
+        timeit.repeat(lambda: [func(x) for x in inputs], number=1, repeat=repeat)
+    )
+    return best / len(inputs) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--outcodes", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=50_000)
+    parser.add_argument("--directory", action="store_true")
+    args = parser.parse_args()
+
+    if args.directory:
+        outcodes = get_directory().outcodes()
+    else:
+        outcodes = random_outcodes(args.outcodes)
+    real = set(outcodes)
+    queries = noisy_postcodes(outcodes, args.queries)
+    table = correction_table(outcodes)
+    print(f"{len(outcodes):,} outcodes, {len(table):,} raw outward codes in the table")
+
+    print(
+        f"{'mode':<8} {'fix us':>8} {'options us':>11} {'options':>8} "
+        f"{'real outcodes':>14} {'fix is real':>12}"
+    )
+    previous = registry.current()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for mode, corrections in [("patterns", None), ("table", table)]:
+            # Also drops the results cached in the previous mode
+            snapshot = release_with(corrections, Path(temp_dir) / mode)
+            registry.activate(snapshot, warm=False)
+            options = [fix_with_options(query) for query in queries]
+            count = sum(map(len, options))
+            valid = sum(
+                option.split()[0] in real for found in options for option in found
+            )
+            fixed = [fix(query).split()[0] in real for query in queries]
+            print(
+                f"{mode:<8} {per_call(fix, queries):>8.3f} "
+                f"{per_call(fix_with_options, queries):>11.3f} "
+                f"{count / len(queries):>8.2f} {valid / max(count, 1):>14.1%} "
+                f"{sum(fixed) / len(fixed):>12.1%}"
+            )
+
+    registry.activate(previous, warm=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+bench_parse.py: Per-postcode parse latency of the single-pass parser vs the original one.
+
+The original `_parse` called `to_normalised`, `to_incode`, `to_outcode`, ... each of which
+re-validated and re-sanitized the postcode. It is reproduced below as `legacy_parse`.
+
+Usage:
+    python benchmarks/bench_parse.py
+    python benchmarks/bench_parse.py --number 200000
+"""
+import re
+import argparse
+import timeit
+
+from uk_postcodes_parsing.postcode_utils import to_components
+
+DISTRICT_SPLIT_REGEX = re.compile(r"^([a-z]{1,2}\d)([a-z])$", re.I)
+UNIT_REGEX = re.compile(r"[a-z]{2}$", re.I)
+INCODE_REGEX = re.compile(r"\d[a-z]{2}$", re.I)
+POSTCODE_REGEX = re.compile(r"^[a-z]{1,2}\d[a-z\d]?\s*\d[a-z]{2}$", re.I)
+AREA_REGEX = re.compile(r"^[a-z]{1,2}", re.I)
+
+POSTCODES = ["EC1R 1UB", "e3 4ss", "AA9A 9AA", "A99 9AA", "SW1A2AA", "eh16   5ay"]
+
+
+# The original postcode_utils functions
+def sanitize(string):
+    return string.replace(" ", "").upper()
+
+
+def is_valid(postcode):
+    return re.match(POSTCODE_REGEX, postcode) is not None
+
+
+def to_outcode(postcode):
+    if not is_valid(postcode):
+        return None
+    return re.sub(INCODE_REGEX, "", sanitize(postcode))
+
+
+def to_incode(postcode):
+    if not is_valid(postcode):
+        return None
+    incode = re.findall(INCODE_REGEX, sanitize(postcode))
+    return incode[0] if incode else None
+
+
+def to_normalised(postcode):
+    outcode = to_outcode(postcode)
+    if outcode is None:
+        return None
+    incode = to_incode(postcode)
+    return None if incode is None else f"{outcode} {incode}"
+
+
+def to_area(postcode):
+    if not is_valid(postcode):
+        return None
+    area = re.findall(AREA_REGEX, sanitize(postcode))
+    return area[0] if area else None
+
+
+def to_sector(postcode):
+    outcode = to_outcode(postcode)
+    if outcode is None:
+        return None
+    incode = to_incode(postcode)
+    return None if incode is None else f"{outcode} {incode[0]}"
+
+
+def to_unit(postcode):
+    if not is_valid(postcode):
+        return None
+    unit = re.findall(UNIT_REGEX, sanitize(postcode))
+    return unit[0] if unit else None
+
+
+def to_district(postcode):
+    outcode = to_outcode(postcode)
+    if outcode is None:
+        return None
+    district = re.match(DISTRICT_SPLIT_REGEX, outcode)
+    return district[1] if district else outcode
+
+
+def to_sub_district(postcode):
+    outcode = to_outcode(postcode)
+    if outcode is None:
+        return None
+    split = re.match(DISTRICT_SPLIT_REGEX, outcode)
+    return None if split is None else outcode
+
+
+def legacy_parse(postcode: str) -> dict:
+    """The original `ukpostcode._parse`."""
+    if not is_valid(postcode):
+        return None
+    return {
+        "postcode": to_normalised(postcode),
+        "incode": to_incode(postcode),
+        "outcode": to_outcode(postcode),
+        "area": to_area(postcode),
+        "district": to_district(postcode),
+        "sub_district": to_sub_district(postcode),
+        "sector": to_sector(postcode),
+        "unit": to_unit(postcode),
+    }
+
+
+def single_pass_parse(postcode: str) -> dict:
+    """The same result from the single-pass parser."""
+    components = to_components(postcode)
+    return None if components is None else components._asdict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for postcode in POSTCODES:
+        assert legacy_parse(postcode) == single_pass_parse(postcode), postcode
+
+    print(f"{'parser':<12} {'us/postcode':>12}")
+    for name, func in [("legacy", legacy_parse), ("single-pass", single_pass_parse)]:
+        rounds = args.number // len(POSTCODES)
+        seconds = min(
+            timeit.repeat(
+                lambda: [func(postcode) for postcode in POSTCODES],
+                number=rounds,
+                repeat=5,
+            )
+        )
+        print(f"{name:<12} {seconds / (rounds * len(POSTCODES)) * 1e6:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+bench_server.py: Load generator for the HTTP server, reporting throughput and latency.
+
+Starts a server in this process (or targets a running one with --url), then sends
+requests from many concurrent clients over keep-alive connections. Run it with a few
+--max-delay-ms values to see the trade-off between batching and latency.
+
+Usage:
+    python benchmarks/bench_server.py
+    python benchmarks/bench_server.py --clients 64 --requests 20000 --max-delay-ms 0 2 5
+    python benchmarks/bench_server.py --url http://localhost:8080
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.client import HTTPConnection
+from urllib.parse import quote, urlsplit
+
+from uk_postcodes_parsing.server import PostcodeServer
+
+POSTCODES = ["EC1R 1UB", "e3 4ss", "SW1A 2AA", "eh16 50y", "HA0 1AQ", "ecir iub"]
+
+
+def client(address, paths, latencies):
+    """Send GET requests for `paths` over one connection, appending latencies."""
+    connection = HTTPConnection(*address)
+    for path in paths:
+        start = time.perf_counter()
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def load(address, clients, requests, endpoint, seed=0):
+    """Send `requests` requests from `clients` threads. Returns (requests/s, latencies)."""
+    rng = random.Random(seed)
+    paths = [
+        f"/{endpoint}?postcode={quote(rng.choice(POSTCODES))}" for _ in range(requests)
+    ]
+    latencies = []
+    threads = [
+        threading.Thread(target=client, args=(address, paths[i::clients], latencies))
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return requests / (time.perf_counter() - start), sorted(latencies)
+
+
+def report(label, rate, latencies):
+    def percentile(p):
+        return latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1e3
+
+    print(
+        f"{label:>14} {rate:>10,.0f} {percentile(0.5):>8.2f} "
+        f"{percentile(0.9):>8.2f} {percentile(0.99):>8.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--url", help="Running server to target (default: start one)")
+    parser.add_argument("--endpoint", choices=["parse", "validate"], default="parse")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument(
+        "--max-delay-ms", type=float, nargs="+", default=[0.0, 1.0, 2.0, 5.0]
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'max delay ms':>14} {'req/s':>10} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}"
+    )
+    if args.url:
+        url = urlsplit(args.url)
+        rate, latencies = load(
+            (url.hostname, url.port or 80), args.clients, args.requests, args.endpoint
+        )
+        report("(remote)", rate, latencies)
+        return
+    for delay in args.max_delay_ms:
+        server = PostcodeServer(("127.0.0.1", 0), args.max_batch_size, delay / 1e3)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        rate, latencies = load(
+            server.server_address[:2], args.clients, args.requests, args.endpoint
+        )
+        report(f"{delay:g}", rate, latencies)
+        batches = server.stats()["batches"][args.endpoint]
+        server.shutdown()
+        server.server_close()
+        print(f"{'':>14} mean batch size {batches['mean_size']}")
+
+
+if __name__ == "__main__":
+    main()
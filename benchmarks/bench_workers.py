@@ -0,0 +1,95 @@
+"""
+bench_workers.py: Measure the memory each worker process adds when sharing the directory.
+
+Starts N worker processes (like gunicorn or multiprocessing workers) that each import
+`ukpostcode`, load the directory and look postcodes up, then reports per worker, once all
+of them are running:
+    - RSS, which counts the shared pages of the directory in every worker
+    - PSS, which splits shared pages between the processes mapping them
+    - anonymous memory (the private heap), which is what each extra worker really costs
+
+Linux only (reads /proc/self/smaps_rollup).
+
+Usage:
+    python benchmarks/bench_workers.py --workers 8
+    python benchmarks/bench_workers.py --workers 4 --start-method fork
+"""
+import argparse
+import multiprocessing
+from pathlib import Path
+
+from uk_postcodes_parsing.directory import DEFAULT_DIRECTORY_PATH
+
+SMAPS = Path("/proc/self/smaps_rollup")
+FIELDS = ("Rss", "Pss", "Anonymous")
+
+
+def memory() -> dict:
+    """Memory of this process in bytes, by smaps field."""
+    fields = dict(line.split(":") for line in SMAPS.read_text().splitlines()[1:])
+    return {name: int(fields[name].split()[0]) * 1024 for name in FIELDS}
+
+
+def worker(barrier, results) -> None:
+    before = memory()
+    from uk_postcodes_parsing import ukpostcode
+    from uk_postcodes_parsing.directory import get_directory
+
+    imported = memory()
+    ukpostcode.preload()
+    directory = get_directory()
+    found = sum(directory[i] in directory for i in range(0, len(directory), 97))
+    barrier.wait()  # Measure once every worker has the directory mapped
+    after = memory()
+    results.put(
+        {
+            "found": found,
+            "import": {name: imported[name] - before[name] for name in FIELDS},
+            "directory": {name: after[name] - imported[name] for name in FIELDS},
+        }
+    )
+    barrier.wait()  # Keep the mapping until every worker has measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--start-method",
+        choices=multiprocessing.get_all_start_methods(),
+        default="spawn",
+        help="How workers are started (default: spawn, a fresh interpreter each)",
+    )
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context(args.start_method)
+    barrier = context.Barrier(args.workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(barrier, results))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    size = DEFAULT_DIRECTORY_PATH.stat().st_size
+    print(
+        f"{args.workers} workers ({args.start_method}), directory of {size / 2**20:.1f} MB"
+    )
+    print(f"{'added by':<10} {'RSS (MB)':>10} {'PSS (MB)':>10} {'private (MB)':>13}")
+    for stage in ("import", "directory"):
+        mean = {
+            name: sum(result[stage][name] for result in measured) / len(measured)
+            for name in FIELDS
+        }
+        print(
+            f"{stage:<10} {mean['Rss'] / 2**20:>10.2f} {mean['Pss'] / 2**20:>10.2f}"
+            f" {mean['Anonymous'] / 2**20:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
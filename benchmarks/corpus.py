@@ -0,0 +1,152 @@
+"""
+corpus.py: Seeded generator of OCR-noised postcodes and documents for benchmarks.
+
+Postcodes are drawn from the directory, so the generated text has the same mix of
+formats (and the same directory hit rate once fixed) as real data. OCR noise swaps
+look-alike characters (O/0, I/1, S/5, B/8, Z/2), changes case and drops or repeats the
+space. The same seed always gives the same corpus for the same directory.
+
+Usage:
+    python benchmarks/corpus.py --documents 1000 --seed 1 > corpus.txt
+    python benchmarks/corpus.py --documents 10 --noise 0.5 --invalid 0.2
+"""
+import random
+import argparse
+from typing import Dict, List, Optional
+
+from uk_postcodes_parsing.directory import PostcodeDirectory, get_directory
+from uk_postcodes_parsing.fix import fix
+from uk_postcodes_parsing.postcode_utils import to_normalised
+
+# Look-alike characters of OCR output, both ways. `fix` corrects the first four.
+FIX_CONFUSIONS = {"O": "0", "0": "O", "I": "1", "1": "I"}
+CONFUSIONS = dict(FIX_CONFUSIONS, S="5", B="8", Z="2")
+CONFUSIONS.update({"5": "S", "8": "B", "2": "Z"})
+WORDS = (
+    "please send the invoice to our office at or return it before friday account "
+    "number reference dear sir madam regards delivery address customer tel"
+).split()
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def sample_postcodes(
+    n: int, rng: random.Random, directory: Optional[PostcodeDirectory] = None
+) -> List[str]:
+    """Draw `n` postcodes of the directory, with replacement."""
+    directory = directory if directory is not None else get_directory()
+    return [directory[rng.randrange(len(directory))] for _ in range(n)]
+
+
+def ocr_noise(
+    postcode: str, rng: random.Random, rate: float = 0.3, confusions: dict = CONFUSIONS
+) -> str:
+    """Swap look-alike characters (each with probability `rate`) and mangle spacing
+    and case, like OCR output."""
+    chars = [
+        confusions[c] if c in confusions and rng.random() < rate else c
+        for c in postcode
+    ]
+    text = "".join(chars)
+    spacing = rng.random()
+    if spacing < rate / 2:
+        text = text.replace(" ", "")
+    elif spacing < rate:
+        text = text.replace(" ", "  ")
+    return text.lower() if rng.random() < 0.5 else text
+
+
+def invalid_postcode(rng: random.Random) -> str:
+    """A postcode-like string that can't be parsed or fixed, e.g. "QX9 Z7A"."""
+    return (
+        "".join(rng.choices(LETTERS, k=rng.randint(1, 2)))
+        + str(rng.randint(0, 99))
+        + " "
+        + "".join(rng.choices(LETTERS, k=2))
+        + str(rng.randint(0, 9))
+    )
+
+
+def postcode_samples(
+    n: int, seed: int = 0, directory: Optional[PostcodeDirectory] = None
+) -> Dict[str, List[str]]:
+    """Samples of `n` strings of each kind.
+
+    Returns:
+        Dict[str, List[str]]: "valid" (postcodes with random case and spacing),
+            "fixable" (OCR mistakes that `fix` corrects, at least one per sample) and
+            "invalid"
+    """
+    rng = random.Random(seed)
+    postcodes = sample_postcodes(n, rng, directory)
+    fixable = []
+    while len(fixable) < n:
+        # Postcodes without O, 0, I or 1 (e.g. "E3 4SS") can't be made fixable
+        postcode = sample_postcodes(1, rng, directory)[0]
+        for _ in range(10):
+            noisy = ocr_noise(postcode, rng, 0.5, FIX_CONFUSIONS)
+            if to_normalised(noisy) is None and to_normalised(fix(noisy)) is not None:
+                fixable.append(noisy)
+                break
+    return {
+        "valid": [ocr_noise(postcode, rng, rate=0) for postcode in postcodes],
+        "fixable": fixable,
+        "invalid": [invalid_postcode(rng) for _ in range(n)],
+    }
+
+
+def documents(
+    n: int,
+    words: int = 40,
+    seed: int = 0,
+    noise: float = 0.3,
+    invalid: float = 0.05,
+    postcodes_per_document: int = 2,
+    directory: Optional[PostcodeDirectory] = None,
+) -> List[str]:
+    """Generate `n` documents of `words` words, each mentioning a few postcodes.
+
+    Args:
+        n (int): Number of documents
+        words (int): Number of filler words per document. Defaults to 40.
+        seed (int): Seed of the random generator. Defaults to 0.
+        noise (float): Probability of each OCR mistake, see `ocr_noise`. Defaults to
+            0.3.
+        invalid (float): Share of postcodes replaced by invalid ones. Defaults to 0.05.
+        postcodes_per_document (int): Maximum number of postcodes per document (at
+            least 1). Defaults to 2.
+        directory (PostcodeDirectory): Where to draw postcodes from. Defaults to the
+            packaged one.
+    Returns:
+        List[str]: The documents
+    """
+    rng = random.Random(seed)
+    directory = directory if directory is not None else get_directory()
+    corpus = []
+    for _ in range(n):
+        text = rng.choices(WORDS, k=words)
+        for _ in range(rng.randint(1, postcodes_per_document)):
+            if rng.random() < invalid:
+                postcode = invalid_postcode(rng)
+            else:
+                postcode = ocr_noise(sample_postcodes(1, rng, directory)[0], rng, noise)
+            text.insert(rng.randrange(len(text) + 1), postcode)
+        corpus.append(" ".join(text))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--invalid", type=float, default=0.05)
+    args = parser.parse_args()
+    for document in documents(
+        args.documents, args.words, args.seed, args.noise, args.invalid
+    ):
+        print(document)
+
+
+if __name__ == "__main__":
+    main()
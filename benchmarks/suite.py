@@ -0,0 +1,221 @@
+"""
+suite.py: Benchmark suite of the whole library, with machine-readable results and budgets.
+
+Benchmarks (all lower is better):
+    import_time        ms to import `ukpostcode`, in a fresh interpreter
+    import_rss         MB of RSS added by importing `ukpostcode` and loading the directory
+    parse_valid        us per `parse` of a valid postcode
+    parse_fixable      us per `parse` of a postcode with OCR mistakes
+    parse_invalid      us per `parse` of a string that can't be parsed
+    fix_with_options   us per `fix_with_options` of a postcode with OCR mistakes
+    corpus_small       us per `parse_from_corpus` of a ~40 word document
+    corpus_large       ms per `parse_from_corpus` of a ~1 MB document
+    lookup_hit         us per directory lookup of a postcode in the directory
+    lookup_miss        us per directory lookup of a postcode not in the directory
+
+Inputs are generated from the directory by `corpus.py` with a fixed seed, so two runs on
+the same data release measure the same work. Results are printed as a table, or as JSON
+with --format json (or --output FILE). A run fails (exit status 1) if a result exceeds
+its budget in --budgets, or regresses by more than --tolerance over a --baseline run.
+
+Usage:
+    python benchmarks/suite.py
+    python benchmarks/suite.py --output results.json --budgets benchmarks/budgets.json
+    python benchmarks/suite.py --baseline main.json --tolerance 0.2 --only parse_valid
+"""
+import sys
+import json
+import time
+import random
+import timeit
+import argparse
+import platform
+import statistics
+import subprocess
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from corpus import documents, postcode_samples  # noqa: E402
+from uk_postcodes_parsing import cache, ukpostcode  # noqa: E402
+from uk_postcodes_parsing.directory import get_directory  # noqa: E402
+from uk_postcodes_parsing.fix import fix_with_options  # noqa: E402
+
+SCALE = {"ms": 1e3, "us": 1e6}  # From seconds
+
+IMPORT_WORKER = r"""
+import sys, json, time
+
+def rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+before = rss()
+start = time.perf_counter()
+from uk_postcodes_parsing import ukpostcode
+elapsed = time.perf_counter() - start
+ukpostcode.preload()
+print(json.dumps({"seconds": elapsed, "rss": rss() - before}))
+"""
+
+
+def per_call(func: Callable, inputs: List, repeat: int) -> float:
+    """Best time of `repeat` runs of `func` over `inputs`, in seconds per input."""
+    seconds = min(
+        timeit.repeat(lambda: [func(x) for x in inputs], number=1, repeat=repeat)
+    )
+    return seconds / len(inputs)
+
+
+def bench_import(repeat: int) -> Dict[str, float]:
+    runs = [
+        json.loads(
+            subprocess.run(
+                [sys.executable, "-c", IMPORT_WORKER],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        )
+        for _ in range(repeat)
+    ]
+    return {
+        "import_time": min(run["seconds"] for run in runs) * 1e3,
+        "import_rss": statistics.median(run["rss"] for run in runs) / 2**20,
+    }
+
+
+def missing_postcodes(n: int, rng: random.Random) -> List[str]:
+    """Valid postcodes that aren't in the directory."""
+    directory = get_directory()
+    missing = []
+    while len(missing) < n:
+        postcode = directory[rng.randrange(len(directory))]
+        postcode = postcode[:-2] + "".join(rng.choices("ABDEFGHJLNPQRSTUWXYZ", k=2))
+        if postcode not in directory:
+            missing.append(postcode)
+    return missing
+
+
+def run(seed: int, size: int, repeat: int, only: List[str]) -> Dict[str, dict]:
+    """Run the benchmarks. Returns {name: {"value": ..., "unit": ...}}."""
+    cache.disable_cache()
+    ukpostcode.preload()
+    samples = postcode_samples(size, seed)
+    small = documents(size, words=40, seed=seed)
+    large = [" ".join(documents(max(size, 5000), words=40, seed=seed + 1))]
+    hits = [postcode.upper() for postcode in postcode_samples(size, seed)["valid"]]
+    hits = [ukpostcode.parse(postcode).postcode for postcode in hits]
+    misses = missing_postcodes(size, random.Random(seed))
+    directory = get_directory()
+
+    parse_corpus = partial(ukpostcode.parse_from_corpus, attempt_fix=True)
+
+    # Name to unit, function and its inputs
+    benchmarks: Dict[str, Tuple[str, Callable, List]] = {
+        "parse_valid": ("us", ukpostcode.parse, samples["valid"]),
+        "parse_fixable": ("us", ukpostcode.parse, samples["fixable"]),
+        "parse_invalid": ("us", ukpostcode.parse, samples["invalid"]),
+        "fix_with_options": ("us", fix_with_options, samples["fixable"]),
+        "corpus_small": ("us", parse_corpus, small),
+        "corpus_large": ("ms", parse_corpus, large),
+        "lookup_hit": ("us", directory.__contains__, hits),
+        "lookup_miss": ("us", directory.__contains__, misses),
+    }
+    results = {}
+    if not only or {"import_time", "import_rss"} & set(only):
+        imports = bench_import(repeat)
+        results["import_time"] = {"value": imports["import_time"], "unit": "ms"}
+        results["import_rss"] = {"value": imports["import_rss"], "unit": "MB"}
+    for name, (unit, func, inputs) in benchmarks.items():
+        if not only or name in only:
+            value = per_call(func, inputs, repeat) * SCALE[unit]
+            results[name] = {"value": value, "unit": unit}
+    return {name: results[name] for name in sorted(results) if not only or name in only}
+
+
+def check(
+    results: Dict[str, dict],
+    budgets: Dict[str, float],
+    baseline: Dict[str, dict],
+    tolerance: float,
+) -> List[str]:
+    """Results over their budget, or worse than the baseline by more than `tolerance`."""
+    failures = []
+    for name, result in results.items():
+        value = result["value"]
+        if name in budgets and value > budgets[name]:
+            failures.append(
+                f"{name}: {value:.3f} is over its budget of {budgets[name]}"
+            )
+        if name in baseline:
+            limit = baseline[name]["value"] * (1 + tolerance)
+            if value > limit:
+                failures.append(
+                    f"{name}: {value:.3f} regressed by more than {tolerance:.0%} over "
+                    f"the baseline {baseline[name]['value']:.3f}"
+                )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=2000, help="Inputs per benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Best of this many runs")
+    parser.add_argument("--only", nargs="+", default=[], help="Benchmarks to run")
+    parser.add_argument("--format", choices=["table", "json"], default="table")
+    parser.add_argument("--output", type=Path, help="Also write the JSON results here")
+    parser.add_argument(
+        "--budgets", type=Path, help="JSON file of the maximum value of each benchmark"
+    )
+    parser.add_argument("--baseline", type=Path, help="JSON results of an earlier run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed regression over --baseline (default: 0.25)",
+    )
+    args = parser.parse_args()
+
+    directory = get_directory()
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "release": directory.release,
+            "postcodes": len(directory),
+            "seed": args.seed,
+            "size": args.size,
+            "repeat": args.repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": run(args.seed, args.size, args.repeat, args.only),
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if args.format == "json":
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'benchmark':<18} {'value':>10}")
+        for name, result in report["results"].items():
+            print(f"{name:<18} {result['value']:>10.3f} {result['unit']}")
+
+    budgets = json.loads(args.budgets.read_text()) if args.budgets else {}
+    baseline = json.loads(args.baseline.read_text())["results"] if args.baseline else {}
+    failures = check(report["results"], budgets, baseline, args.tolerance)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+batch.py: Parse large batches of postcodes and documents across a process pool.
+"""
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from uk_postcodes_parsing import bloom, registry, ukpostcode
+from uk_postcodes_parsing.registry import Snapshot
+from uk_postcodes_parsing.ukpostcode import Postcode
+
+
+def parse_many(
+    postcodes: Iterable[str],
+    attempt_fix: bool = True,
+    workers: Optional[int] = None,
+    chunksize: int = 1000,
+) -> Iterator[Optional[Postcode]]:
+    """Parse many postcodes, in parallel across worker processes.
+
+    Results are yielded in the same order as the input, as soon as they are ready.
+
+    Args:
+        postcodes (Iterable[str]): Postcodes to parse. E.g. ["EC1R 1UB", "E3 4SS"].
+        attempt_fix (bool): Attempt to fix postcodes. Defaults to True.
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+            With 1 worker, postcodes are parsed in the current process.
+        chunksize (int): Number of postcodes sent to a worker at a time. Defaults to 1000.
+    Returns:
+        Iterator[Optional[Postcode]]: The parsed postcode (or None) for every input.
+    """
+    func = partial(_parse_chunk, attempt_fix=attempt_fix)
+    return _imap_chunks(func, postcodes, workers, chunksize)
+
+
+def parse_from_corpora(
+    texts: Iterable[str],
+    attempt_fix: bool = False,
+    try_all_fix_options: bool = False,
+    workers: Optional[int] = None,
+    chunksize: int = 100,
+) -> Iterator[List[Postcode]]:
+    """Parse postcodes from many text corpora, in parallel across worker processes.
+
+    Results are yielded in the same order as the input, as soon as they are ready.
+
+    Args:
+        texts (Iterable[str]): Text corpora, e.g. one per document.
+        attempt_fix (bool): Attempt to fix postcodes. Defaults to False.
+        try_all_fix_options (bool): If postcode is invalid and attempt_fix=True, this option
+            tries all possibilites to correct mistakes. See `ukpostcode.parse_from_corpus`.
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+            With 1 worker, texts are parsed in the current process.
+        chunksize (int): Number of texts sent to a worker at a time. Defaults to 100.
+    Returns:
+        Iterator[List[Postcode]]: The postcodes found in every text.
+    """
+    if try_all_fix_options and not attempt_fix:
+        raise ValueError("attempt_fix must be true if try_all_fix_options is True")
+    func = partial(
+        _parse_corpus_chunk,
+        attempt_fix=attempt_fix,
+        try_all_fix_options=try_all_fix_options,
+    )
+    return _imap_chunks(func, texts, workers, chunksize)
+
+
+def extract_from_files(
+    paths: Iterable[Union[str, Path]],
+    attempt_fix: bool = False,
+    try_all_fix_options: bool = False,
+    workers: Optional[int] = None,
+    chunksize: int = 1,
+    ordered: bool = True,
+    encoding: str = "utf-8",
+) -> Iterator[Tuple[str, int, Postcode]]:
+    """Parse postcodes from many text files, in parallel across worker processes.
+
+    Each worker streams its files with `ukpostcode.iter_postcodes`, so large files are
+    never read into memory at once.
+
+    Args:
+        paths (Iterable[str | Path]): Text files, e.g. one per OCR'd document.
+        attempt_fix (bool): Attempt to fix postcodes. Defaults to False.
+        try_all_fix_options (bool): If postcode is invalid and attempt_fix=True, this option
+            tries all possibilites to correct mistakes. See `ukpostcode.parse_from_corpus`.
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+            With 1 worker, files are parsed in the current process.
+        chunksize (int): Number of files sent to a worker at a time. Defaults to 1.
+        ordered (bool): Yield results in the order of `paths`. With False, results are
+            yielded as soon as any worker finishes. Defaults to True.
+        encoding (str): Encoding of the files. Defaults to "utf-8".
+    Returns:
+        Iterator[Tuple[str, int, Postcode]]: The path, the character offset in the file
+            and the parsed postcode, for every postcode found.
+    """
+    documents = ((str(path), None) for path in paths)
+    return extract_from_texts(
+        documents,
+        attempt_fix,
+        try_all_fix_options,
+        workers,
+        chunksize,
+        ordered,
+        encoding,
+    )
+
+
+def extract_from_texts(
+    documents: Iterable[Tuple[str, Optional[str]]],
+    attempt_fix: bool = False,
+    try_all_fix_options: bool = False,
+    workers: Optional[int] = None,
+    chunksize: int = 100,
+    ordered: bool = True,
+    encoding: str = "utf-8",
+) -> Iterator[Tuple[str, int, Postcode]]:
+    """Parse postcodes from many identified documents, in parallel across worker
+    processes.
+
+    Args:
+        documents (Iterable[Tuple[str, str]]): Document id and text pairs. A text of
+            None means the id is the path of a text file to read, see
+            `extract_from_files`.
+        attempt_fix (bool): Attempt to fix postcodes. Defaults to False.
+        try_all_fix_options (bool): If postcode is invalid and attempt_fix=True, this option
+            tries all possibilites to correct mistakes. See `ukpostcode.parse_from_corpus`.
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+            With 1 worker, documents are parsed in the current process.
+        chunksize (int): Number of documents sent to a worker at a time. Defaults to 100.
+        ordered (bool): Yield results in the order of `documents`. With False, results
+            are yielded as soon as any worker finishes. Defaults to True.
+        encoding (str): Encoding of the files. Defaults to "utf-8".
+    Returns:
+        Iterator[Tuple[str, int, Postcode]]: The document id, the character offset in
+            the document and the parsed postcode, for every postcode found.
+    """
+    if try_all_fix_options and not attempt_fix:
+        raise ValueError("attempt_fix must be true if try_all_fix_options is True")
+    func = partial(
+        _extract_chunk,
+        attempt_fix=attempt_fix,
+        try_all_fix_options=try_all_fix_options,
+        encoding=encoding,
+    )
+    return _imap_chunks(func, documents, workers, chunksize, ordered)
+
+
+def _parse_chunk(postcodes: List[str], attempt_fix: bool) -> List[Optional[Postcode]]:
+    return [
+        ukpostcode.parse(postcode, attempt_fix=attempt_fix) for postcode in postcodes
+    ]
+
+
+def _parse_corpus_chunk(
+    texts: List[str], attempt_fix: bool, try_all_fix_options: bool
+) -> List[List[Postcode]]:
+    return [
+        ukpostcode.parse_from_corpus(text, attempt_fix, try_all_fix_options)
+        for text in texts
+    ]
+
+
+def _extract_chunk(
+    documents: List[Tuple[str, Optional[str]]],
+    attempt_fix: bool,
+    try_all_fix_options: bool,
+    encoding: str,
+) -> List[Tuple[str, int, Postcode]]:
+    results = []
+    for document, text in documents:
+        if text is None:
+            with open(document, encoding=encoding) as f:
+                found = ukpostcode.iter_postcodes(
+                    f, attempt_fix=attempt_fix, try_all_fix_options=try_all_fix_options
+                )
+                results.extend(
+                    (document, offset, postcode) for offset, postcode in found
+                )
+        else:
+            found = ukpostcode.iter_postcodes(
+                [text], attempt_fix=attempt_fix, try_all_fix_options=try_all_fix_options
+            )
+            results.extend((document, offset, postcode) for offset, postcode in found)
+    return results
+
+
+def _init_worker(snapshot: Snapshot, filter_enabled: bool) -> None:
+    """Answer from the release and membership source of the parent process, which a
+    spawned worker doesn't inherit. Load what answers membership checks once per worker,
+    so results carry their directory flag."""
+    if registry.current() is not snapshot:
+        bloom.disable_filter()
+        registry.activate(snapshot, warm=False)
+    if filter_enabled:
+        bloom.enable_filter()
+    else:
+        bloom.disable_filter()
+    bloom.preload_membership()
+
+
+def _imap_chunks(
+    func: Callable[[list], list],
+    items: Iterable,
+    workers: Optional[int],
+    chunksize: int,
+    ordered: bool = True,
+) -> Iterator:
+    """Apply `func` to chunks of `items` in a process pool and yield the results.
+
+    At most two chunks per worker are in flight, so memory stays bounded however long
+    `items` is. Results are yielded in order, or with `ordered=False` chunk by chunk as
+    soon as they are ready.
+
+    Raises:
+        ValueError: If `chunksize` or `workers` is less than 1. This is raised on the
+            call, not when the results are first iterated.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    if workers is not None and workers < 1:
+        raise ValueError("workers must be at least 1")
+    return _iter_chunks(
+        func, iter(items), workers or os.cpu_count() or 1, chunksize, ordered
+    )
+
+
+def _iter_chunks(
+    func: Callable[[list], list],
+    items: Iterator,
+    workers: int,
+    chunksize: int,
+    ordered: bool,
+) -> Iterator:
+    """The generator behind `_imap_chunks`, with its arguments checked."""
+    chunks = iter(lambda: list(islice(items, chunksize)), [])
+    if workers == 1:
+        for chunk in chunks:
+            yield from func(chunk)
+        return
+
+    initargs = (registry.current(), bloom.is_enabled())
+    with ProcessPoolExecutor(
+        workers, initializer=_init_worker, initargs=initargs
+    ) as executor:
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(func, chunk))
+                if len(pending) >= 2 * workers:
+                    if ordered:
+                        yield from pending.popleft().result()
+                    else:
+                        yield from _pop_completed(pending)
+            while pending:
+                if ordered:
+                    yield from pending.popleft().result()
+                else:
+                    yield from _pop_completed(pending)
+        finally:
+            # Stop queued work if the caller stops iterating early
+            for future in pending:
+                future.cancel()
+
+
+def _pop_completed(pending: deque) -> Iterator:
+    """Wait for at least one of the `pending` futures and yield the results of all the
+    completed ones, removing them from `pending`."""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        pending.remove(future)
+    for future in done:
+        yield from future.result()
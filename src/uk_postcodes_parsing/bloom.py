@@ -0,0 +1,316 @@
+"""
+bloom.py: Compact, approximate directory membership with a Bloom filter.
+
+For memory-capped deployments (e.g. small Lambda containers), a Bloom filter of the
+directory answers `is_in_ons_postcode_directory` in ~1.2 MB per million postcodes at a
+1% false-positive rate, instead of 4 MB per million for the directory. A postcode not in
+the directory is reported as in it with probability `false_positive_rate` (measured when
+the filter is built); a postcode in the directory is always reported as in it. Postcodes
+answered by the filter have `membership_is_probabilistic` set when found.
+
+    >>> from uk_postcodes_parsing import bloom, ukpostcode
+    >>> bloom.enable_filter()  # Until `disable_filter()`
+    >>> ukpostcode.parse("EC1R 1UB").membership_is_probabilistic
+    True
+
+File layout (little-endian):
+    header: magic (4s), version (H), reserved (H), release (16s), count (I),
+            bits (Q), hashes (H), reserved (H), measured false-positive rate (d)
+    body:   bits / 8 bytes, bit i of the filter is bit i % 8 of byte i // 8
+"""
+import math
+import mmap
+import struct
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from uk_postcodes_parsing.directory import (
+    DATA_DIR,
+    VERSION,
+    MembershipSource,
+    PostcodeDirectory,
+    encode,
+)
+from uk_postcodes_parsing.registry import Snapshot, current
+
+logger = logging.getLogger("uk-postcodes-parsing.bloom")
+
+DEFAULT_FILTER_PATH = DATA_DIR / "postcodes.bloom"
+
+MAGIC = b"UKPB"
+HEADER = struct.Struct("<4sHH16sIQHHd")
+
+_MASK = (1 << 64) - 1
+
+
+def _mix(code: int) -> int:
+    """64-bit hash of an encoded postcode (splitmix64)."""
+    x = (code + 0x9E3779B97F4A7C15) & _MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK
+    return x ^ (x >> 31)
+
+
+def _mix_array(codes: "np.ndarray") -> "np.ndarray":
+    """`_mix` of many codes at once. uint64 arithmetic wraps like the masks above."""
+    with np.errstate(over="ignore"):
+        x = codes.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def _bit_positions(hashes: "np.ndarray", bits: int, hashes_count: int):
+    """Bit positions of every hash function (double hashing), one array each."""
+    first = hashes & np.uint64(0xFFFFFFFF)
+    step = (hashes >> np.uint64(32)) | np.uint64(1)
+    for i in range(hashes_count):
+        yield (first + np.uint64(i) * step) % np.uint64(bits)
+
+
+def filter_size(count: int, false_positive_rate: float) -> tuple:
+    """Optimal number of bits (a multiple of 64) and hash functions of a filter.
+
+    Returns:
+        Tuple[int, int]: Number of bits and of hash functions
+    """
+    if not 0 < false_positive_rate < 1:
+        raise ValueError("false_positive_rate must be between 0 and 1")
+    count = max(count, 1)
+    bits = math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2)
+    bits = max(64, -(-bits // 64) * 64)
+    hashes = min(max(round(bits / count * math.log(2)), 1), 32)
+    return bits, hashes
+
+
+class PostcodeFilter:
+    """Read-only Bloom filter of a postcode directory, with the membership checks of
+    `PostcodeDirectory`.
+
+    Constructor arguments:
+        path (str | Path): Path to a file written by `write_filter`.
+
+    Attributes:
+        release (str): Label of the ONS Postcode Directory release, e.g. "2023-05".
+        false_positive_rate (float): Share of postcodes not in the directory reported as
+            in it, measured when the filter was built.
+        source (MembershipSource): The release, and that membership checks are
+            probabilistic.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_FILTER_PATH):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = HEADER.unpack(f.read(HEADER.size))
+            magic, version, _, release, count, bits, hashes, _, rate = header
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a postcode filter file: {self.path}")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.release = release.rstrip(b"\0").decode("ascii")
+        self.false_positive_rate = rate
+        self.source = MembershipSource(self.release, probabilistic=True)
+        self._count = count
+        self._bits = bits
+        self._hashes = hashes
+        self._body = memoryview(self._mmap)[HEADER.size : HEADER.size + bits // 8]
+        logger.debug(
+            "Loaded filter of %s postcodes (%s bytes) from %s",
+            count,
+            bits // 8,
+            self.path,
+        )
+
+    def __reduce__(self):
+        """Pickle the path only, so other processes map the same file."""
+        return type(self), (self.path,)
+
+    def warm(self) -> None:
+        """Read every page of the memory-mapped file so later lookups don't page fault."""
+        for offset in range(0, len(self._mmap), mmap.PAGESIZE):
+            self._mmap[offset]
+
+    def __len__(self) -> int:
+        """Number of postcodes in the filtered directory."""
+        return self._count
+
+    def __contains__(self, postcode: str) -> bool:
+        code = encode(postcode)
+        return code is not None and self.contains_code(code)
+
+    def contains_code(self, code: int) -> bool:
+        """Check if an encoded postcode is (probably) in the directory.
+
+        Args:
+            code (int): Postcode encoded with `directory.encode`
+        Returns:
+            bool: False if the postcode is not in the directory, True if it is or, with
+                probability `false_positive_rate`, if it isn't
+        """
+        x = _mix(code)
+        first, step = x & 0xFFFFFFFF, (x >> 32) | 1
+        body, bits = self._body, self._bits
+        for i in range(self._hashes):
+            position = (first + i * step) % bits
+            if not body[position >> 3] >> (position & 7) & 1:
+                return False
+        return True
+
+    def contains_codes(self, codes: "np.ndarray") -> "np.ndarray":
+        """Check many encoded postcodes at once. Requires numpy.
+
+        Args:
+            codes (np.ndarray): Postcodes encoded with `directory.encode`. Negative
+                values (e.g. -1 for postcodes that can't be encoded) are never found.
+        Returns:
+            np.ndarray: Boolean array, True where the postcode is (probably) in the
+                directory
+        """
+        if np is None:
+            raise ImportError("contains_codes requires numpy: pip install numpy")
+        codes = np.asarray(codes, dtype=np.int64)
+        valid = codes >= 0
+        body = np.frombuffer(self._body, dtype=np.uint8)
+        found = valid.copy()
+        hashes = _mix_array(np.where(valid, codes, 0))
+        for positions in _bit_positions(hashes, self._bits, self._hashes):
+            found &= (
+                body[positions >> np.uint64(3)] >> (positions & np.uint64(7))
+            ) & 1 == 1
+        return found
+
+
+def write_filter(
+    directory: PostcodeDirectory,
+    path: Union[str, Path] = DEFAULT_FILTER_PATH,
+    false_positive_rate: float = 0.01,
+    samples: int = 1_000_000,
+    seed: int = 0,
+) -> float:
+    """Write a Bloom filter of a directory, and measure its false-positive rate.
+
+    The rate is measured on `samples` postcodes that are not in the directory but share
+    a sector with postcodes that are (the kind of near miss OCR mistakes produce).
+    Requires numpy.
+
+    Args:
+        directory (PostcodeDirectory): The directory to filter
+        path (str | Path): Where to write the filter
+        false_positive_rate (float): Target false-positive rate, between 0 and 1.
+            Defaults to 0.01.
+        samples (int): Number of postcodes not in the directory the rate is measured
+            on. Defaults to 1000000.
+        seed (int): Seed of the random sample. Defaults to 0.
+    Returns:
+        float: The measured false-positive rate
+    """
+    if np is None:
+        raise ImportError("Building the filter requires numpy: pip install numpy")
+    codes = np.frombuffer(directory._codes, dtype=np.uint32).astype(np.int64)
+    bits, hashes = filter_size(len(codes), false_positive_rate)
+    flags = np.zeros(bits, dtype=bool)
+    for positions in _bit_positions(_mix_array(codes), bits, hashes):
+        flags[positions] = True
+    body = np.packbits(flags, bitorder="little")
+    del flags
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    release = directory.release.encode("ascii")
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, release, len(codes), bits, hashes, 0, 0))
+        f.write(body.tobytes())
+
+    measured = 0.0
+    if len(codes) and samples:
+        # Random units in the sectors of random postcodes of the directory
+        rng = np.random.default_rng(seed)
+        negatives = rng.choice(codes, samples)
+        negatives += rng.integers(0, 676, samples) - negatives % 676
+        negatives = negatives[directory.positions(negatives) < 0]
+        if len(negatives):
+            measured = float(PostcodeFilter(path).contains_codes(negatives).mean())
+    with open(path, "r+b") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC, VERSION, 0, release, len(codes), bits, hashes, 0, measured
+            )
+        )
+    logger.info(
+        "Wrote filter of %s postcodes (%s bytes, %s hashes) with a measured "
+        "false-positive rate of %.4f",
+        len(codes),
+        bits // 8,
+        hashes,
+        measured,
+    )
+    return measured
+
+
+_enabled = False
+_filter_lock = threading.Lock()
+
+
+def enable_filter() -> PostcodeFilter:
+    """Answer directory membership checks with the Bloom filter of the active release
+    (see `registry`) instead of its directory. The directory is then never loaded for
+    membership checks.
+
+    Returns:
+        PostcodeFilter: The filter now answering membership checks
+    Raises:
+        FileNotFoundError: If the active release has no filter
+    """
+    global _enabled
+    with _filter_lock:
+        snapshot = current()
+        if snapshot.filter is None:
+            raise FileNotFoundError(f"{snapshot.data_dir} has no postcodes.bloom")
+        _enabled = True
+    return snapshot.filter
+
+
+def disable_filter() -> None:
+    """Answer directory membership checks with the directory again."""
+    global _enabled
+    with _filter_lock:
+        _enabled = False
+
+
+def is_enabled() -> bool:
+    """Check if membership checks are answered by the filter. See `enable_filter`."""
+    return _enabled
+
+
+def get_membership(
+    snapshot: Optional[Snapshot] = None,
+) -> Union[PostcodeDirectory, PostcodeFilter]:
+    """Return what answers directory membership checks, from the active release.
+
+    Args:
+        snapshot (Snapshot): The release to take it from instead, e.g. one already
+            taken from `registry.current()` for other stores
+
+    Returns:
+        PostcodeDirectory | PostcodeFilter: The filter if enabled, otherwise the
+            directory
+    """
+    snapshot = snapshot if snapshot is not None else current()
+    membership = snapshot.filter if _enabled else None
+    return membership if membership is not None else snapshot.directory
+
+
+def preload_membership() -> None:
+    """Load what answers membership checks (see `get_membership`) up front, and fault
+    its pages in. With the filter enabled, the directory is left unloaded.
+
+    Servers and worker processes call this at start-up so the first lookup doesn't pay
+    the cost.
+    """
+    get_membership().warm()
@@ -0,0 +1,348 @@
+"""
+build.py: Build the runtime data files from an ONS Postcode Directory (ONSPD) download.
+
+Requires numpy. The ONSPD CSV files are streamed row by row, in parallel across files,
+and only the packed columns needed at runtime are kept (17 bytes per postcode), so
+memory grows with the number of postcodes, not the size of the CSV files. The data files
+are written from those NumPy arrays, with a few more bytes per postcode of working
+arrays and no Python object per postcode. They are written next to each other with a
+manifest of their SHA-256 checksums:
+
+    postcodes.bin    active postcodes, see `directory`
+    coordinates.bin  latitudes and longitudes, see `geo`
+    countries.bin    country of each postcode, see `country`
+    spatial.bin      spatial index, see `spatial`
+    history.bin      dates of introduction and termination, see `history`
+    corrections.json raw outward codes OCR can produce to real outcodes, see `fix`
+    postcodes.bloom  Bloom filter of the active postcodes, see `bloom`
+    manifest.json    release, counts, source files and checksums
+
+    $ uk-postcodes build-directory ONSPD_MAY_2023_UK/
+"""
+import os
+import re
+import csv
+import json
+import hashlib
+import logging
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from uk_postcodes_parsing.bloom import write_filter
+from uk_postcodes_parsing.country import country_index, _write_countries
+from uk_postcodes_parsing.directory import (
+    DATA_DIR,
+    PostcodeDirectory,
+    encode,
+    _write_codes,
+)
+from uk_postcodes_parsing.fix import write_corrections
+from uk_postcodes_parsing.geo import CoordinateStore, _write_coordinates
+from uk_postcodes_parsing.history import EPOCH, _write_history_arrays
+from uk_postcodes_parsing.registry import MANIFEST_NAME
+from uk_postcodes_parsing.spatial import write_spatial_index
+
+logger = logging.getLogger("uk-postcodes-parsing.build")
+
+DATA_FILES = (
+    "postcodes.bin",
+    "coordinates.bin",
+    "countries.bin",
+    "spatial.bin",
+    "history.bin",
+    "corrections.json",
+    "postcodes.bloom",
+)
+
+# ONSPD columns read by the build. "pcds" (one space) is preferred over "pcd" (padded).
+POSTCODE_COLUMNS = ("pcds", "pcd")
+INTRODUCED_COLUMN = "dointr"
+TERMINATED_COLUMN = "doterm"
+LATITUDE_COLUMN = "lat"
+LONGITUDE_COLUMN = "long"
+COUNTRY_COLUMN = "ctry"
+
+# Release in ONSPD download names, e.g. "ONSPD_MAY_2023_UK"
+RELEASE_REGEX = re.compile(r"ONSPD_([A-Z]{3})_(\d{4})", re.I)
+MONTHS = "JAN FEB MAR APR MAY JUN JUL AUG SEP OCT NOV DEC".split()
+
+# Size of the release field in the headers of the data files
+MAX_RELEASE_LENGTH = 16
+
+
+class OnspdColumns(NamedTuple):
+    """Packed columns of one ONSPD CSV file. See `read_onspd_csv`."""
+
+    codes: array  # uint32 encoded postcodes
+    introduced: array  # uint16 days since `history.EPOCH`, 0 if unknown
+    terminated: array  # uint16 days since `history.EPOCH`, 0 if still active
+    latitudes: array  # float32, NaN if unknown
+    longitudes: array  # float32, NaN if unknown
+    countries: array  # uint8 index into `country.COUNTRIES`, 0 if unknown
+
+
+def find_onspd_csvs(onspd_dir: Union[str, Path]) -> List[Path]:
+    """List the CSV files of an ONSPD download.
+
+    Args:
+        onspd_dir (str | Path): The unzipped download, e.g. "ONSPD_MAY_2023_UK". The
+            files in "Data/multi_csv" are used if it exists, otherwise the CSV files
+            directly in `onspd_dir`.
+    Returns:
+        List[Path]: The CSV files, sorted by name
+    """
+    onspd_dir = Path(onspd_dir)
+    multi_csv = onspd_dir / "Data" / "multi_csv"
+    files = sorted((multi_csv if multi_csv.is_dir() else onspd_dir).glob("*.csv"))
+    if not files:
+        raise FileNotFoundError(f"No ONSPD CSV files in {onspd_dir}")
+    return files
+
+
+def release_from_path(onspd_dir: Union[str, Path]) -> str:
+    """Guess the release label (e.g. "2023-05") from the name of an ONSPD download.
+
+    Returns:
+        str: The release label, or "" if the name doesn't contain one
+    """
+    match = RELEASE_REGEX.search(Path(onspd_dir).resolve().name)
+    if match is None or match.group(1).upper() not in MONTHS:
+        return ""
+    return f"{match.group(2)}-{MONTHS.index(match.group(1).upper()) + 1:02d}"
+
+
+def _normalise(postcode: str) -> str:
+    postcode = postcode.replace(" ", "").upper()
+    return f"{postcode[:-3]} {postcode[-3:]}"
+
+
+def _parse_days(value: str) -> int:
+    """Days since `EPOCH` of an ONSPD date ("YYYYMM" or "YYYYMMDD"), 0 if empty."""
+    digits = value.replace("-", "").strip()
+    if not digits:
+        return 0
+    day = int(digits[6:8]) if len(digits) >= 8 else 1
+    return (date(int(digits[:4]), int(digits[4:6]), day) - EPOCH).days
+
+
+def _parse_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+def read_onspd_csv(path: Union[str, Path], chunk_size: int = 10_000) -> OnspdColumns:
+    """Read the columns needed at runtime from one ONSPD CSV file.
+
+    Rows are parsed `chunk_size` at a time and packed into arrays straight away, so
+    memory is bounded by the chunk size plus 17 bytes per postcode. Postcodes that can't
+    be encoded (e.g. "GIR 0AA") are skipped.
+
+    Args:
+        path (str | Path): The CSV file
+        chunk_size (int): Number of rows parsed at a time. Defaults to 10000.
+    Returns:
+        OnspdColumns: Packed columns of the file
+    """
+    columns = OnspdColumns(
+        array("I"), array("H"), array("H"), array("f"), array("f"), array("B")
+    )
+    skipped = 0
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        postcode_column = next(
+            (header.index(name) for name in POSTCODE_COLUMNS if name in header), None
+        )
+        if postcode_column is None:
+            raise ValueError(f"{path} has no postcode column: {POSTCODE_COLUMNS}")
+        indices = [
+            header.index(name)
+            for name in (
+                INTRODUCED_COLUMN,
+                TERMINATED_COLUMN,
+                LATITUDE_COLUMN,
+                LONGITUDE_COLUMN,
+                COUNTRY_COLUMN,
+            )
+        ]
+        for chunk in iter(lambda: list(islice(reader, chunk_size)), []):
+            for row in chunk:
+                code = encode(_normalise(row[postcode_column]))
+                if code is None:
+                    skipped += 1
+                    continue
+                introduced, terminated, latitude, longitude, country = (
+                    row[i] for i in indices
+                )
+                columns.codes.append(code)
+                columns.introduced.append(_parse_days(introduced))
+                columns.terminated.append(_parse_days(terminated))
+                columns.latitudes.append(_parse_float(latitude))
+                columns.longitudes.append(_parse_float(longitude))
+                columns.countries.append(country_index(country))
+    if skipped:
+        logger.info("Skipped %s postcodes that can't be encoded in %s", skipped, path)
+    return columns
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_directory(
+    onspd_dir: Union[str, Path],
+    output_dir: Union[str, Path] = DATA_DIR,
+    release: Optional[str] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 10_000,
+    false_positive_rate: float = 0.01,
+) -> dict:
+    """Build all the runtime data files from an ONSPD download.
+
+    The files are first written to temporary names and only renamed once all of them
+    (and the manifest) are complete, so a failed build leaves the previous files intact.
+
+    Args:
+        onspd_dir (str | Path): The unzipped ONSPD download, see `find_onspd_csvs`
+        output_dir (str | Path): Where to write the files. Defaults to the package's
+            data directory.
+        release (str): Label of the release, e.g. "2023-05": up to 16 ASCII
+            characters. Defaults to the one in the name of `onspd_dir`, see
+            `release_from_path`.
+        workers (int): Number of processes reading CSV files in parallel. Defaults to
+            the number of CPUs.
+        chunk_size (int): Number of rows parsed at a time by each process. Defaults to
+            10000.
+        false_positive_rate (float): Target false-positive rate of the Bloom filter.
+            The rate measured on the built filter is recorded in the manifest.
+            Defaults to 0.01.
+    Returns:
+        dict: The manifest
+    Raises:
+        ValueError: If there is no release label, or it doesn't fit the headers of the
+            data files
+    """
+    if np is None:
+        raise ImportError("Building the data files requires numpy: pip install numpy")
+    files = find_onspd_csvs(onspd_dir)
+    release = release_from_path(onspd_dir) if release is None else release
+    if not release:
+        raise ValueError(
+            f'No release in the name of {onspd_dir}: give one, e.g. "2023-05"'
+        )
+    if not release.isascii() or len(release) > MAX_RELEASE_LENGTH:
+        raise ValueError(
+            f"The release {release!r} must be at most {MAX_RELEASE_LENGTH} ASCII "
+            "characters"
+        )
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    logger.info("Reading %s ONSPD files with %s workers", len(files), workers)
+
+    read = partial(read_onspd_csv, chunk_size=chunk_size)
+    if workers == 1:
+        tables = list(map(read, files))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            tables = list(executor.map(read, files))
+    codes, introduced, terminated, latitudes, longitudes, countries = (
+        np.concatenate([np.frombuffer(column, column.typecode) for column in columns])
+        for columns in zip(*tables)
+    )
+    del tables
+    active = terminated == 0
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = {name: output_dir / f"{name}.tmp" for name in DATA_FILES}
+    try:
+        count = _write_codes(codes[active], paths["postcodes.bin"], release)
+        directory = PostcodeDirectory(paths["postcodes.bin"])
+        found = directory.positions(codes)
+        positions = np.where(active, found, -1)
+        located = _write_coordinates(
+            directory, positions, latitudes, longitudes, paths["coordinates.bin"]
+        )
+        _write_countries(directory, positions, countries, paths["countries.bin"])
+        coordinates = CoordinateStore(paths["coordinates.bin"], directory)
+        write_spatial_index(coordinates, paths["spatial.bin"])
+        _, ended = _write_history_arrays(
+            directory, found, codes, introduced, terminated, paths["history.bin"]
+        )
+        del found, positions
+        write_corrections(directory, paths["corrections.json"])
+        measured = write_filter(
+            directory, paths["postcodes.bloom"], false_positive_rate
+        )
+        manifest = {
+            "release": release,
+            "postcodes": count,
+            "terminated": ended,
+            "with_coordinates": located,
+            "false_positive_rate": {
+                "target": false_positive_rate,
+                "measured": measured,
+            },
+            "sources": [path.name for path in files],
+            "files": {
+                name: {"sha256": _sha256(path), "bytes": path.stat().st_size}
+                for name, path in paths.items()
+            },
+        }
+        manifest_path = output_dir / f"{MANIFEST_NAME}.tmp"
+        manifest_path.write_text(json.dumps(manifest, indent=2) + "\n")
+        del directory, coordinates  # Close the memory maps before renaming
+        for name, path in paths.items():
+            os.replace(path, output_dir / name)
+        os.replace(manifest_path, output_dir / MANIFEST_NAME)
+    finally:
+        for path in paths.values():
+            if path.exists():
+                path.unlink()
+    logger.info(
+        "Wrote %s postcodes (%s terminated) of release %r to %s",
+        count,
+        ended,
+        release,
+        output_dir,
+    )
+    return manifest
+
+
+def verify_manifest(data_dir: Union[str, Path] = DATA_DIR) -> Dict[str, str]:
+    """Check the data files against the checksums of their manifest.
+
+    Args:
+        data_dir (str | Path): Directory with the data files and manifest. Defaults to
+            the package's data directory.
+    Returns:
+        Dict[str, str]: SHA-256 checksum of each file
+    Raises:
+        ValueError: If a file is missing or doesn't match its checksum
+    """
+    data_dir = Path(data_dir)
+    manifest = json.loads((data_dir / MANIFEST_NAME).read_text())
+    checksums = {}
+    for name, expected in manifest["files"].items():
+        path = data_dir / name
+        if not path.exists():
+            raise ValueError(f"{path} is missing")
+        checksums[name] = _sha256(path)
+        if checksums[name] != expected["sha256"]:
+            raise ValueError(f"{path} doesn't match the checksum of {MANIFEST_NAME}")
+    return checksums
@@ -0,0 +1,99 @@
+"""
+cache.py: Opt-in, size-bounded memoization of `parse`, `fix` and `fix_with_options`.
+
+OCR corpora repeat the same strings a lot (letterheads, footers, recurring addresses).
+With the cache enabled, repeated strings skip the regex and fix pipeline and return the
+result computed the first time.
+
+    >>> from uk_postcodes_parsing import cache
+    >>> cache.enable_cache(maxsize=100_000)
+    >>> cache.cache_info()["parse"]
+    CacheInfo(hits=0, misses=0, evictions=0, maxsize=100000, currsize=0)
+"""
+import threading
+from functools import lru_cache, wraps
+from typing import Callable, Dict, List, NamedTuple
+
+
+class CacheInfo(NamedTuple):
+    """Statistics of one memoized function. See `cache_info`."""
+
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+_memoized: List[Callable] = []
+_lock = threading.Lock()
+
+
+def memoize(func: Callable) -> Callable:
+    """Make `func` cacheable with `enable_cache`. Calls go straight to `func` until then.
+
+    Results are keyed on all the arguments. List results are copied on the way out, so
+    callers can't modify the cached value.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        cached = wrapper.cached
+        if cached is None:
+            return func(*args, **kwargs)
+        result = cached(*args, **kwargs)
+        return result.copy() if type(result) is list else result
+
+    wrapper.cached = None
+    _memoized.append(wrapper)
+    return wrapper
+
+
+def enable_cache(maxsize: int = 65536) -> None:
+    """Cache the results of `parse`, `fix` and `fix_with_options`.
+
+    Each function gets its own least-recently-used cache. Calling this again replaces
+    the caches (and their statistics) with empty ones.
+
+    Args:
+        maxsize (int): Maximum number of results kept per function. Defaults to 65536.
+    """
+    if maxsize < 1:
+        raise ValueError("maxsize must be at least 1")
+    with _lock:
+        for wrapper in _memoized:
+            wrapper.cached = lru_cache(maxsize=maxsize)(wrapper.__wrapped__)
+
+
+def disable_cache() -> None:
+    """Stop caching and drop all cached results."""
+    with _lock:
+        for wrapper in _memoized:
+            wrapper.cached = None
+
+
+def cache_clear() -> None:
+    """Drop all cached results and reset the statistics, keeping the cache enabled."""
+    with _lock:
+        for wrapper in _memoized:
+            if wrapper.cached is not None:
+                wrapper.cached.cache_clear()
+
+
+def cache_info() -> Dict[str, CacheInfo]:
+    """Statistics for every cached function since the cache was enabled or cleared.
+
+    Returns:
+        Dict[str, CacheInfo]: hits, misses, evictions, maxsize and currsize, by function
+            name. Empty if the cache is not enabled.
+    """
+    info = {}
+    for wrapper in _memoized:
+        cached = wrapper.cached
+        if cached is not None:
+            hits, misses, maxsize, currsize = cached.cache_info()
+            # Every miss adds an entry, so entries no longer held were evicted
+            info[wrapper.__name__] = CacheInfo(
+                hits, misses, misses - currsize, maxsize, currsize
+            )
+    return info
@@ -0,0 +1,319 @@
+"""
+cli.py: The `uk-postcodes` command line.
+
+Usage:
+    uk-postcodes build-directory ONSPD_MAY_2023_UK/ [--output DIR] [--workers N]
+    uk-postcodes extract [FILE | GLOB | DIR | -]... [--attempt-fix] [--format csv]
+    uk-postcodes serve [--host HOST] [--port PORT]
+"""
+import re
+import csv
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+from itertools import chain, groupby
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+from uk_postcodes_parsing.directory import DATA_DIR
+
+
+def _build_directory(args: argparse.Namespace) -> int:
+    from uk_postcodes_parsing.build import build_directory
+
+    manifest = build_directory(
+        args.onspd_dir,
+        output_dir=args.output,
+        release=args.release,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        false_positive_rate=args.false_positive_rate,
+    )
+    print(
+        f"Wrote {manifest['postcodes']:,} postcodes "
+        f"({manifest['terminated']:,} terminated, "
+        f"{manifest['with_coordinates']:,} with coordinates) "
+        f"of release {manifest['release']!r} to {args.output}"
+    )
+    print(
+        "Bloom filter false-positive rate: "
+        f"{manifest['false_positive_rate']['measured']:.4%} measured "
+        f"(target {manifest['false_positive_rate']['target']:.4%})"
+    )
+    return 0
+
+
+# Characters that make an input a glob pattern
+GLOB_MAGIC = re.compile(r"[*?[]")
+
+# Columns written by `extract`
+EXTRACT_FIELDS = (
+    "document",
+    "offset",
+    "original",
+    "postcode",
+    "fix_distance",
+    "is_in_ons_postcode_directory",
+)
+
+
+def _expand_inputs(inputs: List[str]) -> List[str]:
+    """Expand globs and directories (recursively) into file paths. "-" is stdin."""
+    paths = []
+    for name in inputs:
+        if name == "-":
+            paths.append(name)
+        elif Path(name).is_dir():
+            paths.extend(sorted(str(p) for p in Path(name).rglob("*") if p.is_file()))
+        elif GLOB_MAGIC.search(name):
+            matches = sorted(p for p in glob.glob(name, recursive=True))
+            if not matches:
+                raise FileNotFoundError(f"No files match {name!r}")
+            paths.extend(p for p in matches if Path(p).is_file())
+        elif Path(name).is_file():
+            paths.append(name)
+        else:
+            raise FileNotFoundError(f"No such file: {name!r}")
+    return paths
+
+
+def _documents(
+    paths: List[str], lines: bool, encoding: str
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """Document id and text pairs of `batch.extract_from_texts`. Without `lines`, files
+    are read by the workers (and stdin isn't expected: see `_extract`)."""
+    for path in paths:
+        if not lines:
+            yield path, None
+        elif path == "-":
+            for number, line in enumerate(sys.stdin, 1):
+                yield f"-:{number}", line
+        else:
+            with open(path, encoding=encoding) as f:
+                for number, line in enumerate(f, 1):
+                    yield f"{path}:{number}", line
+
+
+def _write_rows(rows: Iterable[tuple], output_format: str, output: IO[str]) -> None:
+    if output_format == "csv":
+        writer = csv.writer(output)
+        writer.writerow(EXTRACT_FIELDS)
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            output.write(json.dumps(dict(zip(EXTRACT_FIELDS, row))) + "\n")
+
+
+def _extract(args: argparse.Namespace) -> int:
+    from uk_postcodes_parsing import batch, ukpostcode
+
+    paths = _expand_inputs(args.inputs or ["-"])
+    counts = {"documents": 0, "postcodes": 0}
+
+    def counted(items: Iterable, key: str) -> Iterator:
+        for item in items:
+            counts[key] += 1
+            yield item
+
+    options = dict(
+        attempt_fix=args.attempt_fix or args.try_all_fix_options,
+        try_all_fix_options=args.try_all_fix_options,
+    )
+
+    def extract_files(paths: List[str]) -> Iterator[tuple]:
+        return batch.extract_from_texts(
+            counted(_documents(paths, args.lines, args.encoding), "documents"),
+            workers=args.workers,
+            chunksize=args.chunksize,
+            ordered=not args.unordered,
+            encoding=args.encoding,
+            **options,
+        )
+
+    def extract_stdin() -> Iterator[tuple]:
+        # Stream stdin in this process, without reading it all first
+        counts["documents"] += 1
+        found = ukpostcode.iter_postcodes(sys.stdin, **options)
+        return (("-", offset, postcode) for offset, postcode in found)
+
+    if args.lines:
+        results = extract_files(paths)
+    else:
+        # Keep the order of the inputs, with the files between stdin read by workers
+        results = chain.from_iterable(
+            extract_stdin() if is_stdin else extract_files(list(group))
+            for is_stdin, group in groupby(paths, key=lambda path: path == "-")
+        )
+    rows = (
+        (
+            document,
+            offset,
+            postcode.original,
+            postcode.postcode,
+            postcode.fix_distance,
+            postcode.is_in_ons_postcode_directory,
+        )
+        for document, offset, postcode in counted(results, "postcodes")
+    )
+
+    start = time.perf_counter()
+    if args.output is None:
+        _write_rows(rows, args.format, sys.stdout)
+    else:
+        with open(args.output, "w", newline="", encoding="utf-8") as output:
+            _write_rows(rows, args.format, output)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    if args.stats:
+        print(
+            f"{counts['documents']:,} documents, {counts['postcodes']:,} postcodes "
+            f"in {elapsed:.2f}s: {counts['documents'] / elapsed:,.0f} docs/s, "
+            f"{counts['postcodes'] / elapsed:,.0f} postcodes/s",
+            file=sys.stderr,
+        )
+    return 0
+
+
+def _serve(args: argparse.Namespace) -> int:
+    from uk_postcodes_parsing.server import serve
+
+    serve(args.host, args.port, args.max_batch_size, args.max_delay_ms / 1e3)
+    return 0
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="uk-postcodes", description="Parse UK postcodes and manage their data."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    # Options of every command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "-v", "--verbose", action="store_true", help="Log progress to stderr"
+    )
+
+    build = commands.add_parser(
+        "build-directory",
+        parents=[common],
+        help="Build the data files from an ONS Postcode Directory download",
+        description="Build the data files from an ONS Postcode Directory download.",
+    )
+    build.add_argument(
+        "onspd_dir", type=Path, help="Unzipped ONSPD download, e.g. ONSPD_MAY_2023_UK"
+    )
+    build.add_argument(
+        "--output",
+        type=Path,
+        default=DATA_DIR,
+        help="Where to write the data files (default: the package's data directory)",
+    )
+    build.add_argument(
+        "--release",
+        help="Release label, e.g. 2023-05, up to 16 ASCII characters (default: from "
+        "onspd_dir, required if its name has none)",
+    )
+    build.add_argument(
+        "--workers", type=int, help="Processes reading CSV files (default: CPUs)"
+    )
+    build.add_argument(
+        "--chunk-size", type=int, default=10_000, help="Rows parsed at a time"
+    )
+    build.add_argument(
+        "--false-positive-rate",
+        type=float,
+        default=0.01,
+        help="Target false-positive rate of the Bloom filter (default: 0.01)",
+    )
+    build.set_defaults(func=_build_directory)
+
+    extract = commands.add_parser(
+        "extract",
+        parents=[common],
+        help="Extract postcodes from text files or stdin",
+        description="Extract postcodes from text files or stdin, one row per postcode.",
+    )
+    extract.add_argument(
+        "inputs",
+        nargs="*",
+        metavar="INPUT",
+        help="Files, globs (quoted) or directories to read, or - for stdin (default)",
+    )
+    extract.add_argument(
+        "--attempt-fix", action="store_true", help="Attempt to fix OCR mistakes"
+    )
+    extract.add_argument(
+        "--try-all-fix-options",
+        action="store_true",
+        help="Return every possible fix (implies --attempt-fix)",
+    )
+    extract.add_argument(
+        "--lines",
+        action="store_true",
+        help="Treat every line as a document (ids are FILE:LINE)",
+    )
+    extract.add_argument(
+        "--format", choices=["jsonl", "csv"], default="jsonl", help="Output format"
+    )
+    extract.add_argument("--output", help="Write to this file instead of stdout")
+    extract.add_argument("--workers", type=int, help="Worker processes (default: CPUs)")
+    extract.add_argument(
+        "--chunksize", type=int, default=16, help="Documents sent to a worker at a time"
+    )
+    extract.add_argument(
+        "--unordered",
+        action="store_true",
+        help="Write results as soon as they are ready instead of in input order",
+    )
+    extract.add_argument("--encoding", default="utf-8", help="Encoding of the files")
+    extract.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print documents/s and postcodes/s to stderr",
+    )
+    extract.set_defaults(func=_extract)
+
+    server = commands.add_parser(
+        "serve",
+        parents=[common],
+        help="Serve the parse, validate and extract endpoints over HTTP",
+        description="Serve the parse, validate and extract endpoints over HTTP.",
+    )
+    server.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    server.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    server.add_argument(
+        "--max-batch-size", type=int, default=64, help="Largest micro-batch"
+    )
+    server.add_argument(
+        "--max-delay-ms",
+        type=float,
+        default=2.0,
+        help="Longest time a request waits for others to join its micro-batch",
+    )
+    server.set_defaults(func=_serve)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the `uk-postcodes` command line.
+
+    Args:
+        argv (List[str]): Command line arguments. Defaults to `sys.argv[1:]`.
+    Returns:
+        int: Exit status
+    """
+    args = _parser().parse_args(argv)
+    level = logging.INFO if args.verbose else logging.WARNING
+    logging.basicConfig(level=level)
+    logging.getLogger("uk-postcodes-parsing").setLevel(level)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, ImportError) as error:
+        print(f"uk-postcodes {args.command}: error: {error}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+columnar.py: Parse whole columns of postcodes (lists, NumPy arrays, pandas Series).
+
+Requires numpy (`pip install uk_postcodes_parsing[numpy]`).
+
+Each distinct value is parsed once with `postcode_utils.to_components`, and the results
+are broadcast back to the rows as arrays. No `Postcode` object is created per row, and
+directory membership is checked for all distinct postcodes with one vectorised search.
+
+    >>> from uk_postcodes_parsing.columnar import parse_array
+    >>> columns = parse_array(df["postcode"])
+    >>> df = df.assign(**columns.to_dict())
+"""
+from typing import Any, NamedTuple, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from uk_postcodes_parsing.bloom import get_membership
+from uk_postcodes_parsing.directory import encode_many
+from uk_postcodes_parsing.fix import fix, get_fix_distance
+from uk_postcodes_parsing.postcode_utils import to_components
+
+# Columns holding postcode components (object arrays of str, None where invalid)
+COMPONENT_COLUMNS = (
+    "postcode",
+    "outcode",
+    "incode",
+    "area",
+    "district",
+    "sub_district",
+    "sector",
+    "unit",
+)
+
+
+class PostcodeColumns(NamedTuple):
+    """Struct-of-arrays result of `parse_array`. All arrays have one entry per row.
+
+    String columns are object arrays holding None where the row is not a valid postcode.
+    """
+
+    postcode: "np.ndarray"
+    outcode: "np.ndarray"
+    incode: "np.ndarray"
+    area: "np.ndarray"
+    district: "np.ndarray"
+    sub_district: "np.ndarray"
+    sector: "np.ndarray"
+    unit: "np.ndarray"
+    is_valid: "np.ndarray"
+    in_directory: "np.ndarray"
+    fix_distance: "np.ndarray"
+
+    def to_dict(self) -> dict:
+        """Return the columns as a dictionary of arrays, e.g. to build a DataFrame."""
+        return self._asdict()
+
+
+def parse_array(values: Sequence[Any], attempt_fix: bool = True) -> PostcodeColumns:
+    """Parse a column of postcodes into arrays of components.
+
+    Args:
+        values (Sequence): Raw postcodes, e.g. a list, NumPy array or pandas Series.
+            Values that are not strings (None, NaN, ...) are treated as invalid.
+        attempt_fix (bool): Attempt to fix postcodes, like `ukpostcode.parse`.
+            Defaults to True.
+    Returns:
+        PostcodeColumns: postcode, outcode, incode, area, district, sub_district, sector,
+            unit, is_valid, in_directory and fix_distance arrays.
+    """
+    if np is None:
+        raise ImportError("parse_array requires numpy: pip install numpy")
+    if hasattr(values, "tolist"):
+        values = values.tolist()
+
+    # Factorize: parse each distinct value once
+    distinct = {}
+    inverse = np.fromiter(
+        (distinct.setdefault(value, len(distinct)) for value in values),
+        dtype=np.intp,
+        count=len(values),
+    )
+
+    columns = {name: [None] * len(distinct) for name in COMPONENT_COLUMNS}
+    is_valid = np.zeros(len(distinct), dtype=bool)
+    fix_distance = np.zeros(len(distinct), dtype=np.int8)
+    for i, value in enumerate(distinct):
+        if not isinstance(value, str):
+            continue
+        components = to_components(value)
+        if components is None and attempt_fix:
+            components = to_components(fix(value))
+        if components is None:
+            continue
+        for name in COMPONENT_COLUMNS:
+            columns[name][i] = getattr(components, name)
+        is_valid[i] = True
+        fix_distance[i] = get_fix_distance(value, components.postcode)
+
+    codes = encode_many(columns["postcode"])
+    in_directory = get_membership().contains_codes(codes)
+    return PostcodeColumns(
+        **{name: _object_array(column)[inverse] for name, column in columns.items()},
+        is_valid=is_valid[inverse],
+        in_directory=in_directory[inverse],
+        fix_distance=fix_distance[inverse],
+    )
+
+
+def _object_array(values: list) -> "np.ndarray":
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
@@ -0,0 +1,174 @@
+"""
+correction.py: Directory-aware OCR correction of postcodes.
+
+`fix` and `fix_with_options` only swap 0/O and 1/I, and can return postcodes that don't
+exist. `correct` instead tries every character against a weighted confusion matrix
+(5/S, 8/B, 2/Z, 6/G, ...) and only keeps postcodes that are in the ONS Postcode
+Directory. Candidates are searched character by character through a trie of the real
+outcodes, then through the real sectors and units, so branches that can't lead to a
+real postcode are pruned straight away.
+
+    >>> from uk_postcodes_parsing.correction import correct
+    >>> correct("ECIR IU8")
+    [Correction(postcode='EC1R 1UB', score=0.648)]
+"""
+import heapq
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from uk_postcodes_parsing.directory import (
+    PostcodeDirectory,
+    get_directory,
+    encode,
+)
+
+# (character, character, weight) pairs that OCR commonly confuses. The weight is how
+# likely the confusion is: the score of a candidate is the product of the weights of
+# the characters it changes (unchanged characters weigh 1).
+OCR_CONFUSIONS = (
+    ("0", "O", 0.9),
+    ("1", "I", 0.9),
+    ("1", "L", 0.6),
+    ("5", "S", 0.8),
+    ("8", "B", 0.8),
+    ("2", "Z", 0.7),
+    ("6", "G", 0.7),
+    ("0", "D", 0.5),
+    ("0", "Q", 0.4),
+    ("4", "A", 0.4),
+    ("7", "T", 0.4),
+    ("U", "V", 0.5),
+)
+
+# Marks the end of an outcode in the trie
+_END = ""
+
+
+class Correction(NamedTuple):
+    """A real postcode and how likely it is to be the intended one (0 < score <= 1)."""
+
+    postcode: str
+    score: float
+
+
+def confusion_matrix(
+    pairs: Iterable[Tuple[str, str, float]] = OCR_CONFUSIONS
+) -> Dict[str, Dict[str, float]]:
+    """Build a symmetric confusion matrix from (character, character, weight) pairs.
+
+    Args:
+        pairs (Iterable[Tuple[str, str, float]]): Confusable characters and weights
+    Returns:
+        Dict[str, Dict[str, float]]: observed character => {intended character: weight}
+    """
+    matrix = {}
+    for a, b, weight in pairs:
+        if not 0 < weight <= 1:
+            raise ValueError(f"Weight of {a!r}/{b!r} must be in (0, 1]")
+        matrix.setdefault(a, {})[b] = weight
+        matrix.setdefault(b, {})[a] = weight
+    return matrix
+
+
+class Corrector:
+    """Search a postcode directory for the real postcodes closest to an OCR reading.
+
+    Constructor arguments:
+        directory (PostcodeDirectory): Directory to search. Defaults to the packaged one.
+        confusions (Dict[str, Dict[str, float]]): Confusion matrix, see `confusion_matrix`.
+            Defaults to `confusion_matrix(OCR_CONFUSIONS)`.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[PostcodeDirectory] = None,
+        confusions: Optional[Dict[str, Dict[str, float]]] = None,
+    ):
+        self.directory = directory if directory is not None else get_directory()
+        self.confusions = confusion_matrix() if confusions is None else confusions
+        self._trie = {}
+        for outcode in self.directory.outcodes():
+            node = self._trie
+            for char in outcode:
+                node = node.setdefault(char, {})
+            node[_END] = outcode
+
+    def _options(self, char: str) -> List[Tuple[str, float]]:
+        return [(char, 1.0), *self.confusions.get(char, {}).items()]
+
+    def correct(self, text: str, k: int = 5) -> List[Correction]:
+        """Find the `k` most likely real postcodes for an OCR reading.
+
+        Args:
+            text (str): The raw postcode, e.g. "EC1R IU8". Case and spaces are ignored.
+            k (int): Maximum number of postcodes to return. Defaults to 5.
+        Returns:
+            List[Correction]: Real postcodes with their score, best first
+        """
+        compact = "".join(text.split()).upper()
+        if not 5 <= len(compact) <= 7 or k < 1:
+            return []
+        outward, inward = compact[:-3], compact[-3:]
+        best = []  # Min-heap of the k best (score, postcode) so far
+
+        def threshold() -> float:
+            return best[0][0] if len(best) == k else 0.0
+
+        def search_incode(outcode: str, score: float):
+            for sector, sector_weight in self._options(inward[0]):
+                sector_score = score * sector_weight
+                if not sector.isdigit() or sector_score <= threshold():
+                    continue
+                start = encode(f"{outcode} {sector}AA")
+                # Units of a sector are the 26 * 26 codes following "AA"
+                first, last = self.directory.index_range(start, start + 676)
+                if first == last:  # Sector doesn't exist
+                    continue
+                for u1, w1 in self._options(inward[1]):
+                    for u2, w2 in self._options(inward[2]):
+                        unit_score = sector_score * w1 * w2
+                        if not (u1 + u2).isalpha() or unit_score <= threshold():
+                            continue
+                        postcode = f"{outcode} {sector}{u1}{u2}"
+                        if self.directory.contains_code(encode(postcode)):
+                            item = (unit_score, postcode)
+                            if len(best) < k:
+                                heapq.heappush(best, item)
+                            else:
+                                heapq.heappushpop(best, item)
+
+        def search_outcode(node: dict, i: int, score: float):
+            if score <= threshold():
+                return
+            if i == len(outward):
+                if _END in node:
+                    search_incode(node[_END], score)
+                return
+            for char, weight in self._options(outward[i]):
+                child = node.get(char)
+                if child is not None:
+                    search_outcode(child, i + 1, score * weight)
+
+        search_outcode(self._trie, 0, 1.0)
+        return [
+            Correction(postcode, round(score, 6))
+            for score, postcode in sorted(best, key=lambda item: (-item[0], item[1]))
+        ]
+
+
+_corrector: Optional[Corrector] = None
+
+
+def correct(text: str, k: int = 5) -> List[Correction]:
+    """Find the `k` most likely real postcodes for an OCR reading, using the packaged
+    directory and the default confusion matrix. See `Corrector.correct`.
+
+    Args:
+        text (str): The raw postcode, e.g. "EC1R IU8". Case and spaces are ignored.
+        k (int): Maximum number of postcodes to return. Defaults to 5.
+    Returns:
+        List[Correction]: Real postcodes with their score, best first
+    """
+    global _corrector
+    if _corrector is None or _corrector.directory is not get_directory():
+        _corrector = Corrector()
+    return _corrector.correct(text, k)
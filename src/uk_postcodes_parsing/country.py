@@ -0,0 +1,209 @@
+"""
+country.py: Country of each postcode of the ONS Postcode Directory.
+
+Countries are shipped as a binary file of one byte per postcode, aligned with the sorted
+postcodes of the directory like the coordinates (see `geo`): the country of the postcode
+at position `i` of the directory is `COUNTRIES[body[i]]`.
+
+File layout (little-endian):
+    header: magic (4s), version (H), reserved (H), release (16s), count (I)
+    body:   count x uint8 index into `COUNTRIES` (0 if unknown)
+
+    >>> from uk_postcodes_parsing.country import get_countries
+    >>> get_countries().lookup("EH16 5AY")
+    'Scotland'
+"""
+import mmap
+import logging
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from uk_postcodes_parsing.directory import (
+    DATA_DIR,
+    HEADER,
+    VERSION,
+    PostcodeDirectory,
+    get_directory,
+    encode,
+)
+from uk_postcodes_parsing.registry import current
+
+logger = logging.getLogger("uk-postcodes-parsing.country")
+
+DEFAULT_COUNTRIES_PATH = DATA_DIR / "countries.bin"
+
+MAGIC = b"UKPN"
+
+# Countries by index in the file, with their ONS codes (the "ctry" column of ONSPD)
+COUNTRIES = (
+    None,
+    "England",
+    "Wales",
+    "Scotland",
+    "Northern Ireland",
+    "Channel Islands",
+    "Isle of Man",
+)
+COUNTRY_CODES = (
+    None,
+    "E92000001",
+    "W92000004",
+    "S92000003",
+    "N92000002",
+    "L93000001",
+    "M83000003",
+)
+
+
+def country_index(ons_code: str) -> int:
+    """Index in `COUNTRIES` of an ONS country code (e.g. "E92000001"), 0 if unknown."""
+    try:
+        return COUNTRY_CODES.index(ons_code.strip(), 1)
+    except ValueError:
+        return 0
+
+
+class CountryStore:
+    """Read-only view over a binary countries file.
+
+    Constructor arguments:
+        path (str | Path): Path to a file written by `write_countries`.
+        directory (PostcodeDirectory): The directory the countries are aligned with.
+            Defaults to the packaged one.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_COUNTRIES_PATH,
+        directory: Optional[PostcodeDirectory] = None,
+    ):
+        self.path = Path(path)
+        self.directory = directory if directory is not None else get_directory()
+        with open(self.path, "rb") as f:
+            magic, version, _, release, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a countries file: {self.path}")
+            release = release.rstrip(b"\0").decode("ascii")
+            if count != len(self.directory) or release != self.directory.release:
+                raise ValueError(
+                    f"{self.path} ({release!r}, {count} postcodes) is not aligned with "
+                    f"the directory ({self.directory.release!r}, "
+                    f"{len(self.directory)} postcodes)"
+                )
+            self._mmap = None
+            if count == 0:
+                self._countries = memoryview(b"")
+            else:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._countries = memoryview(self._mmap)[
+                    HEADER.size : HEADER.size + count
+                ]
+        logger.debug("Loaded countries of %s postcodes from %s", count, self.path)
+
+    def __reduce__(self):
+        """Pickle the paths only, so other processes map the same files."""
+        return type(self), (self.path, self.directory)
+
+    def lookup(self, postcode: str) -> Optional[str]:
+        """Find the country of a postcode.
+
+        Args:
+            postcode (str): The normalised postcode, e.g. "EC1R 1UB"
+        Returns:
+            str: The country, e.g. "England", or None if the postcode is not in the
+                directory or has no country
+        """
+        code = encode(postcode)
+        i = -1 if code is None else self.directory.position(code)
+        return None if i < 0 else COUNTRIES[self._countries[i]]
+
+    def indices(self, positions: "np.ndarray") -> "np.ndarray":
+        """Find the countries of many postcodes by position in the directory. Requires
+        numpy.
+
+        Args:
+            positions (np.ndarray): Positions in the directory, e.g. from
+                `PostcodeDirectory.positions`. Negative positions have no country.
+        Returns:
+            np.ndarray: uint8 indices into `COUNTRIES`, 0 where unknown
+        """
+        if np is None:
+            raise ImportError("indices requires numpy: pip install numpy")
+        positions = np.asarray(positions, dtype=np.int64)
+        found = positions >= 0
+        indices = np.zeros(len(positions), dtype=np.uint8)
+        indices[found] = np.frombuffer(self._countries, np.uint8)[positions[found]]
+        return indices
+
+
+def _write_countries(
+    directory: PostcodeDirectory,
+    positions: "np.ndarray",
+    indices: Sequence[int],
+    path: Union[str, Path] = DEFAULT_COUNTRIES_PATH,
+) -> int:
+    """Write countries by directory position (-1 to skip). Requires numpy.
+
+    Args:
+        directory (PostcodeDirectory): The directory to align the countries with
+        positions (np.ndarray): Position in the directory of each postcode
+        indices (Sequence[int]): Index in `COUNTRIES` of the country of each postcode
+        path (str | Path): Where to write the file
+    Returns:
+        int: The number of postcodes of the directory with a country
+    """
+    indices = np.asarray(indices, dtype=np.uint8)
+    if len(positions) != len(indices):
+        raise ValueError("positions and indices must have the same length")
+    found = positions >= 0
+    body = np.zeros(len(directory), dtype=np.uint8)
+    body[positions[found]] = indices[found]
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        release = directory.release.encode("ascii")
+        f.write(HEADER.pack(MAGIC, VERSION, 0, release, len(directory)))
+        f.write(body.tobytes())
+    return int(np.count_nonzero(body))
+
+
+def write_countries(
+    directory: PostcodeDirectory,
+    postcodes: Sequence[str],
+    ons_codes: Sequence[str],
+    path: Union[str, Path] = DEFAULT_COUNTRIES_PATH,
+) -> int:
+    """Write the countries of the postcodes of `directory` to a binary file. Requires
+    numpy.
+
+    Postcodes that are not in the directory are skipped.
+
+    Args:
+        directory (PostcodeDirectory): The directory to align the countries with
+        postcodes (Sequence[str]): Normalised postcodes, e.g. ["EC1R 1UB", "E3 4SS"]
+        ons_codes (Sequence[str]): ONS country code of each postcode, e.g. "E92000001"
+        path (str | Path): Where to write the file
+    Returns:
+        int: The number of postcodes of the directory with a country
+    """
+    if np is None:
+        raise ImportError("write_countries requires numpy: pip install numpy")
+    codes = [encode(postcode) for postcode in postcodes]
+    codes = np.array([-1 if code is None else code for code in codes], dtype=np.int64)
+    indices = [country_index(ons_code) for ons_code in ons_codes]
+    return _write_countries(directory, directory.positions(codes), indices, path)
+
+
+def get_countries() -> CountryStore:
+    """Return the countries of the active release (see `registry`), loading them on
+    first use.
+
+    Returns:
+        CountryStore: The countries shared by the whole process
+    """
+    return current().countries
@@ -0,0 +1,619 @@
+"""
+directory.py: Compact, memory-mapped ONS Postcode Directory.
+
+The directory is shipped as a binary file of sorted unsigned 32-bit integers, one per
+postcode. Each postcode is packed into an integer with an order-preserving encoding so
+membership checks are a binary search over a memory-mapped array instead of a lookup in
+a set of ~1.8M Python strings.
+
+The array is never copied into the process: worker processes that open the same file,
+or receive a pickled directory (which only holds its path), read the same physical
+pages from the operating system's page cache. Each worker only adds a few kB of private
+memory, however many workers there are. Reads take no lock.
+
+File layout (little-endian):
+    header: magic (4s), version (H), reserved (H), release (16s), count (I)
+    body:   count x uint32, sorted ascending, no duplicates
+"""
+import re
+import sys
+import mmap
+import struct
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Union, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from uk_postcodes_parsing.postcode_utils import to_components
+from uk_postcodes_parsing.registry import DATA_DIR, current
+
+logger = logging.getLogger("uk-postcodes-parsing.directory")
+
+DEFAULT_DIRECTORY_PATH = DATA_DIR / "postcodes.bin"
+
+MAGIC = b"UKPC"
+VERSION = 1
+HEADER = struct.Struct("<4sHH16sI")
+
+# Normalised postcode split into area, district digits, sub-district and incode
+ENCODABLE_REGEX = re.compile(
+    r"([A-Z])([A-Z]?)([0-9])(?:([0-9])|([A-Z]))? ([0-9])([A-Z])([A-Z])"
+)
+
+# Start of a normalised postcode, e.g. "E", "EC1", "EC1R 1U". Groups as ENCODABLE_REGEX
+# plus the space between the outward and inward codes.
+PREFIX_REGEX = re.compile(
+    r"(?:([A-Z])([A-Z]?)(?:([0-9])(?:([0-9])|([A-Z]))?"
+    r"(?:( )(?:([0-9])(?:([A-Z])([A-Z])?)?)?)?)?)?"
+)
+
+# Number of distinct district (digit, digit | sub-district letter) and incode values
+_DISTRICTS = 370
+_INCODES = 6760
+_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+# Every code is smaller than this, so codes fit in unsigned 32-bit integers
+MAX_CODE = 26 * 27 * _DISTRICTS * _INCODES
+
+
+def encode(postcode: str) -> Optional[int]:
+    """Pack a normalised postcode (e.g. "EC1R 1UB") into an integer below `MAX_CODE`.
+
+    The encoding preserves the area -> district -> sub-district -> sector -> unit hierarchy,
+    so sorting the integers keeps every area, district and sector contiguous (see
+    `code_range`), and sets, joins and sorts can run on integer arrays instead of strings.
+
+    Args:
+        postcode (str): The normalised postcode to encode
+    Returns:
+        int: The encoded postcode, or None if the string is not a normalised postcode
+    """
+    match = ENCODABLE_REGEX.fullmatch(postcode)
+    if match is None:
+        return None
+    a1, a2, d1, d2, sub, sector, u1, u2 = match.groups()
+    area = (ord(a1) - 65) * 27 + (ord(a2) - 64 if a2 else 0)
+    district = (ord(d1) - 48) * 37
+    if d2:
+        district += 27 + ord(d2) - 48
+    elif sub:
+        district += ord(sub) - 64
+    incode = (ord(sector) - 48) * 676 + (ord(u1) - 65) * 26 + ord(u2) - 65
+    return (area * _DISTRICTS + district) * _INCODES + incode
+
+
+def decode(code: int) -> str:
+    """Unpack an integer produced by `encode` into a normalised postcode.
+
+    Args:
+        code (int): The encoded postcode
+    Returns:
+        str: The normalised postcode
+    """
+    outward, incode = divmod(code, _INCODES)
+    area, district = divmod(outward, _DISTRICTS)
+    a1, a2 = divmod(area, 27)
+    d1, rest = divmod(district, 37)
+    sector, unit = divmod(incode, 676)
+    u1, u2 = divmod(unit, 26)
+    outcode = _LETTERS[a1] + (_LETTERS[a2 - 1] if a2 else "") + str(d1)
+    if rest > 26:
+        outcode += str(rest - 27)
+    elif rest:
+        outcode += _LETTERS[rest - 1]
+    return f"{outcode} {sector}{_LETTERS[u1]}{_LETTERS[u2]}"
+
+
+def encode_many(postcodes: Iterable[str]) -> "np.ndarray":
+    """Encode many normalised postcodes at once, without a Python call per postcode.
+    Requires numpy.
+
+    Args:
+        postcodes (Iterable[str]): Normalised postcodes, e.g. a list, NumPy array or
+            pandas Series. Values that are not normalised postcodes (None, "ec1r 1ub",
+            ...) are encoded as -1.
+    Returns:
+        np.ndarray: int64 array of codes, as `encode`, with -1 where not encodable
+    """
+    if np is None:
+        raise ImportError("encode_many requires numpy: pip install numpy")
+    chars, fits = _code_points(postcodes, 8)
+    return np.where(fits, _encode_chars(chars), -1)
+
+
+def _code_points(values: Iterable, width: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Code points of strings as an (n, width) int64 array, zero padded, and whether
+    each string fits in `width` characters. Values are converted with `str`."""
+    if hasattr(values, "to_numpy"):
+        values = values.to_numpy()
+    strings = np.asarray(values if hasattr(values, "__len__") else list(values))
+    strings = strings.astype(str).reshape(-1)
+    if strings.dtype.itemsize > 4 * width:
+        fits = np.char.str_len(strings) <= width
+    else:
+        fits = np.ones(len(strings), dtype=bool)
+    strings = strings.astype(f"<U{width}")  # Pads, or truncates what doesn't fit
+    return strings.view(np.uint32).reshape(len(strings), width).astype(np.int64), fits
+
+
+def _encode_chars(chars: "np.ndarray") -> "np.ndarray":
+    """Encode rows of 8 code points (see `_code_points`), -1 where not encodable."""
+    length = (chars != 0).sum(axis=1)
+    valid = (length >= 6) & (length <= 8)
+    rows = np.arange(len(chars))
+
+    def char(position):
+        return chars[rows, np.clip(position, 0, 7)]
+
+    def is_digit(c):
+        return (c >= 48) & (c <= 57)
+
+    def is_letter(c):
+        return (c >= 65) & (c <= 90)
+
+    # Inward code: the last 4 characters are a space, a digit and two letters
+    space, sector, u1, u2 = (char(length - i) for i in (4, 3, 2, 1))
+    valid &= (space == 32) & is_digit(sector) & is_letter(u1) & is_letter(u2)
+    # Outward code: 1-2 letters, a digit, and an optional digit or letter
+    a1, c1, c2, c3 = chars[:, 0], chars[:, 1], chars[:, 2], chars[:, 3]
+    two_letters = is_letter(c1)
+    d1 = np.where(two_letters, c2, c1)
+    outward = length - 4
+    has_rest = outward == np.where(two_letters, 4, 3)
+    rest = np.where(two_letters, c3, c2)
+    valid &= is_letter(a1) & is_digit(d1) & (has_rest | (outward == two_letters + 2))
+    valid &= ~has_rest | is_digit(rest) | is_letter(rest)
+
+    area = (a1 - 65) * 27 + np.where(two_letters, c1 - 64, 0)
+    district = (d1 - 48) * 37
+    district += np.where(has_rest, np.where(is_digit(rest), rest - 21, rest - 64), 0)
+    incode = (sector - 48) * 676 + (u1 - 65) * 26 + u2 - 65
+    codes = (area * _DISTRICTS + district) * _INCODES + incode
+    return np.where(valid, codes, -1)
+
+
+def decode_many(codes: "np.ndarray") -> "np.ndarray":
+    """Decode many integers produced by `encode` at once. Requires numpy.
+
+    Args:
+        codes (np.ndarray): Encoded postcodes. Values that are not codes (e.g. -1 from
+            `encode_many`) are decoded as "".
+    Returns:
+        np.ndarray: Fixed-width string array ("<U8") of normalised postcodes
+    """
+    if np is None:
+        raise ImportError("decode_many requires numpy: pip install numpy")
+    codes = np.asarray(codes, dtype=np.int64).reshape(-1)
+    valid = (codes >= 0) & (codes < MAX_CODE)
+    outward, incode = np.divmod(np.where(valid, codes, 0), _INCODES)
+    area, district = np.divmod(outward, _DISTRICTS)
+    a1, a2 = np.divmod(area, 27)
+    d1, rest = np.divmod(district, 37)
+    sector, unit = np.divmod(incode, 676)
+    u1, u2 = np.divmod(unit, 26)
+
+    # Write the code points of each postcode left to right, skipping absent characters
+    chars = np.zeros((len(codes), 8), dtype=np.uint32)
+    rows = np.arange(len(codes))
+    chars[:, 0] = a1 + 65
+    position = np.ones(len(codes), dtype=np.int64)
+    for value, present in (
+        (a2 + 64, a2 > 0),
+        (d1 + 48, np.ones(len(codes), dtype=bool)),
+        (np.where(rest > 26, rest + 21, rest + 64), rest > 0),
+        (32, True),
+        (sector + 48, True),
+        (u1 + 65, True),
+        (u2 + 65, True),
+    ):
+        present = np.broadcast_to(present, position.shape)
+        chars[rows[present], position[present]] = np.broadcast_to(value, rows.shape)[
+            present
+        ]
+        position += present
+    chars[~valid] = 0
+    return chars.view("<U8").reshape(-1)
+
+
+def _prefix_range(prefix: str) -> Optional[Tuple[int, int]]:
+    """Find the codes of all postcodes starting with `prefix`.
+
+    Every prefix of a normalised postcode covers a contiguous range of codes, e.g. "E1"
+    covers E1, E1A-E1Z and E10-E19, and "EC1R 1" covers sector EC1R 1.
+
+    Args:
+        prefix (str): Start of a normalised postcode
+    Returns:
+        Tuple[int, int]: Smallest code included and smallest code excluded, or None if
+            no postcode can start with `prefix`
+    """
+    match = PREFIX_REGEX.fullmatch(prefix)
+    if match is None:
+        return None
+    a1, a2, d1, d2, sub, space, sector, u1, u2 = match.groups()
+    start, size = 0, 26 * 27 * _DISTRICTS * _INCODES
+    if a1:
+        start, size = (ord(a1) - 65) * 27 * _DISTRICTS * _INCODES, 27 * _DISTRICTS
+        if a2:
+            start += (ord(a2) - 64) * _DISTRICTS * _INCODES
+        if a2 or d1:
+            size = _DISTRICTS
+        size *= _INCODES
+    if d1:
+        start, size = start + (ord(d1) - 48) * 37 * _INCODES, 37 * _INCODES
+        if d2:
+            start += (27 + ord(d2) - 48) * _INCODES
+        elif sub:
+            start += (ord(sub) - 64) * _INCODES
+        if d2 or sub or space:
+            size = _INCODES
+    if sector:
+        start, size = start + (ord(sector) - 48) * 676, 676
+    if u1:
+        start, size = start + (ord(u1) - 65) * 26, 26
+    if u2:
+        start, size = start + ord(u2) - 65, 1
+    return start, start + size
+
+
+def code_range(component: str) -> Optional[Tuple[int, int]]:
+    """Find the codes of all postcodes in an area, district, outcode or sector.
+
+    Unlike `_prefix_range`, components follow the postcode hierarchy: district "E1"
+    covers E1 and its sub-districts E1A-E1Z, but not E10-E19.
+
+    Args:
+        component (str): Normalised area ("EC"), district ("EC1"), outcode ("EC1R"),
+            sector ("EC1R 1") or postcode ("EC1R 1UB")
+    Returns:
+        Tuple[int, int]: Smallest code included and smallest code excluded, or None if
+            `component` is not a postcode component
+    """
+    # The first postcode the component can contain
+    if " " in component:
+        first = component + "AA" if len(component.split(" ")[1]) == 1 else component
+    elif component.isalpha():
+        first = component + "0 0AA"
+    else:
+        first = component + " 0AA"
+    components = to_components(first)
+    start = encode(first)
+    if components is None or start is None or components.postcode != first:
+        return None
+    if component == components.area:
+        size = _DISTRICTS * _INCODES
+    elif (
+        component == components.district and len(component) == len(components.area) + 1
+    ):
+        size = 27 * _INCODES  # District and its sub-districts
+    elif component == components.outcode:
+        size = _INCODES
+    elif component == components.sector:
+        size = 676
+    elif component == components.postcode:
+        size = 1
+    else:
+        return None
+    return start, start + size
+
+
+class MembershipSource(NamedTuple):
+    """What answered a membership check: the release of the data, and whether the
+    answer can be a false positive (see `bloom`)."""
+
+    release: str
+    probabilistic: bool
+
+
+class PostcodeDirectory:
+    """Read-only view over a binary postcode directory file.
+
+    The file is memory-mapped, so opening it is cheap and the pages are shared between
+    processes by the operating system.
+
+    Constructor arguments:
+        path (str | Path): Path to a file written by `write_directory`.
+
+    Attributes:
+        release (str): Label of the ONS Postcode Directory release, e.g. "2023-05".
+        source (MembershipSource): The release, and that membership checks are exact.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_DIRECTORY_PATH):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            magic, version, _, release, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a postcode directory file: {self.path}")
+            self.release = release.rstrip(b"\0").decode("ascii")
+            self.source = MembershipSource(self.release, probabilistic=False)
+            self._mmap = None
+            self._outcodes = None
+            if count == 0:
+                self._codes = array("I")
+            elif sys.byteorder == "little":
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                body = memoryview(self._mmap)[HEADER.size : HEADER.size + 4 * count]
+                self._codes = body.cast("I")
+            else:
+                self._codes = array("I", f.read(4 * count))
+                self._codes.byteswap()
+        logger.debug("Loaded %s postcodes from %s", len(self._codes), self.path)
+
+    def __reduce__(self):
+        """Pickle the path only, so other processes map the same file."""
+        return type(self), (self.path,)
+
+    def warm(self) -> None:
+        """Read every page of the memory-mapped file so later lookups don't page fault."""
+        if self._mmap is not None:
+            for offset in range(0, len(self._mmap), mmap.PAGESIZE):
+                self._mmap[offset]
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, postcode: str) -> bool:
+        code = encode(postcode)
+        return code is not None and self.contains_code(code)
+
+    def __iter__(self) -> Iterator[str]:
+        return map(decode, self._codes)
+
+    def __getitem__(self, position: int) -> str:
+        """Return the postcode at a position of the sorted directory."""
+        return decode(self._codes[position])
+
+    def contains_code(self, code: int) -> bool:
+        """Check if an encoded postcode is in the directory.
+
+        Args:
+            code (int): Postcode encoded with `encode`
+        Returns:
+            bool: True if the postcode is in the directory, False otherwise
+        """
+        codes = self._codes
+        i = bisect_left(codes, code)
+        return i < len(codes) and codes[i] == code
+
+    def index_range(self, start: int, stop: int) -> Tuple[int, int]:
+        """Find the positions of the encoded postcodes in `[start, stop)`.
+
+        Because the encoding keeps areas, districts and sectors contiguous, this finds
+        e.g. all the postcodes of a sector with two binary searches.
+
+        Args:
+            start (int): Smallest code to include
+            stop (int): Smallest code to exclude
+        Returns:
+            Tuple[int, int]: First and one-past-last position in the sorted codes
+        """
+        codes = self._codes
+        return bisect_left(codes, start), bisect_left(codes, stop)
+
+    def outcodes(self) -> List[str]:
+        """List the distinct outcodes in the directory, in encoding order.
+
+        Returns:
+            List[str]: Outcodes, e.g. ["AB10", "AB11", ...]
+        """
+        if self._outcodes is None:
+            outcodes = []
+            codes = self._codes
+            i = 0
+            while i < len(codes):
+                outward = codes[i] // _INCODES
+                outcodes.append(decode(outward * _INCODES)[:-4])
+                i = bisect_left(codes, (outward + 1) * _INCODES, i)
+            self._outcodes = outcodes
+        return self._outcodes
+
+    def postcodes_in(self, component: str) -> List[str]:
+        """List the postcodes in an area, district, outcode or sector.
+
+        Districts include their sub-districts, e.g. "E1" lists E1 and E1W postcodes.
+
+        Args:
+            component (str): Normalised area ("EC"), district ("EC1"), outcode ("EC1R")
+                or sector ("EC1R 1")
+        Returns:
+            List[str]: Postcodes in directory order, empty if there are none
+        """
+        first, last = self._component_index_range(component)
+        return list(map(decode, self._codes[first:last]))
+
+    def count(self, component: str) -> int:
+        """Count the postcodes in an area, district, outcode or sector.
+
+        Args:
+            component (str): Normalised area, district, outcode or sector, see
+                `postcodes_in`
+        Returns:
+            int: Number of postcodes
+        """
+        first, last = self._component_index_range(component)
+        return last - first
+
+    def exists_outcode(self, outcode: str) -> bool:
+        """Check if an outcode (e.g. "EC1R") has any postcodes in the directory.
+
+        Unlike `count`, "E1" only checks outcode E1, not its sub-districts.
+        """
+        start = encode(outcode + " 0AA")
+        return start is not None and self._has_codes(start, start + _INCODES)
+
+    def exists_sector(self, sector: str) -> bool:
+        """Check if a sector (e.g. "EC1R 1") has any postcodes in the directory."""
+        start = encode(sector + "AA")
+        return start is not None and self._has_codes(start, start + 676)
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Autocomplete a partially typed postcode.
+
+        Args:
+            prefix (str): Start of a postcode, e.g. "ec1r 1". Case and repeated spaces
+                are ignored.
+            limit (int): Maximum number of postcodes to return. Defaults to 10.
+        Returns:
+            List[str]: Postcodes starting with `prefix`, in directory order
+        """
+        prefix = re.sub(r"\s+", " ", prefix.upper().lstrip())
+        span = _prefix_range(prefix)
+        if span is None:
+            return []
+        first, last = self.index_range(*span)
+        return list(map(decode, self._codes[first : min(last, first + limit)]))
+
+    def _has_codes(self, start: int, stop: int) -> bool:
+        first, last = self.index_range(start, stop)
+        return first < last
+
+    def _component_index_range(self, component: str) -> Tuple[int, int]:
+        span = code_range(component)
+        return (0, 0) if span is None else self.index_range(*span)
+
+    def position(self, code: int) -> int:
+        """Find where an encoded postcode is in the sorted directory.
+
+        Args:
+            code (int): Postcode encoded with `encode`
+        Returns:
+            int: Position of the postcode, or -1 if it is not in the directory
+        """
+        codes = self._codes
+        i = bisect_left(codes, code)
+        return i if i < len(codes) and codes[i] == code else -1
+
+    def positions(self, codes: "np.ndarray") -> "np.ndarray":
+        """Find where many encoded postcodes are in the sorted directory. Requires numpy.
+
+        Args:
+            codes (np.ndarray): Postcodes encoded with `encode`. Values outside
+                [0, MAX_CODE) (e.g. -1 for postcodes that can't be encoded) are never in
+                the directory.
+        Returns:
+            np.ndarray: Position of each postcode, -1 where it is not in the directory
+        """
+        if np is None:
+            raise ImportError("Install numpy to look up arrays of postcodes")
+        codes = np.asarray(codes, dtype=np.int64)
+        # Before the cast below, which would wrap larger values onto real codes
+        valid = (codes >= 0) & (codes < MAX_CODE)
+        table = np.asarray(self._codes)
+        if len(table) == 0:
+            return np.full(len(codes), -1, dtype=np.intp)
+        # Search with the table's own dtype so it is never copied
+        codes = np.where(valid, codes, 0).astype(table.dtype)
+        index = np.minimum(np.searchsorted(table, codes), len(table) - 1)
+        return np.where(valid & (table[index] == codes), index, -1)
+
+    def contains_codes(self, codes: "np.ndarray") -> "np.ndarray":
+        """Check many encoded postcodes at once. Requires numpy.
+
+        Args:
+            codes (np.ndarray): Postcodes encoded with `encode`. Values outside
+                [0, MAX_CODE) (e.g. -1 for postcodes that can't be encoded) are never in
+                the directory.
+        Returns:
+            np.ndarray: Boolean array, True where the postcode is in the directory
+        """
+        return self.positions(codes) >= 0
+
+
+def write_directory(
+    postcodes: Iterable[str],
+    path: Union[str, Path] = DEFAULT_DIRECTORY_PATH,
+    release: str = "",
+) -> int:
+    """Write normalised postcodes to a binary directory file.
+
+    Args:
+        postcodes (Iterable[str]): Normalised postcodes, e.g. ["EC1R 1UB", "E3 4SS"]
+        path (str | Path): Where to write the file
+        release (str): Label of the ONS Postcode Directory release, e.g. "2023-05"
+    Returns:
+        int: The number of postcodes written
+    """
+    codes = set()
+    skipped = 0
+    for postcode in postcodes:
+        code = encode(postcode)
+        if code is None:
+            skipped += 1
+        else:
+            codes.add(code)
+    if skipped:
+        logger.warning(
+            "Skipped %s postcodes that are not in normalised format", skipped
+        )
+    return _write_codes(codes, path, release)
+
+
+def _write_codes(
+    codes: Iterable[int], path: Union[str, Path], release: str = ""
+) -> int:
+    """Write encoded postcodes to a binary directory file. See `write_directory`.
+
+    A NumPy array of codes is deduplicated and sorted without a Python int per code.
+    """
+    if np is not None and isinstance(codes, np.ndarray):
+        body = np.unique(codes).astype("<u4")
+    else:
+        body = array("I", sorted(set(codes)))
+        if sys.byteorder != "little":
+            body.byteswap()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, release.encode("ascii"), len(body)))
+        f.write(body.tobytes())
+    return len(body)
+
+
+def get_directory() -> PostcodeDirectory:
+    """Return the directory of the active release (see `registry`), loading it on
+    first use.
+
+    Returns:
+        PostcodeDirectory: The directory shared by the whole process
+    """
+    return current().directory
+
+
+def is_loaded() -> bool:
+    """Check if the directory of the active release has been loaded.
+
+    Returns:
+        bool: True if a call to `get_directory` has loaded the directory
+    """
+    return current().is_loaded("directory")
+
+
+def preload(background: bool = False) -> Optional[threading.Thread]:
+    """Load the directory of the active release (and fault its pages in) up front.
+
+    Servers can call this at start-up so the first request doesn't pay the cost.
+
+    Args:
+        background (bool): Load in a daemon thread instead of blocking. Defaults to False.
+    Returns:
+        threading.Thread: The loading thread if `background` is True, otherwise None
+    """
+    if not background:
+        get_directory().warm()
+        return None
+    thread = threading.Thread(
+        target=lambda: get_directory().warm(),
+        name="uk-postcodes-parsing-preload",
+        daemon=True,
+    )
+    thread.start()
+    return thread
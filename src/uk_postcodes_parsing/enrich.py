@@ -0,0 +1,214 @@
+"""
+enrich.py: Join ONS Postcode Directory attributes onto a column of postcodes.
+
+Requires numpy, and pandas or pyarrow for the table they enrich.
+
+The column is normalised, encoded (see `directory.encode`) and joined against the data
+files of the active release (see `registry`) without a Python call per row: case and
+whitespace are normalised on arrays of code points, and the join is a binary search of
+the encoded keys in the sorted directory, whose positions index the coordinates and
+countries arrays directly. Rows are processed `chunk_size` at a time, so the memory used
+on top of the input and output columns doesn't depend on the number of rows.
+
+    >>> from uk_postcodes_parsing.enrich import enrich
+    >>> enrich(customers, "postcode").columns
+    Index(['name', 'postcode', 'postcode_country', 'postcode_latitude',
+           'postcode_longitude', 'postcode_status'], dtype='object')
+
+Attributes:
+    postcode      normalised postcode, None if the value is not a postcode
+    in_directory  whether the postcode is in the ONS Postcode Directory (active)
+    status        "active", "terminated" or "unknown", see `history`
+    country       e.g. "England", None if unknown, see `country`
+    latitude      float32, NaN if unknown, see `geo`
+    longitude     float32, NaN if unknown
+"""
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover
+    pa = None
+
+from uk_postcodes_parsing.country import COUNTRIES
+from uk_postcodes_parsing.directory import decode_many, _code_points, _encode_chars
+from uk_postcodes_parsing.fix import fix
+from uk_postcodes_parsing.postcode_utils import to_normalised
+from uk_postcodes_parsing.registry import current
+
+ATTRIBUTES = ("postcode", "in_directory", "status", "country", "latitude", "longitude")
+DEFAULT_ATTRIBUTES = ("country", "latitude", "longitude", "status")
+
+# Longest value normalised, in characters (a postcode and some whitespace)
+MAX_LENGTH = 16
+# Non-breaking space, removed by normalisation like spaces and control characters
+NBSP = 160
+
+
+def encode_column(values: Sequence[Any], attempt_fix: bool = False) -> "np.ndarray":
+    """Normalise and encode a column of raw postcodes. Requires numpy.
+
+    Case is ignored, and so is whitespace between the outward and inward codes, e.g.
+    "ec1r1ub" is encoded as "EC1R 1UB", like `to_normalised`. Unlike `to_normalised`,
+    whitespace around the postcode (e.g. padding of fixed-width columns) is ignored too,
+    but whitespace inside the outward or inward code (e.g. "E C1R 1UB") isn't.
+
+    Args:
+        values (Sequence): Raw postcodes, e.g. a list, NumPy array or pandas Series.
+            Values that are not strings (None, NaN, ...) are not postcodes.
+        attempt_fix (bool): Fix OCR mistakes in values that are not postcodes, like
+            `ukpostcode.parse`. Calls `fix` once per distinct such value. Defaults to
+            False.
+    Returns:
+        np.ndarray: int64 codes, -1 where the value is not a postcode
+    """
+    if np is None:
+        raise ImportError("encode_column requires numpy: pip install numpy")
+    if hasattr(values, "to_numpy"):
+        values = values.to_numpy()
+    values = np.asarray(values, dtype=object).reshape(-1)
+    # Values that aren't strings become e.g. "None" or "nan", which aren't postcodes
+    chars, fits = _code_points(values, MAX_LENGTH)
+
+    # Upper case, without whitespace: the i-th character kept goes to column i, or
+    # i + 1 in the inward code (the last 3 characters) to make room for the space
+    chars = np.where((chars >= 97) & (chars <= 122), chars - 32, chars)
+    kept = (chars > 32) & (chars != NBSP)
+    index = np.cumsum(kept, axis=1) - 1
+    length = index[:, -1] + 1
+    # Inside the postcode, whitespace is only allowed between the outward and inward
+    # codes: the characters kept before it are neither none, all, nor all but 3
+    before = index + 1
+    inside = (before > 0) & (before < length[:, None])
+    misplaced = ~kept & inside & (before != (length - 3)[:, None])
+    valid = fits & (length >= 5) & (length <= 7) & ~misplaced.any(axis=1)
+    kept &= valid[:, None]
+    index += index >= (length - 3)[:, None]
+    rows = np.nonzero(kept)[0]
+    normalised = np.zeros((len(chars), 8), dtype=np.int64)
+    normalised[rows, index[kept]] = chars[kept]
+    normalised[valid, length[valid] - 3] = 32
+    codes = _encode_chars(normalised)
+    codes[~valid] = -1
+
+    if attempt_fix:
+        missing = codes < 0
+        distinct, inverse = np.unique(values[missing].astype(str), return_inverse=True)
+        fixed = [to_normalised(fix(value)) for value in distinct.tolist()]
+        codes[missing] = _encode_chars(_code_points(fixed, 8)[0])[inverse.reshape(-1)]
+    return codes
+
+
+def lookup(
+    values: Sequence[Any],
+    attributes: Sequence[str] = DEFAULT_ATTRIBUTES,
+    attempt_fix: bool = False,
+) -> Dict[str, "np.ndarray"]:
+    """Find ONS attributes of a column of raw postcodes. Requires numpy.
+
+    Args:
+        values (Sequence): Raw postcodes, see `encode_column`
+        attributes (Sequence[str]): Attributes to find, see `ATTRIBUTES`. Defaults to
+            `DEFAULT_ATTRIBUTES`.
+        attempt_fix (bool): Fix OCR mistakes, see `encode_column`. Defaults to False.
+    Returns:
+        Dict[str, np.ndarray]: One array per attribute, one entry per value
+    """
+    unknown = set(attributes) - set(ATTRIBUTES)
+    if unknown:
+        raise ValueError(f"Unknown attributes {sorted(unknown)}, expected {ATTRIBUTES}")
+    codes = encode_column(values, attempt_fix)
+    # Every store from one snapshot, so positions in its directory index its own
+    # coordinates and countries even if another release is activated meanwhile
+    snapshot = current()
+    positions = snapshot.directory.positions(codes)
+    found = positions >= 0
+    columns = {}
+    coordinates = None
+    for attribute in attributes:
+        if attribute == "postcode":
+            postcodes = decode_many(codes).astype(object)
+            postcodes[codes < 0] = None
+            columns[attribute] = postcodes
+        elif attribute == "in_directory":
+            columns[attribute] = found
+        elif attribute == "status":
+            columns[attribute] = snapshot.history.statuses(codes)
+        elif attribute == "country":
+            indices = snapshot.countries.indices(positions)
+            columns[attribute] = np.array(COUNTRIES, dtype=object)[indices]
+        else:
+            if coordinates is None:
+                coordinates = snapshot.coordinates.at(positions)
+            columns[attribute] = coordinates[attribute == "longitude"]
+    return columns
+
+
+def enrich(
+    table: Any,
+    column: str,
+    attributes: Sequence[str] = DEFAULT_ATTRIBUTES,
+    attempt_fix: bool = False,
+    prefix: Optional[str] = None,
+    chunk_size: int = 100_000,
+) -> Any:
+    """Append ONS attributes of a column of postcodes to a table. Requires numpy.
+
+    Args:
+        table (pandas.DataFrame | pyarrow.Table): The table to enrich. Not modified.
+        column (str): Name of the column holding the postcodes
+        attributes (Sequence[str]): Attributes to append, see `ATTRIBUTES`. Defaults to
+            country, latitude, longitude and status.
+        attempt_fix (bool): Fix OCR mistakes, see `encode_column`. Defaults to False.
+        prefix (str): Prefix of the appended column names. Defaults to the name of
+            `column` and an underscore, e.g. "postcode_country".
+        chunk_size (int): Number of rows processed at a time. Defaults to 100000.
+    Returns:
+        pandas.DataFrame | pyarrow.Table: A new table with one more column per
+            attribute
+    """
+    if np is None:
+        raise ImportError("enrich requires numpy: pip install numpy")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    prefix = f"{column}_" if prefix is None else prefix
+    is_arrow = pa is not None and isinstance(table, pa.Table)
+    if is_arrow:
+        values = table.column(column).to_numpy(zero_copy_only=False)
+    else:
+        values = table[column].to_numpy()
+    chunks = [
+        lookup(values[start : start + chunk_size], attributes, attempt_fix)
+        for start in range(0, len(values), chunk_size)
+    ] or [lookup(values, attributes)]
+    columns = {
+        f"{prefix}{attribute}": np.concatenate([chunk[attribute] for chunk in chunks])
+        for attribute in attributes
+    }
+    if not is_arrow:
+        return table.assign(**columns)
+    for name, values in columns.items():
+        table = table.append_column(name, pa.array(values, from_pandas=True))
+    return table
+
+
+def iter_enrich(
+    tables: Iterable[Any],
+    column: str,
+    attributes: Sequence[str] = DEFAULT_ATTRIBUTES,
+    attempt_fix: bool = False,
+    prefix: Optional[str] = None,
+) -> Iterator[Any]:
+    """Enrich a stream of tables, e.g. `pandas.read_csv(..., chunksize=1_000_000)` or
+    the batches of a Parquet file, one at a time. See `enrich`.
+
+    Returns:
+        Iterator: The enriched tables, in order
+    """
+    for table in tables:
+        yield enrich(table, column, attributes, attempt_fix, prefix)
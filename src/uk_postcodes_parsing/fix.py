@@ -1,20 +1,33 @@
 import re
-import logging
-from typing import List
+import json
+from collections import defaultdict
+from itertools import product
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 from uk_postcodes_parsing.postcode_utils import is_valid_outcode
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("uk-postcodes-parsing.fix")
+from uk_postcodes_parsing.cache import memoize
+from uk_postcodes_parsing.directory import DATA_DIR, PostcodeDirectory
+from uk_postcodes_parsing.registry import current
 
 
 FIXABLE_REGEX = re.compile(
     r"^\s*[a-z01]{1,2}[0-9oi][a-z\d]?\s*[0-9oi][a-z01]{2}\s*$", re.I
 )
 
+DEFAULT_CORRECTIONS_PATH = DATA_DIR / "corrections.json"
+
+# Characters `coerce` swaps for their look-alike
+LOOKALIKES = {"0": "O", "O": "0", "1": "I", "I": "1"}
+
 
+@memoize
 def fix(s: str) -> str:
     """Attempts to fix a given postcode
 
+    With a correction table (see `get_corrections`), the outward code becomes the best
+    real outcode it can be a misreading of, and the postcode is returned unchanged if
+    there is none.
+
     Args:
         s (str): The postcode to fix
     Returns:
@@ -22,10 +35,37 @@ def fix(s: str) -> str:
     """
     if not FIXABLE_REGEX.match(s):
         return s
-    s = s.upper().strip().replace(r"\s+", "")
-    inward = s[-3:].strip()
-    outward = s[:-3].strip()
-    return f"{coerce_outcode(outward)} {coerce_incode(inward)}"
+    raw = s.upper().strip().replace(r"\s+", "")
+    inward = raw[-3:].strip()
+    outward = raw[:-3].strip()
+    corrections = get_corrections()
+    if corrections is None:
+        outcode = coerce_outcode(outward)
+    elif outward in corrections:
+        outcode = corrections[outward][0]
+    else:
+        return s  # No real outcode reads like this
+    return f"{outcode} {coerce_incode(inward)}"
+
+
+def get_fix_distance(original: str, postcode: str) -> int:
+    """
+    The "edit distance" between a raw postcode and the final postcode. Each character
+    fixed adds -1. For example,
+        "SW1A OAA" => "SW1A 0AA" has a fix distance of -1
+
+    Args:
+        original (str): The raw (original) string of the postcode
+        postcode (str): The final, normalised postcode
+    Returns:
+        int: The fix distance (0 or negative)
+    """
+    # Convert raw (original) string in postcode format
+    original = original.upper().strip().replace(r"\s+", "")
+    inward = original[-3:].strip()
+    outward = original[:-3].strip()
+    formatted = f"{outward} {inward}"
+    return sum(c1 != c2 for c1, c2 in zip(formatted, postcode)) * -1
 
 
 def to_letter(char: str) -> str:
@@ -82,6 +122,7 @@ def coerce(pattern: str, string: str) -> str:
     )
 
 
+@memoize
 def fix_with_options(s: str) -> List[str]:
     """Attempts to fix a given postcode, covering all options.
 
@@ -95,11 +136,12 @@ def fix_with_options(s: str) -> List[str]:
     s = s.upper().strip().replace(r"\s+", "")
     inward = s[-3:].strip()
     outward = s[:-3].strip()
-    outcode_options = coerce_outcode_with_options(outward)
-    return [
-        f"{coerce_outcode(option)} {coerce_incode(inward)}"
-        for option in outcode_options
-    ]
+    corrections = get_corrections()
+    if corrections is not None:
+        outcode_options = corrections.get(outward, [])
+    else:
+        outcode_options = coerce_outcode_with_options(outward)
+    return [f"{option} {coerce_incode(inward)}" for option in outcode_options]
 
 
 def coerce_outcode_with_options(i: str) -> List[str]:
@@ -141,3 +183,93 @@ def coerce_outcode(i: str) -> str:
 def coerce_incode(i: str) -> str:
     """Coerce incode"""
     return coerce("NLL", i)
+
+
+def outcode_variants(outcode: str) -> Iterator[str]:
+    """All the ways OCR can misread an outcode by swapping look-alike characters
+    (see `LOOKALIKES`), including the outcode itself."""
+    choices = [(c, LOOKALIKES[c]) if c in LOOKALIKES else (c,) for c in outcode]
+    return map("".join, product(*choices))
+
+
+def correction_table(outcodes: Iterable[str]) -> Dict[str, List[str]]:
+    """Map every raw outward code that OCR can produce from real outcodes to those
+    outcodes.
+
+    The outcodes of each raw form are sorted best first: the one the patterns of
+    `coerce_outcode` give, then the fewest characters changed.
+
+    Args:
+        outcodes (Iterable[str]): Real outcodes, e.g. ["SO1", "SW1A", ...]
+    Returns:
+        Dict[str, List[str]]: Raw outward code to outcodes, e.g. {"S01": ["SO1"], ...}
+    """
+    table = defaultdict(set)
+    for outcode in outcodes:
+        for variant in outcode_variants(outcode):
+            table[variant].add(outcode)
+
+    def rank(raw: str, outcode: str) -> tuple:
+        changed = sum(a != b for a, b in zip(raw, outcode))
+        return outcode != coerce_outcode(raw), changed, outcode
+
+    return {
+        raw: sorted(candidates, key=lambda outcode: rank(raw, outcode))
+        for raw, candidates in sorted(table.items())
+    }
+
+
+def write_corrections(
+    directory: PostcodeDirectory, path: Union[str, Path] = DEFAULT_CORRECTIONS_PATH
+) -> int:
+    """Write the correction table of the outcodes of a directory.
+
+    Args:
+        directory (PostcodeDirectory): The directory to take the outcodes from
+        path (str | Path): Where to write the table
+    Returns:
+        int: The number of raw outward codes in the table
+    """
+    table = correction_table(directory.outcodes())
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"release": directory.release, "corrections": table}, f)
+    return len(table)
+
+
+def load_corrections(
+    path: Union[str, Path] = DEFAULT_CORRECTIONS_PATH, release: Optional[str] = None
+) -> Dict[str, List[str]]:
+    """Read a correction table written by `write_corrections`.
+
+    Args:
+        path (str | Path): The table
+        release (str): The release of the directory the table must be aligned with.
+            Defaults to the active release (see `registry`), without loading its
+            directory.
+    Returns:
+        Dict[str, List[str]]: Raw outward code to outcodes, best first
+    Raises:
+        ValueError: If the table was written for another release
+    """
+    release = release if release is not None else current().release
+    with open(path) as f:
+        data = json.load(f)
+    if data["release"] != release:
+        raise ValueError(
+            f"{path} ({data['release']!r}) is not aligned with the directory "
+            f"({release!r})"
+        )
+    return data["corrections"]
+
+
+def get_corrections() -> Optional[Dict[str, List[str]]]:
+    """Return the correction table of the active release (see `registry`), loading it
+    on first use.
+
+    Returns:
+        Dict[str, List[str]]: The table, or None if the data files have none (`fix`
+            and `fix_with_options` then fall back to the patterns)
+    """
+    return current().corrections
@@ -0,0 +1,304 @@
+"""
+geo.py: Forward geocoding and distances between postcodes.
+
+Coordinates are shipped as a binary file of packed float32 latitudes and longitudes,
+aligned with the sorted postcodes of the directory: the coordinates of the postcode at
+position `i` of the directory are at position `i` of each array. Geocoding a postcode is
+the directory's binary search plus two array reads, and batches are geocoded with one
+vectorised search and no Python object per row (requires numpy for batches).
+
+File layout (little-endian):
+    header: magic (4s), version (H), reserved (H), release (16s), count (I)
+    body:   count x float32 latitudes, then count x float32 longitudes (NaN if unknown)
+
+    >>> from uk_postcodes_parsing import geo
+    >>> latitudes, longitudes = geo.geocode(["EC1R 1UB", "E3 4SS"])
+    >>> geo.distance_matrix(["EC1R 1UB", "E3 4SS"], ["SW1A 2AA"])  # km
+"""
+import sys
+import mmap
+import math
+import logging
+from array import array
+from pathlib import Path
+from typing import Iterable, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from uk_postcodes_parsing.directory import (
+    DATA_DIR,
+    HEADER,
+    VERSION,
+    PostcodeDirectory,
+    get_directory,
+    encode,
+    encode_many,
+)
+from uk_postcodes_parsing.registry import current
+
+logger = logging.getLogger("uk-postcodes-parsing.geo")
+
+DEFAULT_COORDINATES_PATH = DATA_DIR / "coordinates.bin"
+
+MAGIC = b"UKPG"
+
+# Mean radius of the Earth, in km
+EARTH_RADIUS_KM = 6371.0088
+
+
+class CoordinateStore:
+    """Read-only view over a binary coordinates file.
+
+    Constructor arguments:
+        path (str | Path): Path to a file written by `write_coordinates`.
+        directory (PostcodeDirectory): The directory the coordinates are aligned with.
+            Defaults to the packaged one.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_COORDINATES_PATH,
+        directory: Optional[PostcodeDirectory] = None,
+    ):
+        self.path = Path(path)
+        self.directory = directory if directory is not None else get_directory()
+        with open(self.path, "rb") as f:
+            magic, version, _, release, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a coordinates file: {self.path}")
+            release = release.rstrip(b"\0").decode("ascii")
+            if count != len(self.directory) or release != self.directory.release:
+                raise ValueError(
+                    f"{self.path} ({release!r}, {count} postcodes) is not aligned with "
+                    f"the directory ({self.directory.release!r}, "
+                    f"{len(self.directory)} postcodes)"
+                )
+            self._mmap = None
+            if count == 0:
+                self._latitudes = self._longitudes = array("f")
+            elif sys.byteorder == "little":
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                body = memoryview(self._mmap)[HEADER.size : HEADER.size + 8 * count]
+                self._latitudes = body[: 4 * count].cast("f")
+                self._longitudes = body[4 * count :].cast("f")
+            else:
+                self._latitudes = array("f", f.read(4 * count))
+                self._longitudes = array("f", f.read(4 * count))
+                self._latitudes.byteswap()
+                self._longitudes.byteswap()
+        logger.debug("Loaded coordinates of %s postcodes from %s", count, self.path)
+
+    def __reduce__(self):
+        """Pickle the paths only, so other processes map the same files."""
+        return type(self), (self.path, self.directory)
+
+    def lookup(self, postcode: str) -> Optional[Tuple[float, float]]:
+        """Find the coordinates of a postcode.
+
+        Args:
+            postcode (str): The normalised postcode, e.g. "EC1R 1UB"
+        Returns:
+            Tuple[float, float]: Latitude and longitude, or None if the postcode is not
+                in the directory or has no coordinates
+        """
+        code = encode(postcode)
+        i = -1 if code is None else self.directory.position(code)
+        if i < 0 or math.isnan(self._latitudes[i]):
+            return None
+        return self._latitudes[i], self._longitudes[i]
+
+    def geocode(self, postcodes: Iterable) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Find the coordinates of many postcodes at once. Requires numpy.
+
+        Args:
+            postcodes (Iterable): Normalised postcodes, or `Postcode` objects
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: float32 latitudes and longitudes, NaN where
+                the postcode is not in the directory or has no coordinates
+        """
+        if np is None:
+            raise ImportError("geocode requires numpy: pip install numpy")
+        return self.at(self.directory.positions(_encode_all(postcodes)))
+
+    def at(self, positions: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        """Find the coordinates of many postcodes by position in the directory. Requires
+        numpy.
+
+        Args:
+            positions (np.ndarray): Positions in the directory, e.g. from
+                `PostcodeDirectory.positions`. Negative positions have no coordinates.
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: float32 latitudes and longitudes, NaN where
+                the position is negative or the postcode has no coordinates
+        """
+        if np is None:
+            raise ImportError("at requires numpy: pip install numpy")
+        positions = np.asarray(positions, dtype=np.int64)
+        found = positions >= 0
+        all_latitudes, all_longitudes = self.arrays()
+        latitudes = np.full(len(positions), np.nan, dtype=np.float32)
+        longitudes = np.full(len(positions), np.nan, dtype=np.float32)
+        latitudes[found] = all_latitudes[positions[found]]
+        longitudes[found] = all_longitudes[positions[found]]
+        return latitudes, longitudes
+
+    def arrays(self) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Return the latitudes and longitudes of every postcode, in directory order.
+        Requires numpy.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Read-only float32 arrays over the mapped file
+                (not copies), NaN where the postcode has no coordinates
+        """
+        if np is None:
+            raise ImportError("arrays requires numpy: pip install numpy")
+        return np.asarray(self._latitudes), np.asarray(self._longitudes)
+
+
+def _encode_all(postcodes: Iterable) -> "np.ndarray":
+    """Encode postcodes (str or `Postcode`) into an int64 array, -1 where not encodable."""
+    if getattr(postcodes, "dtype", object) != object:
+        return encode_many(postcodes)  # Strings only, e.g. a NumPy string array
+    postcodes = postcodes.tolist() if hasattr(postcodes, "tolist") else list(postcodes)
+    if any(hasattr(postcode, "postcode") for postcode in postcodes):
+        postcodes = [getattr(postcode, "postcode", postcode) for postcode in postcodes]
+    return encode_many(postcodes)
+
+
+def write_coordinates(
+    directory: PostcodeDirectory,
+    postcodes: Sequence[str],
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    path: Union[str, Path] = DEFAULT_COORDINATES_PATH,
+) -> int:
+    """Write the coordinates of the postcodes of `directory` to a binary file. Requires
+    numpy.
+
+    Postcodes that are not in the directory are skipped. Postcodes of the directory
+    without coordinates, or with a latitude outside [-90, 90] (ONSPD uses 99.999999 when
+    there is no grid reference), are stored as NaN.
+
+    Args:
+        directory (PostcodeDirectory): The directory to align the coordinates with
+        postcodes (Sequence[str]): Normalised postcodes, e.g. ["EC1R 1UB", "E3 4SS"]
+        latitudes (Sequence[float]): Latitude of each postcode
+        longitudes (Sequence[float]): Longitude of each postcode
+        path (str | Path): Where to write the file
+    Returns:
+        int: The number of postcodes of the directory with coordinates
+    """
+    if np is None:
+        raise ImportError("write_coordinates requires numpy: pip install numpy")
+    positions = directory.positions(_encode_all(postcodes))
+    return _write_coordinates(directory, positions, latitudes, longitudes, path)
+
+
+def _write_coordinates(
+    directory: PostcodeDirectory,
+    positions: "np.ndarray",
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    path: Union[str, Path],
+) -> int:
+    """Write coordinates by directory position (-1 to skip). See `write_coordinates`."""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    if not len(positions) == len(latitudes) == len(longitudes):
+        raise ValueError(
+            "postcodes, latitudes and longitudes must have the same length"
+        )
+    found = (positions >= 0) & (np.abs(latitudes) <= 90)
+
+    body = np.full((2, len(directory)), np.nan, dtype="<f4")
+    body[0, positions[found]] = latitudes[found]
+    body[1, positions[found]] = longitudes[found]
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        release = directory.release.encode("ascii")
+        f.write(HEADER.pack(MAGIC, VERSION, 0, release, len(directory)))
+        f.write(body.tobytes())
+    return int(np.count_nonzero(~np.isnan(body[0])))
+
+
+def haversine(
+    latitudes1: "np.ndarray",
+    longitudes1: "np.ndarray",
+    latitudes2: "np.ndarray",
+    longitudes2: "np.ndarray",
+) -> "np.ndarray":
+    """Great-circle distance between coordinates, in km. Requires numpy.
+
+    The arguments are broadcast together, e.g. pass column and row vectors to get a
+    matrix of distances.
+
+    Returns:
+        np.ndarray: Distances in km, NaN where a coordinate is NaN
+    """
+    if np is None:
+        raise ImportError("haversine requires numpy: pip install numpy")
+    phi1 = np.radians(np.asarray(latitudes1, dtype=np.float64))
+    phi2 = np.radians(np.asarray(latitudes2, dtype=np.float64))
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(longitudes2, dtype=np.float64) - longitudes1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def pairwise_distance(postcodes1: Iterable, postcodes2: Iterable) -> "np.ndarray":
+    """Distance between each postcode of `postcodes1` and the one at the same position
+    of `postcodes2`, in km. Requires numpy.
+
+    Args:
+        postcodes1 (Iterable): Normalised postcodes, or `Postcode` objects
+        postcodes2 (Iterable): As many postcodes as `postcodes1`
+    Returns:
+        np.ndarray: Distances in km, NaN where a postcode has no coordinates
+    """
+    latitudes1, longitudes1 = geocode(postcodes1)
+    latitudes2, longitudes2 = geocode(postcodes2)
+    if len(latitudes1) != len(latitudes2):
+        raise ValueError("Both batches must have the same number of postcodes")
+    return haversine(latitudes1, longitudes1, latitudes2, longitudes2)
+
+
+def distance_matrix(postcodes1: Iterable, postcodes2: Iterable) -> "np.ndarray":
+    """Distance between every postcode of `postcodes1` and every postcode of
+    `postcodes2`, in km. Requires numpy.
+
+    Args:
+        postcodes1 (Iterable): Normalised postcodes, or `Postcode` objects
+        postcodes2 (Iterable): Normalised postcodes, or `Postcode` objects
+    Returns:
+        np.ndarray: len(postcodes1) x len(postcodes2) distances in km, NaN where a
+            postcode has no coordinates
+    """
+    latitudes1, longitudes1 = geocode(postcodes1)
+    latitudes2, longitudes2 = geocode(postcodes2)
+    return haversine(latitudes1[:, None], longitudes1[:, None], latitudes2, longitudes2)
+
+
+def get_coordinates() -> CoordinateStore:
+    """Return the coordinates of the active release (see `registry`), loading them on
+    first use.
+
+    Returns:
+        CoordinateStore: The coordinates shared by the whole process
+    """
+    return current().coordinates
+
+
+def geocode(postcodes: Iterable) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Find the coordinates of many postcodes with the packaged data. Requires numpy.
+
+    Args:
+        postcodes (Iterable): Normalised postcodes, or `Postcode` objects
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: float32 latitudes and longitudes, NaN where the
+            postcode is not in the directory or has no coordinates
+    """
+    return get_coordinates().geocode(postcodes)
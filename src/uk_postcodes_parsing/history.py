@@ -0,0 +1,335 @@
+"""
+history.py: Introduction and termination dates of every postcode ever issued.
+
+The directory only holds the postcodes active in its release, so postcodes in historical
+documents (old invoices, archived forms) that have since been terminated are reported as
+not in the directory. The history file adds the dates needed to answer "was this
+postcode in the directory on a given day?":
+
+- the date of introduction of every postcode of the directory, aligned with it
+- the terminated postcodes (sorted codes, like the directory) with their dates of
+  introduction and termination
+
+Dates are stored as unsigned 16-bit numbers of days since `EPOCH` (0 when unknown), so
+the file adds 2 bytes per active postcode and 8 bytes per terminated postcode, and every
+check is one or two binary searches.
+
+File layout (little-endian):
+    header: magic (4s), version (H), reserved (H), release (16s), active count (I),
+            terminated count (I)
+    body:   terminated x uint32 codes (sorted), active x uint16 days introduced,
+            terminated x uint16 days introduced, terminated x uint16 days terminated
+"""
+import sys
+import mmap
+import struct
+import logging
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Optional, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from uk_postcodes_parsing.directory import (
+    DATA_DIR,
+    VERSION,
+    PostcodeDirectory,
+    get_directory,
+    encode,
+)
+from uk_postcodes_parsing.registry import current
+
+logger = logging.getLogger("uk-postcodes-parsing.history")
+
+DEFAULT_HISTORY_PATH = DATA_DIR / "history.bin"
+
+MAGIC = b"UKPH"
+HEADER = struct.Struct("<4sHH16sII")
+
+# Day 0 of the stored dates, which also marks unknown dates
+EPOCH = date(1970, 1, 1)
+
+ACTIVE = "active"
+TERMINATED = "terminated"
+UNKNOWN = "unknown"
+
+
+def _to_days(value: Union[date, datetime, None]) -> int:
+    """Days since `EPOCH`, 0 for None or NaN/NaT (e.g. missing pandas dates)."""
+    if value is None or value != value:
+        return 0
+    if isinstance(value, datetime):
+        value = value.date()
+    days = (value - EPOCH).days
+    if not 0 < days < 1 << 16:
+        raise ValueError(f"{value} is out of range")
+    return days
+
+
+def _to_date(days: int) -> Optional[date]:
+    return EPOCH + timedelta(days=days) if days else None
+
+
+def _as_date(value: Union[date, datetime]) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+class PostcodeHistory:
+    """Read-only view over a binary history file.
+
+    Constructor arguments:
+        path (str | Path): Path to a file written by `write_history`.
+        directory (PostcodeDirectory): The directory the history is aligned with.
+            Defaults to the packaged one.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_HISTORY_PATH,
+        directory: Optional[PostcodeDirectory] = None,
+    ):
+        self.path = Path(path)
+        self.directory = directory if directory is not None else get_directory()
+        with open(self.path, "rb") as f:
+            header = HEADER.unpack(f.read(HEADER.size))
+            magic, version, _, release, active, terminated = header
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a postcode history file: {self.path}")
+            release = release.rstrip(b"\0").decode("ascii")
+            if active != len(self.directory) or release != self.directory.release:
+                raise ValueError(
+                    f"{self.path} ({release!r}, {active} postcodes) is not aligned with "
+                    f"the directory ({self.directory.release!r}, "
+                    f"{len(self.directory)} postcodes)"
+                )
+            size = 4 * terminated + 2 * active + 4 * terminated
+            self._mmap = None
+            if size == 0:
+                body = memoryview(b"")
+            elif sys.byteorder == "little":
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                body = memoryview(self._mmap)[HEADER.size : HEADER.size + size]
+            else:
+                body = memoryview(f.read(size))
+        offsets = [0, 4 * terminated, 2 * active, 2 * terminated, 2 * terminated]
+        for i in range(1, len(offsets)):
+            offsets[i] += offsets[i - 1]
+        self._terminated_codes = self._view(body[: offsets[1]], "I")
+        self._introduced = self._view(body[offsets[1] : offsets[2]], "H")
+        self._terminated_introduced = self._view(body[offsets[2] : offsets[3]], "H")
+        self._terminated_on = self._view(body[offsets[3] : offsets[4]], "H")
+        logger.debug(
+            "Loaded history of %s active and %s terminated postcodes from %s",
+            active,
+            terminated,
+            self.path,
+        )
+
+    def __reduce__(self):
+        """Pickle the paths only, so other processes map the same files."""
+        return type(self), (self.path, self.directory)
+
+    @staticmethod
+    def _view(body: memoryview, typecode: str):
+        if sys.byteorder == "little":
+            return body.cast(typecode) if len(body) else array(typecode)
+        values = array(typecode, body.tobytes())
+        values.byteswap()
+        return values
+
+    def _find(self, postcode: str) -> Tuple[str, int, int]:
+        """Status and days introduced and terminated (0 if unknown) of a postcode."""
+        code = encode(postcode)
+        if code is None:
+            return UNKNOWN, 0, 0
+        i = self.directory.position(code)
+        if i >= 0:
+            return ACTIVE, self._introduced[i], 0
+        codes = self._terminated_codes
+        i = bisect_left(codes, code)
+        if i < len(codes) and codes[i] == code:
+            return TERMINATED, self._terminated_introduced[i], self._terminated_on[i]
+        return UNKNOWN, 0, 0
+
+    def status(self, postcode: str) -> str:
+        """Check if a postcode is active, terminated or was never issued.
+
+        Args:
+            postcode (str): The normalised postcode, e.g. "EC1R 1UB"
+        Returns:
+            str: "active", "terminated" or "unknown"
+        """
+        return self._find(postcode)[0]
+
+    def dates(self, postcode: str) -> Tuple[Optional[date], Optional[date]]:
+        """Find when a postcode was introduced and terminated.
+
+        Args:
+            postcode (str): The normalised postcode, e.g. "EC1R 1UB"
+        Returns:
+            Tuple[date, date]: Dates of introduction and termination, None if unknown
+                or, for termination, if the postcode is still active
+        """
+        _, introduced, terminated = self._find(postcode)
+        return _to_date(introduced), _to_date(terminated)
+
+    def is_active(self, postcode: str, as_of: Union[date, datetime]) -> bool:
+        """Check if a postcode was in the directory on a given day.
+
+        A postcode with an unknown date of introduction counts as introduced before any
+        day.
+
+        Args:
+            postcode (str): The normalised postcode, e.g. "EC1R 1UB"
+            as_of (date): The day to check
+        Returns:
+            bool: True if the postcode was introduced on or before `as_of` and not
+                terminated by then
+        """
+        status, introduced, terminated = self._find(postcode)
+        if status == UNKNOWN:
+            return False
+        day = (_as_date(as_of) - EPOCH).days
+        return introduced <= day and (status == ACTIVE or day < terminated)
+
+    def statuses(self, codes: "np.ndarray") -> "np.ndarray":
+        """Check the status of many encoded postcodes at once. Requires numpy.
+
+        Args:
+            codes (np.ndarray): Postcodes encoded with `directory.encode`. Negative
+                values (e.g. -1 for postcodes that can't be encoded) are unknown.
+        Returns:
+            np.ndarray: Object array of "active", "terminated" or "unknown"
+        """
+        if np is None:
+            raise ImportError("statuses requires numpy: pip install numpy")
+        codes = np.asarray(codes, dtype=np.int64)
+        terminated = np.asarray(self._terminated_codes, dtype=np.int64)
+        i = np.minimum(np.searchsorted(terminated, codes), max(len(terminated) - 1, 0))
+        ended = (
+            terminated[i] == codes if len(terminated) else np.zeros(len(codes), bool)
+        )
+        statuses = np.where(ended, 1, 0)
+        statuses[self.directory.positions(codes) >= 0] = 2
+        return np.array((UNKNOWN, TERMINATED, ACTIVE), dtype=object)[statuses]
+
+
+def write_history(
+    directory: PostcodeDirectory,
+    postcodes: Iterable[str],
+    introduced: Iterable[Union[date, datetime, None]],
+    terminated: Iterable[Union[date, datetime, None]],
+    path: Union[str, Path] = DEFAULT_HISTORY_PATH,
+) -> Tuple[int, int]:
+    """Write the dates of every postcode ever issued to a binary history file.
+
+    Postcodes in `directory` are active, whatever their termination date. Postcodes not
+    in `directory` are terminated if they have a termination date, and skipped otherwise.
+
+    Args:
+        directory (PostcodeDirectory): The directory to align the history with
+        postcodes (Iterable[str]): Normalised postcodes, e.g. ["EC1R 1UB", "E3 4SS"]
+        introduced (Iterable[date]): Date of introduction of each postcode, or None
+        terminated (Iterable[date]): Date of termination of each postcode, or None
+        path (str | Path): Where to write the file
+    Returns:
+        Tuple[int, int]: The number of active postcodes with a date of introduction,
+            and the number of terminated postcodes
+    """
+    codes = (encode(postcode) for postcode in postcodes)
+    return _write_history(
+        directory,
+        (-1 if code is None else code for code in codes),
+        map(_to_days, introduced),
+        map(_to_days, terminated),
+        path,
+    )
+
+
+def _write_history(
+    directory: PostcodeDirectory,
+    codes: Iterable[int],
+    introduced: Iterable[int],
+    terminated: Iterable[int],
+    path: Union[str, Path],
+) -> Tuple[int, int]:
+    """Write the history from encoded postcodes (-1 to skip) and days since `EPOCH`
+    (0 if unknown). See `write_history`."""
+    active_introduced = array("H", bytes(2 * len(directory)))
+    ended = {}
+    for code, start, end in zip(codes, introduced, terminated):
+        if code < 0:
+            continue
+        i = directory.position(code)
+        if i >= 0:
+            active_introduced[i] = start
+        elif end:
+            ended[code] = (start, end)
+
+    codes = sorted(ended)
+    body = [
+        array("I", codes),
+        active_introduced,
+        array("H", [ended[code][0] for code in codes]),
+        array("H", [ended[code][1] for code in codes]),
+    ]
+    if sys.byteorder != "little":
+        for values in body:
+            values.byteswap()
+    _write_body(directory, len(codes), body, path)
+    return sum(1 for days in active_introduced if days), len(codes)
+
+
+def _write_history_arrays(
+    directory: PostcodeDirectory,
+    positions: "np.ndarray",
+    codes: "np.ndarray",
+    introduced: "np.ndarray",
+    terminated: "np.ndarray",
+    path: Union[str, Path],
+) -> Tuple[int, int]:
+    """Write the history from arrays of encoded postcodes (-1 to skip), their positions
+    in `directory` (see `PostcodeDirectory.positions`) and days since `EPOCH`, without a
+    Python object per postcode. See `write_history`."""
+    found = positions >= 0
+    active_introduced = np.zeros(len(directory), dtype="<u2")
+    active_introduced[positions[found]] = introduced[found]
+    ended = ~found & (codes >= 0) & (terminated > 0)
+    # Reversed, so the last row of a postcode wins, as in `_write_history`
+    ended_codes, rows = np.unique(codes[ended][::-1], return_index=True)
+    body = [
+        ended_codes.astype("<u4"),
+        active_introduced,
+        introduced[ended][::-1][rows].astype("<u2"),
+        terminated[ended][::-1][rows].astype("<u2"),
+    ]
+    _write_body(directory, len(ended_codes), body, path)
+    return int(np.count_nonzero(active_introduced)), len(ended_codes)
+
+
+def _write_body(
+    directory: PostcodeDirectory, terminated: int, body: list, path: Union[str, Path]
+) -> None:
+    """Write the header and the little-endian `body` arrays of a history file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        release = directory.release.encode("ascii")
+        f.write(HEADER.pack(MAGIC, VERSION, 0, release, len(directory), terminated))
+        for values in body:
+            f.write(values.tobytes())
+
+
+def get_history() -> PostcodeHistory:
+    """Return the postcode history of the active release (see `registry`), loading it
+    on first use.
+
+    Returns:
+        PostcodeHistory: The history shared by the whole process
+    """
+    return current().history
@@ -0,0 +1,129 @@
+"""
+metrics.py: Counters and opt-in per-stage timers of the parsing pipeline.
+
+Parsing doesn't log per call, as formatting and writing a log record can cost more than
+parsing the postcode. It increments counters instead, which are always on:
+
+    parsed            strings parsed into a postcode (fixed or not)
+    fixed             strings that needed fixing to be parsed
+    failed            strings that couldn't be parsed
+    special_case      strings starting with a special case prefix ("GIR", "BX", ...)
+    directory_hits    postcodes found in the ONS Postcode Directory
+    directory_misses  postcodes not found in the ONS Postcode Directory
+
+With the cache enabled (see `cache`), `parse` counters only count cache misses.
+
+Timers of the stages below are off by default. Once enabled, the time spent in every
+stage is accumulated, and optionally passed to a callback (e.g. to feed a histogram):
+
+    scan        searching text for postcodes (`parse_from_corpus`, `iter_postcodes`)
+    fix         fixing OCR mistakes
+    components  normalising and splitting postcodes into their components
+    lookup      checking postcodes against the directory
+
+    >>> from uk_postcodes_parsing import metrics
+    >>> metrics.enable_timing()
+    >>> parse_from_corpus("Send it to ecir iub", attempt_fix=True)
+    >>> metrics.snapshot()["timers"]["fix"]
+    TimerStats(count=1, total=1.2e-05, max=1.2e-05)
+"""
+import threading
+from time import perf_counter
+from typing import Callable, Dict, NamedTuple, Optional
+
+COUNTERS = (
+    "parsed",
+    "fixed",
+    "failed",
+    "special_case",
+    "directory_hits",
+    "directory_misses",
+)
+STAGES = ("scan", "fix", "components", "lookup")
+
+
+class TimerStats(NamedTuple):
+    """Time spent in one stage, in seconds. See `snapshot`."""
+
+    count: int
+    total: float
+    max: float
+
+
+# Incremented without a lock: an increment can be lost if two threads update the same
+# counter at the same time, which is cheaper than locking on every call.
+counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+
+timing = False
+_timers: Dict[str, list] = {}  # Stage to [count, total, max]
+_callback: Optional[Callable[[str, float], None]] = None
+_lock = threading.Lock()
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add `n` to a counter."""
+    counters[name] += n
+
+
+def enable_timing(callback: Optional[Callable[[str, float], None]] = None) -> None:
+    """Time every stage of the pipeline from now on.
+
+    Args:
+        callback (Callable[[str, float], None]): Called with the stage and the seconds
+            spent in it, every time a stage is timed. Optional.
+    """
+    global timing, _callback
+    with _lock:
+        _callback = callback
+        timing = True
+
+
+def disable_timing() -> None:
+    """Stop timing the stages. The accumulated times are kept until `reset`."""
+    global timing, _callback
+    with _lock:
+        timing = False
+        _callback = None
+
+
+def clock() -> float:
+    """Start timing a stage. Returns 0 if timing is disabled. See `record`."""
+    return perf_counter() if timing else 0.0
+
+
+def record(stage: str, start: float) -> None:
+    """Add the time since `start` (from `clock`) to a stage, if timing is enabled.
+
+    A `start` of 0 means timing was disabled when the stage started, so it is ignored.
+    """
+    if not timing or not start:
+        return
+    elapsed = perf_counter() - start
+    with _lock:
+        timer = _timers.setdefault(stage, [0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += elapsed
+        timer[2] = max(timer[2], elapsed)
+        callback = _callback
+    if callback is not None:
+        callback(stage, elapsed)
+
+
+def snapshot() -> dict:
+    """Current counters and stage timers.
+
+    Returns:
+        dict: "counters" (counter name to value) and "timers" (stage to `TimerStats`,
+            only stages timed at least once)
+    """
+    with _lock:
+        timers = {stage: TimerStats(*timer) for stage, timer in _timers.items()}
+    return {"counters": dict(counters), "timers": timers}
+
+
+def reset() -> None:
+    """Set every counter to 0 and drop the stage timers."""
+    with _lock:
+        for name in counters:
+            counters[name] = 0
+        _timers.clear()
@@ -2,7 +2,7 @@
 postcode_utils.py: Utilities for working with postcodes.
 """
 import re
-from typing import Union
+from typing import NamedTuple, Union
 
 
 # Tests for district
@@ -23,6 +23,26 @@ POSTCODE_REGEX = re.compile(r"^[a-z]{1,2}\d[a-z\d]?\s*\d[a-z]{2}$", re.I)
 # Tests for the area section of a postcode
 AREA_REGEX = re.compile(r"^[a-z]{1,2}", re.I)
 
+# Splits a valid postcode into its components in a single match
+POSTCODE_COMPONENTS_REGEX = re.compile(
+    r"^(?P<outcode>(?P<area>[a-z]{1,2})\d(?P<suffix>[a-z\d])?)"
+    r"\s*(?P<incode>\d[a-z]{2})$",
+    re.I,
+)
+
+
+class PostcodeComponents(NamedTuple):
+    """Components of a valid postcode, all upper case. See `to_components`."""
+
+    postcode: str
+    incode: str
+    outcode: str
+    area: str
+    district: str
+    sub_district: Union[str, None]
+    sector: str
+    unit: str
+
 
 def sanitize(string: str) -> str:
     """Sanitizes a string by removing whitespace and converting to uppercase.
@@ -57,6 +77,36 @@ def is_valid_outcode(outcode: str) -> bool:
     return re.match(OUTCODE_REGEX, outcode) is not None
 
 
+def to_components(postcode: str) -> Union[PostcodeComponents, None]:
+    """
+    Extract every component of a postcode with a single regex match.
+    Args:
+        postcode (str): The postcode to split, e.g. "ec1r 1ub"
+    Returns:
+        PostcodeComponents: The components, or None if the postcode is not valid
+    """
+    match = POSTCODE_COMPONENTS_REGEX.match(postcode)
+    if match is None:
+        return None
+    outcode = match["outcode"].upper()
+    incode = match["incode"].upper()
+    suffix = match["suffix"]
+    if suffix is not None and not suffix.isdigit():
+        district, sub_district = outcode[:-1], outcode
+    else:
+        district, sub_district = outcode, None
+    return PostcodeComponents(
+        postcode=f"{outcode} {incode}",
+        incode=incode,
+        outcode=outcode,
+        area=match["area"].upper(),
+        district=district,
+        sub_district=sub_district,
+        sector=f"{outcode} {incode[0]}",
+        unit=incode[1:],
+    )
+
+
 def to_normalised(postcode: str) -> Union[str, None]:
     """
     Normalises a postcode by removing whitespace, converting to uppercase, and formatting.
@@ -65,11 +115,8 @@ def to_normalised(postcode: str) -> Union[str, None]:
     Returns:
         str: The normalised postcode
     """
-    outcode = to_outcode(postcode)
-    if outcode is None:
-        return None
-    incode = to_incode(postcode)
-    return None if incode is None else f"{outcode} {incode}"
+    components = to_components(postcode)
+    return None if components is None else components.postcode
 
 
 def to_outcode(postcode: str) -> Union[str, None]:
@@ -79,9 +126,8 @@ def to_outcode(postcode: str) -> Union[str, None]:
     Returns:
         str: The outcode
     """
-    if not is_valid(postcode):
-        return None
-    return re.sub(INCODE_REGEX, "", sanitize(postcode))
+    components = to_components(postcode)
+    return None if components is None else components.outcode
 
 
 def to_incode(postcode: str) -> Union[str, None]:
@@ -91,10 +137,8 @@ def to_incode(postcode: str) -> Union[str, None]:
     Returns:
         str: The incode
     """
-    if not is_valid(postcode):
-        return None
-    incode = re.findall(INCODE_REGEX, sanitize(postcode))
-    return incode[0] if incode else None
+    components = to_components(postcode)
+    return None if components is None else components.incode
 
 
 def to_area(postcode: str) -> Union[str, None]:
@@ -104,10 +148,8 @@ def to_area(postcode: str) -> Union[str, None]:
     Returns:
         str: The area
     """
-    if not is_valid(postcode):
-        return None
-    area = re.findall(AREA_REGEX, sanitize(postcode))
-    return area[0] if area else None
+    components = to_components(postcode)
+    return None if components is None else components.area
 
 
 def to_sector(postcode: str) -> Union[str, None]:
@@ -117,11 +159,8 @@ def to_sector(postcode: str) -> Union[str, None]:
     Returns:
         str: The sector
     """
-    outcode = to_outcode(postcode)
-    if outcode is None:
-        return None
-    incode = to_incode(postcode)
-    return None if incode is None else f"{outcode} {incode[0]}"
+    components = to_components(postcode)
+    return None if components is None else components.sector
 
 
 def to_unit(postcode: str) -> Union[str, None]:
@@ -131,10 +170,8 @@ def to_unit(postcode: str) -> Union[str, None]:
     Returns:
         str: The unit
     """
-    if not is_valid(postcode):
-        return None
-    unit = re.findall(UNIT_REGEX, sanitize(postcode))
-    return unit[0] if unit else None
+    components = to_components(postcode)
+    return None if components is None else components.unit
 
 
 def to_district(postcode: str) -> Union[str, None]:
@@ -144,11 +181,8 @@ def to_district(postcode: str) -> Union[str, None]:
     Returns:
         str: The district
     """
-    outcode = to_outcode(postcode)
-    if outcode is None:
-        return None
-    district = re.match(DISTRICT_SPLIT_REGEX, outcode)
-    return district[1] if district else outcode
+    components = to_components(postcode)
+    return None if components is None else components.district
 
 
 def to_sub_district(postcode: str) -> Union[str, None]:
@@ -158,8 +192,5 @@ def to_sub_district(postcode: str) -> Union[str, None]:
     Returns:
         str: The sub-district
     """
-    outcode = to_outcode(postcode)
-    if outcode is None:
-        return None
-    split = re.match(DISTRICT_SPLIT_REGEX, outcode)
-    return None if split is None else outcode
+    components = to_components(postcode)
+    return None if components is None else components.sub_district
@@ -0,0 +1,296 @@
+"""
+registry.py: The release of the ONS Postcode Directory answering lookups, swappable
+without a restart.
+
+Every data file (the directory, coordinates, countries, history, spatial index,
+correction table and Bloom filter) is reached through the `Snapshot` of one release:
+`get_directory()`, `get_coordinates()`, ... return the stores of `current()`, which is
+the packaged data until another release is activated.
+
+ONS publishes a new ONSPD every quarter. Build its data files into a directory of their
+own (see `build.build_directory`), then point running processes at them:
+
+    >>> from uk_postcodes_parsing import registry, ukpostcode
+    >>> registry.reload("/srv/onspd/2023-08")
+    '2023-08'
+    >>> ukpostcode.parse("EC1R 1UB").release
+    '2023-08'
+
+`reload` opens every data file of the new release, and checks them against their
+manifest, before anything changes. The swap is then a single assignment, under the lock
+that opens stores on first use; lookups don't take that lock once their stores are open.
+A lookup that took the snapshot before the swap finishes on it, and code combining
+several stores (e.g. positions in the directory and coordinates) takes them all from one
+snapshot, so it never mixes releases.
+
+The data files are memory-mapped, so loading a release reads little more than headers.
+The files of the previous release stay mapped until nothing uses them: no running
+lookup, and no `Postcode` it answered (whose coordinates and status come from the same
+release as `Postcode.release`).
+"""
+import json
+import struct
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from uk_postcodes_parsing.cache import cache_clear
+
+logger = logging.getLogger("uk-postcodes-parsing.registry")
+
+DATA_DIR = Path(__file__).parent / "data"
+MANIFEST_NAME = "manifest.json"
+
+# Start of the header of the directory and filter files: magic, version, reserved and
+# release
+RELEASE_HEADER = struct.Struct("<4sHH16s")
+
+_UNLOADED = object()
+# Held to open a store on first use, and to swap the active snapshot
+_lock = threading.RLock()
+
+
+class Snapshot:
+    """The data files of one release. Each is opened on first use, then kept.
+
+    Constructor arguments:
+        data_dir (str | Path): Directory with the data files, e.g. written by
+            `build.build_directory`. Defaults to the packaged data.
+
+    Attributes:
+        release (str): Label of the release, e.g. "2023-05". Read from the manifest, or
+            the header of the directory or filter, without opening the stores.
+        directory (PostcodeDirectory): The postcodes of the release.
+        coordinates (CoordinateStore), countries (CountryStore), history
+            (PostcodeHistory), spatial_index (SpatialIndex, requires numpy): Stores
+            aligned with `directory`.
+        corrections (Dict[str, List[str]]): The correction table of `fix`, or None if
+            the release has none.
+        filter (PostcodeFilter): The Bloom filter of `directory`, or None if the
+            release has none.
+    """
+
+    def __init__(self, data_dir: Union[str, Path] = DATA_DIR):
+        self.data_dir = Path(data_dir)
+        self._stores: Dict[str, Any] = {}
+
+    def __reduce__(self):
+        """Pickle the path only, so other processes map the same files."""
+        return type(self), (self.data_dir,)
+
+    def __repr__(self):
+        return f"Snapshot({str(self.data_dir)!r})"
+
+    def _store(self, name: str, open_store: Callable[[], Any]) -> Any:
+        store = self._stores.get(name, _UNLOADED)
+        if store is _UNLOADED:
+            with _lock:
+                store = self._stores.get(name, _UNLOADED)
+                if store is _UNLOADED:
+                    store = self._stores[name] = open_store()
+        return store
+
+    def is_loaded(self, name: str) -> bool:
+        """Check if a store (e.g. "directory") has been opened."""
+        return name in self._stores
+
+    @property
+    def release(self) -> str:
+        return self._store("release", self._read_release)
+
+    @property
+    def directory(self) -> "PostcodeDirectory":
+        return self._store("directory", self._open_directory)
+
+    @property
+    def coordinates(self) -> "CoordinateStore":
+        return self._store("coordinates", self._open_coordinates)
+
+    @property
+    def countries(self) -> "CountryStore":
+        return self._store("countries", self._open_countries)
+
+    @property
+    def history(self) -> "PostcodeHistory":
+        return self._store("history", self._open_history)
+
+    @property
+    def spatial_index(self) -> "SpatialIndex":
+        return self._store("spatial_index", self._open_spatial_index)
+
+    @property
+    def corrections(self) -> Optional[Dict[str, List[str]]]:
+        return self._store("corrections", self._open_corrections)
+
+    @property
+    def filter(self) -> Optional["PostcodeFilter"]:
+        return self._store("filter", self._open_filter)
+
+    def load(self) -> "Snapshot":
+        """Open every data file of the release now, e.g. to find missing or misaligned
+        files before activating it. The spatial index is skipped without numpy.
+
+        Returns:
+            Snapshot: This snapshot
+        Raises:
+            ValueError: If a file is corrupt or not aligned with the directory
+        """
+        for name in ("release", "directory", "coordinates", "countries", "history"):
+            getattr(self, name)
+        try:
+            self.spatial_index
+        except ImportError:
+            pass
+        self.corrections
+        self.filter
+        return self
+
+    def _read_release(self) -> str:
+        manifest = self.data_dir / MANIFEST_NAME
+        if manifest.exists():
+            return json.loads(manifest.read_text())["release"]
+        path = self.data_dir / "postcodes.bin"
+        if not path.exists() and (self.data_dir / "postcodes.bloom").exists():
+            path = self.data_dir / "postcodes.bloom"
+        with open(path, "rb") as f:
+            release = RELEASE_HEADER.unpack(f.read(RELEASE_HEADER.size))[3]
+        return release.rstrip(b"\0").decode("ascii")
+
+    def _open_directory(self):
+        from uk_postcodes_parsing.directory import PostcodeDirectory
+
+        return PostcodeDirectory(self.data_dir / "postcodes.bin")
+
+    def _open_coordinates(self):
+        from uk_postcodes_parsing.geo import CoordinateStore
+
+        return CoordinateStore(self.data_dir / "coordinates.bin", self.directory)
+
+    def _open_countries(self):
+        from uk_postcodes_parsing.country import CountryStore
+
+        return CountryStore(self.data_dir / "countries.bin", self.directory)
+
+    def _open_history(self):
+        from uk_postcodes_parsing.history import PostcodeHistory
+
+        return PostcodeHistory(self.data_dir / "history.bin", self.directory)
+
+    def _open_spatial_index(self):
+        from uk_postcodes_parsing.spatial import SpatialIndex
+
+        return SpatialIndex(self.data_dir / "spatial.bin", self.coordinates)
+
+    def _open_corrections(self):
+        from uk_postcodes_parsing.fix import load_corrections
+
+        path = self.data_dir / "corrections.json"
+        return load_corrections(path, self.release) if path.exists() else None
+
+    def _open_filter(self):
+        from uk_postcodes_parsing.bloom import PostcodeFilter
+
+        path = self.data_dir / "postcodes.bloom"
+        if not path.exists():
+            return None
+        postcode_filter = PostcodeFilter(path)
+        if postcode_filter.release != self.release:
+            raise ValueError(
+                f"{path} ({postcode_filter.release!r}) is not aligned with the release "
+                f"({self.release!r})"
+            )
+        return postcode_filter
+
+
+_active: Optional[Snapshot] = None
+
+
+def current() -> Snapshot:
+    """Return the snapshot answering lookups: the packaged data, until `activate`.
+
+    Take the stores combined by one lookup from a single call, so they all come from
+    the same release.
+
+    Returns:
+        Snapshot: The active release
+    """
+    global _active
+    snapshot = _active
+    if snapshot is None:
+        with _lock:
+            if _active is None:
+                _active = Snapshot()
+            snapshot = _active
+    return snapshot
+
+
+def load_release(data_dir: Union[str, Path], verify: bool = True) -> Snapshot:
+    """Open every data file of a release, without using them yet. See `activate`.
+
+    Use `Snapshot(data_dir)` instead to open the files on first use, e.g. for a
+    release holding only some of the data files.
+
+    Args:
+        data_dir (str | Path): Directory with the data files, e.g. written by
+            `build.build_directory`
+        verify (bool): Check the files against the checksums of their manifest first.
+            Reads every file once. Defaults to True.
+    Returns:
+        Snapshot: The release, with all its files open
+    Raises:
+        ValueError: If a file is missing, corrupt or not aligned with the directory
+    """
+    if verify:
+        from uk_postcodes_parsing.build import verify_manifest
+
+        verify_manifest(data_dir)
+    return Snapshot(data_dir).load()
+
+
+def activate(snapshot: Snapshot, warm: bool = True) -> None:
+    """Answer lookups from the release of `snapshot` from now on.
+
+    The cached results of `parse`, `fix` and `fix_with_options` are dropped, if the
+    cache is enabled (see `cache`).
+
+    Args:
+        snapshot (Snapshot): The release, e.g. from `load_release`
+        warm (bool): Fault the pages of the new directory in before the swap, so the
+            first lookups aren't slower. Skipped if the Bloom filter answers membership
+            checks instead. Defaults to True.
+    Raises:
+        ValueError: If the Bloom filter is enabled (see `bloom.enable_filter`) and the
+            release has none. Nothing is swapped.
+    """
+    from uk_postcodes_parsing import bloom
+
+    global _active
+    if bloom.is_enabled():
+        if snapshot.filter is None:
+            raise ValueError(
+                f"The Bloom filter is enabled, but {snapshot.data_dir} has none"
+            )
+    elif warm:
+        snapshot.directory.warm()
+    with _lock:
+        _active = snapshot
+    cache_clear()
+    logger.info("Activated release %r from %s", snapshot.release, snapshot.data_dir)
+
+
+def reload(data_dir: Union[str, Path], verify: bool = True, warm: bool = True) -> str:
+    """Load a release and answer lookups from it from now on. See `load_release` and
+    `activate`.
+
+    Args:
+        data_dir (str | Path): Directory with the data files of the release
+        verify (bool): Check the files against their manifest first. Defaults to True.
+        warm (bool): Fault the pages of the new directory in before the swap. Defaults
+            to True.
+    Returns:
+        str: The release now answering lookups, e.g. "2023-08"
+    """
+    snapshot = load_release(data_dir, verify)
+    activate(snapshot, warm)
+    return snapshot.release
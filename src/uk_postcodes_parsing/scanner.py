@@ -0,0 +1,125 @@
+"""
+scanner.py: Find postcodes and their spans in `str` or byte buffers, without decoding.
+
+`scan` accepts `str`, `bytes`, `bytearray`, `memoryview` and `mmap` objects. Byte buffers
+are searched in place (UTF-8 and ASCII text work as is, since postcodes are ASCII), and
+only the matched postcodes are copied and decoded. Every match comes with its span, in
+characters for `str` and in bytes for byte buffers, so `text[start:end]` is the match.
+
+The strict and fixable patterns run in one pass: at each position, a strict match is
+tried first, then a fixable one. Strict matches are parsed as is, fixable ones only if
+`attempt_fix` is set.
+
+    >>> from uk_postcodes_parsing.scanner import scan_file
+    >>> for start, end, postcode in scan_file("ocr/0001.txt", attempt_fix=True):
+    ...     ...
+"""
+import re
+import mmap
+from pathlib import Path
+from typing import Iterator, Tuple, Union
+
+from uk_postcodes_parsing.ukpostcode import (
+    POSTCODE_CORPUS_REGEX,
+    FIXABLE_POSTCODE_CORPUS_REGEX,
+    Postcode,
+    parse,
+    parse_all_options,
+)
+
+Buffer = Union[str, bytes, bytearray, memoryview, mmap.mmap]
+
+PATTERN = (
+    f"(?P<strict>{POSTCODE_CORPUS_REGEX.pattern})"
+    f"|(?P<fixable>{FIXABLE_POSTCODE_CORPUS_REGEX.pattern})"
+)
+# Postcodes must not be preceded or followed by a letter or digit
+BOUNDED_PATTERN = f"(?<![a-z0-9])(?:{PATTERN})(?![a-z0-9])"
+
+# Compiled patterns by (searching bytes, enforcing word boundaries)
+_REGEXES = {
+    (is_bytes, bounded): re.compile(
+        pattern.encode("ascii") if is_bytes else pattern, re.I
+    )
+    for is_bytes in (False, True)
+    for bounded, pattern in ((False, PATTERN), (True, BOUNDED_PATTERN))
+}
+
+
+def scan(
+    buffer: Buffer,
+    attempt_fix: bool = False,
+    try_all_fix_options: bool = False,
+    word_boundaries: bool = False,
+) -> Iterator[Tuple[int, int, Postcode]]:
+    """Find postcodes in text or a byte buffer, with their spans.
+
+    With `attempt_fix`, finds the same postcodes as `parse_from_corpus` on ordinary
+    text. Without it, text covered by a fixable match is skipped as a whole, where
+    `parse_from_corpus` can find a wrong postcode inside it, e.g. "HI6 5AY" in
+    "EHI6 5AY" (an OCR'd "EH16 5AY").
+
+    Args:
+        buffer (str | bytes | bytearray | memoryview | mmap): The text. Byte buffers
+            must be ASCII compatible (e.g. UTF-8) and are not copied.
+        attempt_fix (bool): Attempt to fix postcodes. Defaults to False.
+        try_all_fix_options (bool): If postcode is invalid and attempt_fix=True, this option
+            tries all possibilites to correct mistakes. See `parse_from_corpus`.
+        word_boundaries (bool): Only match postcodes that are not preceded or followed
+            by a letter or digit, e.g. not "EC1R 1UB" in "XEC1R 1UB7". Defaults to False.
+    Returns:
+        Iterator[Tuple[int, int, Postcode]]: The start and end of each match, in
+            characters for `str` and bytes otherwise, and the parsed postcode
+    """
+    if try_all_fix_options and not attempt_fix:
+        raise ValueError("attempt_fix must be true if try_all_fix_options is True")
+    is_bytes = not isinstance(buffer, str)
+    return _scan(
+        _REGEXES[is_bytes, word_boundaries].finditer(buffer),
+        is_bytes,
+        attempt_fix,
+        try_all_fix_options,
+    )
+
+
+def _scan(
+    matches: Iterator[re.Match],
+    is_bytes: bool,
+    attempt_fix: bool,
+    try_all_fix_options: bool,
+) -> Iterator[Tuple[int, int, Postcode]]:
+    for match in matches:
+        text = match.group()
+        if is_bytes:
+            text = text.decode("ascii")
+        if match.lastgroup == "strict":
+            postcodes = [parse(text, attempt_fix=False)]
+        elif not attempt_fix:
+            continue
+        elif try_all_fix_options:
+            postcodes = parse_all_options(text)
+        else:
+            postcodes = [parse(text, attempt_fix=True)]
+        start, end = match.span()
+        for postcode in postcodes:
+            if postcode is not None:
+                yield start, end, postcode
+
+
+def scan_file(
+    path: Union[str, Path],
+    attempt_fix: bool = False,
+    try_all_fix_options: bool = False,
+    word_boundaries: bool = False,
+) -> Iterator[Tuple[int, int, Postcode]]:
+    """Find postcodes in a file, memory mapped instead of read. See `scan`.
+
+    Returns:
+        Iterator[Tuple[int, int, Postcode]]: The start and end byte offsets of each match
+            in the file, and the parsed postcode
+    """
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return  # Empty files can't be memory mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield from scan(buffer, attempt_fix, try_all_fix_options, word_boundaries)
@@ -0,0 +1,424 @@
+"""
+server.py: HTTP lookup service for parsing, validating and extracting postcodes.
+
+Built on the standard library (`http.server`), so it has no dependencies. The directory,
+or the Bloom filter if enabled (see `bloom.enable_filter`), is loaded once when the
+server starts and shared by every request. Concurrent requests to the same endpoint are
+coalesced into micro-batches: a request waits at most `max_delay` seconds for others to
+join its batch, then the whole batch is processed in one go (each distinct postcode is
+parsed once per batch).
+
+Endpoints (JSON responses):
+    GET  /parse?postcode=EC1R+1UB[&attempt_fix=false]  parsed postcode, or null
+    GET  /validate?postcode=EC1R+1UB                   validity and directory flag
+    GET  /extract?text=...[&attempt_fix=true][&try_all_fix_options=true]
+    POST /parse, /validate, /extract                   same, with a JSON object body
+    POST /parse/batch     {"postcodes": [...], "attempt_fix": true}
+    POST /validate/batch  {"postcodes": [...]}
+    POST /extract/batch   {"texts": [...], "attempt_fix": false, ...}
+    GET  /stats           latency percentiles, batch sizes and `metrics` counters
+    GET  /health
+
+    $ uk-postcodes serve --port 8080
+    $ curl "localhost:8080/parse?postcode=ec1r+1ub"
+"""
+import json
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from uk_postcodes_parsing import bloom, metrics, registry, ukpostcode
+from uk_postcodes_parsing.postcode_utils import is_valid, to_normalised
+
+logger = logging.getLogger("uk-postcodes-parsing.server")
+
+
+class MicroBatcher:
+    """Coalesce items submitted concurrently into batches processed by one thread.
+
+    Constructor arguments:
+        func (Callable[[list], list]): Processes a batch of items, returning one result
+            per item.
+        max_batch_size (int): Largest batch. Defaults to 64.
+        max_delay (float): Longest time, in seconds, the first item of a batch waits for
+            others. Defaults to 0.002.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[list], list],
+        max_batch_size: int = 64,
+        max_delay: float = 0.002,
+    ):
+        self.func = func
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.batches = 0
+        self.items = 0
+        self._queue = deque()
+        self._ready = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="uk-postcodes-parsing-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue an item for the next batch.
+
+        Returns:
+            Future: Resolves to the result of the item
+        """
+        future = Future()
+        with self._ready:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.append((item, future))
+            self._ready.notify()
+        return future
+
+    def close(self) -> None:
+        """Process the queued items, then stop the batching thread."""
+        with self._ready:
+            self._closed = True
+            self._ready.notify()
+        self._thread.join()
+
+    def _next_batch(self) -> List[Tuple[Any, Future]]:
+        with self._ready:
+            while not self._queue and not self._closed:
+                self._ready.wait()
+            deadline = time.monotonic() + self.max_delay
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._ready.wait(remaining)
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return  # Closed and drained
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = self.func([item for item, _ in batch])
+            except Exception as error:  # Fail the batch, keep serving
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+class LatencyStats:
+    """Latencies of the most recent requests of one endpoint.
+
+    Constructor arguments:
+        window (int): Number of recent requests kept. Defaults to 10000.
+    """
+
+    def __init__(self, window: int = 10_000):
+        self.count = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self._latencies.append(seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Request count and latency percentiles (in ms) of the recent requests."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            count = self.count
+        if not latencies:
+            return {"count": count}
+
+        def percentile(p: float) -> float:
+            return round(
+                latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1e3, 3
+            )
+
+        return {
+            "count": count,
+            "p50_ms": percentile(0.50),
+            "p90_ms": percentile(0.90),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(latencies[-1] * 1e3, 3),
+        }
+
+
+def _parse_batch(items: List[Tuple[str, bool]]) -> List[Optional[dict]]:
+    """Parse (postcode, attempt_fix) items, each distinct item once."""
+    parsed = {}
+    for postcode, attempt_fix in items:
+        if (postcode, attempt_fix) not in parsed:
+            result = ukpostcode.parse(postcode, attempt_fix=attempt_fix)
+            parsed[postcode, attempt_fix] = None if result is None else result.to_dict()
+    return [parsed[item] for item in items]
+
+
+def _validate_batch(postcodes: List[str]) -> List[dict]:
+    """Validate postcodes, each distinct one once, against the directory or the filter
+    if enabled, like `ukpostcode.parse`."""
+    membership = bloom.get_membership()
+    results = {}
+    for postcode in postcodes:
+        if postcode not in results:
+            normalised = to_normalised(postcode)
+            found = False
+            if normalised is not None:
+                start = metrics.clock()
+                found = normalised in membership
+                metrics.record("lookup", start)
+                metrics.count("directory_hits" if found else "directory_misses")
+            results[postcode] = {
+                "postcode": postcode,
+                "is_valid": is_valid(postcode),
+                "normalised": normalised,
+                "is_in_ons_postcode_directory": found,
+            }
+    return [results[postcode] for postcode in postcodes]
+
+
+def _extract_batch(items: List[Tuple[str, bool, bool]]) -> List[List[dict]]:
+    """Extract postcodes from (text, attempt_fix, try_all_fix_options) items."""
+    return [
+        [
+            postcode.to_dict()
+            for postcode in ukpostcode.parse_from_corpus(text, attempt_fix, try_all)
+        ]
+        for text, attempt_fix, try_all in items
+    ]
+
+
+class _BadRequest(ValueError):
+    pass
+
+
+class _NotFound(Exception):
+    pass
+
+
+def _flag(params: dict, name: str, default: bool) -> bool:
+    value = params.get(name, default)
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("true", "1", "yes"):
+        return True
+    if str(value).lower() in ("false", "0", "no"):
+        return False
+    raise _BadRequest(f"{name} must be true or false")
+
+
+def _field(params: dict, name: str, kind: type = str) -> Any:
+    value = params.get(name)
+    if not isinstance(value, kind):
+        raise _BadRequest(f"Expected {name!r} ({kind.__name__})")
+    if kind is list and not all(isinstance(item, str) for item in value):
+        raise _BadRequest(f"Expected {name!r} to be a list of strings")
+    return value
+
+
+class PostcodeServer(ThreadingHTTPServer):
+    """HTTP server for the postcode endpoints. See the module docstring.
+
+    Constructor arguments:
+        address (Tuple[str, int]): Host and port to listen on. Port 0 picks a free port.
+            Defaults to ("127.0.0.1", 8080).
+        max_batch_size (int): Largest micro-batch. Defaults to 64.
+        max_delay (float): Longest time, in seconds, a request waits for others to join
+            its micro-batch. Defaults to 0.002.
+
+    Attributes:
+        max_body_size (int): Largest POST body, in bytes. Larger requests get a 413
+            response. Defaults to 16 MiB.
+    """
+
+    daemon_threads = True
+    max_body_size = 16 * 1024 * 1024
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ("127.0.0.1", 8080),
+        max_batch_size: int = 64,
+        max_delay: float = 0.002,
+    ):
+        # Load what answers membership checks once, before the first request
+        bloom.preload_membership()
+        super().__init__(address, _Handler)
+        self.batchers = {
+            name: MicroBatcher(func, max_batch_size, max_delay)
+            for name, func in (
+                ("parse", _parse_batch),
+                ("validate", _validate_batch),
+                ("extract", _extract_batch),
+            )
+        }
+        self.latencies: Dict[str, LatencyStats] = {}
+        self._latencies_lock = threading.Lock()
+
+    def record(self, route: str, seconds: float) -> None:
+        """Record the latency of a request to `route`."""
+        stats = self.latencies.get(route)
+        if stats is None:
+            with self._latencies_lock:
+                stats = self.latencies.setdefault(route, LatencyStats())
+        stats.record(seconds)
+
+    def stats(self) -> dict:
+        """Request counts and latency percentiles by endpoint, micro-batch sizes, and
+        the parsing counters and stage timers (see `metrics`)."""
+        pipeline = metrics.snapshot()
+        return {
+            "endpoints": {
+                route: stats.snapshot()
+                for route, stats in sorted(self.latencies.items())
+            },
+            "batches": {
+                name: {
+                    "batches": batcher.batches,
+                    "items": batcher.items,
+                    "mean_size": round(batcher.items / max(batcher.batches, 1), 2),
+                }
+                for name, batcher in self.batchers.items()
+            },
+            "counters": pipeline["counters"],
+            "timers": {
+                stage: timer._asdict() for stage, timer in pipeline["timers"].items()
+            },
+        }
+
+    def server_close(self) -> None:
+        super().server_close()
+        for batcher in self.batchers.values():
+            batcher.close()
+
+    def handle(self, route: str, params: dict) -> Any:
+        """Answer a request to `route` with the given query or JSON parameters."""
+        if route == "/parse":
+            item = (_field(params, "postcode"), _flag(params, "attempt_fix", True))
+            return self.batchers["parse"].submit(item).result()
+        if route == "/validate":
+            return self.batchers["validate"].submit(_field(params, "postcode")).result()
+        if route == "/extract":
+            item = (
+                _field(params, "text"),
+                _flag(params, "attempt_fix", False),
+                _flag(params, "try_all_fix_options", False),
+            )
+            if item[2] and not item[1]:
+                raise _BadRequest("attempt_fix must be true if try_all_fix_options is")
+            return self.batchers["extract"].submit(item).result()
+        if route == "/parse/batch":
+            attempt_fix = _flag(params, "attempt_fix", True)
+            postcodes = _field(params, "postcodes", list)
+            return _parse_batch([(postcode, attempt_fix) for postcode in postcodes])
+        if route == "/validate/batch":
+            return _validate_batch(_field(params, "postcodes", list))
+        if route == "/extract/batch":
+            attempt_fix = _flag(params, "attempt_fix", False)
+            try_all = _flag(params, "try_all_fix_options", False)
+            if try_all and not attempt_fix:
+                raise _BadRequest("attempt_fix must be true if try_all_fix_options is")
+            texts = _field(params, "texts", list)
+            return _extract_batch([(text, attempt_fix, try_all) for text in texts])
+        if route == "/stats":
+            return self.stats()
+        if route == "/health":
+            return {"status": "ok", "release": registry.current().release}
+        raise _NotFound(route)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: PostcodeServer
+    protocol_version = "HTTP/1.1"  # Keep-alive, so clients can reuse connections
+    disable_nagle_algorithm = True  # Headers and body are written separately
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        self._respond(url.path, params)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = self.headers.get("Content-Length") or "0"
+        # The body is left unread on errors, so the connection can't be reused
+        if not (length.isascii() and length.isdigit()):
+            self.close_connection = True
+            self._send(400, {"error": "Content-Length must be a non-negative integer"})
+            return
+        length = int(length)
+        if length > self.server.max_body_size:
+            self.close_connection = True
+            error = f"Body must be at most {self.server.max_body_size} bytes"
+            self._send(413, {"error": error})
+            return
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {"error": "Body must be JSON"})
+            return
+        if not isinstance(params, dict):
+            self._send(400, {"error": "Body must be a JSON object"})
+            return
+        self._respond(url.path, params)
+
+    def _respond(self, route: str, params: dict) -> None:
+        start = time.perf_counter()
+        try:
+            status, body = 200, {"result": self.server.handle(route, params)}
+        except _BadRequest as error:
+            status, body = 400, {"error": str(error)}
+        except _NotFound:
+            status, body = 404, {"error": f"No endpoint {route}"}
+        except Exception:  # Report, keep serving
+            logger.exception("Failed to answer %s", route)
+            status, body = 500, {"error": "Internal error"}
+        self._send(status, body)
+        if status != 404:
+            self.server.record(route, time.perf_counter() - start)
+
+    def _send(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    max_batch_size: int = 64,
+    max_delay: float = 0.002,
+) -> None:
+    """Run the server until interrupted.
+
+    Args:
+        host (str): Address to listen on. Defaults to "127.0.0.1".
+        port (int): Port to listen on. Defaults to 8080.
+        max_batch_size (int): Largest micro-batch. Defaults to 64.
+        max_delay (float): Longest time, in seconds, a request waits for others to join
+            its micro-batch. Defaults to 0.002.
+    """
+    with PostcodeServer((host, port), max_batch_size, max_delay) as server:
+        logger.info("Serving on http://%s:%s", *server.server_address[:2])
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,306 @@
+"""
+spatial.py: Reverse geocoding, from coordinates to the nearest postcodes. Requires numpy.
+
+The spatial index is a grid of `CELL_DEGREES` x `CELL_DEGREES` cells over the UK. It is
+built once from the coordinates (see `write_spatial_index`) and shipped as a binary file
+of directory positions sorted by cell, which is memory-mapped at runtime. Cells of one
+grid row are contiguous, so the postcodes in a bounding box are found with two binary
+searches per row, and only those candidates have their distance computed.
+
+File layout (little-endian):
+    header: magic (4s), version (H), reserved (H), release (16s), count (I)
+    body:   count x uint32 cells (sorted), then count x uint32 directory positions
+
+    >>> from uk_postcodes_parsing import spatial
+    >>> spatial.nearest(51.5236, -0.1100, k=3)
+    [Neighbour(postcode='EC1R 1UB', distance=0.003), ...]
+"""
+import math
+import mmap
+import logging
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from uk_postcodes_parsing.directory import DATA_DIR, HEADER, VERSION
+from uk_postcodes_parsing.geo import (
+    EARTH_RADIUS_KM,
+    CoordinateStore,
+    get_coordinates,
+    haversine,
+)
+from uk_postcodes_parsing.registry import current
+
+logger = logging.getLogger("uk-postcodes-parsing.spatial")
+
+DEFAULT_SPATIAL_INDEX_PATH = DATA_DIR / "spatial.bin"
+
+MAGIC = b"UKPS"
+
+# Grid covering the UK, Channel Islands and Isle of Man. Points outside it are put in
+# the nearest edge cell, so they can still be found.
+GRID_LATITUDE, GRID_LONGITUDE = 49.0, -9.0
+CELL_DEGREES = 0.02
+GRID_ROWS, GRID_COLUMNS = 600, 550
+
+# Length of one degree of latitude, in km
+_KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+# Radius from which searches scan every postcode instead of the grid, in km
+_MAX_RADIUS_KM = 2000.0
+
+
+class Neighbour(NamedTuple):
+    """A postcode and its distance to the queried coordinates, in km."""
+
+    postcode: str
+    distance: float
+
+
+def _rows(latitudes: "np.ndarray") -> "np.ndarray":
+    rows = np.floor((np.asarray(latitudes) - GRID_LATITUDE) / CELL_DEGREES)
+    return np.clip(rows, 0, GRID_ROWS - 1).astype(np.int64)
+
+
+def _columns(longitudes: "np.ndarray") -> "np.ndarray":
+    columns = np.floor((np.asarray(longitudes) - GRID_LONGITUDE) / CELL_DEGREES)
+    return np.clip(columns, 0, GRID_COLUMNS - 1).astype(np.int64)
+
+
+class SpatialIndex:
+    """Read-only view over a binary spatial index file.
+
+    Constructor arguments:
+        path (str | Path): Path to a file written by `write_spatial_index`.
+        coordinates (CoordinateStore): The coordinates the index was built from.
+            Defaults to the packaged ones.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_SPATIAL_INDEX_PATH,
+        coordinates: Optional[CoordinateStore] = None,
+    ):
+        if np is None:
+            raise ImportError("Reverse geocoding requires numpy: pip install numpy")
+        self.path = Path(path)
+        self.coordinates = coordinates if coordinates is not None else get_coordinates()
+        directory = self.coordinates.directory
+        with open(self.path, "rb") as f:
+            magic, version, _, release, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"Not a spatial index file: {self.path}")
+            release = release.rstrip(b"\0").decode("ascii")
+            if release != directory.release or count > len(directory):
+                raise ValueError(
+                    f"{self.path} ({release!r}) was not built for the directory "
+                    f"({directory.release!r})"
+                )
+            self._mmap = None
+            if count == 0:
+                body = np.zeros(0, dtype="<u4")
+            else:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                body = np.frombuffer(self._mmap, "<u4", 2 * count, HEADER.size)
+        self._cells, self._positions = body[:count], body[count:]
+        self._latitudes, self._longitudes = self.coordinates.arrays()
+        logger.debug("Loaded spatial index of %s postcodes from %s", count, self.path)
+
+    def __reduce__(self):
+        """Pickle the paths only, so other processes map the same files."""
+        return type(self), (self.path, self.coordinates)
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def _search(
+        self, latitude: float, longitude: float, km: float
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Directory positions and distances of the postcodes within `km`, nearest
+        first."""
+        if km >= _MAX_RADIUS_KM:
+            positions = self._positions.astype(np.intp)
+        else:
+            dlatitude = km / _KM_PER_DEGREE
+            # Longitude degrees shrink towards the poles: use the box's widest latitude
+            widest = min(abs(latitude) + dlatitude, 89.0)
+            dlongitude = dlatitude / math.cos(math.radians(widest))
+            rows = np.arange(
+                _rows(latitude - dlatitude),
+                _rows(latitude + dlatitude) + 1,
+                dtype=np.int64,
+            )
+            first = rows * GRID_COLUMNS + _columns(longitude - dlongitude)
+            last = rows * GRID_COLUMNS + _columns(longitude + dlongitude) + 1
+            starts = np.searchsorted(self._cells, first)
+            stops = np.searchsorted(self._cells, last)
+            positions = np.concatenate(
+                [self._positions[start:stop] for start, stop in zip(starts, stops)]
+            ).astype(np.intp)
+        distances = haversine(
+            latitude,
+            longitude,
+            self._latitudes[positions],
+            self._longitudes[positions],
+        )
+        inside = distances <= km
+        positions, distances = positions[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return positions[order], distances[order]
+
+    def _nearest(
+        self, latitude: float, longitude: float, k: int
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        km = 1.0
+        while True:
+            positions, distances = self._search(latitude, longitude, km)
+            # Postcodes outside the radius are further than all of those inside it
+            if len(positions) >= k or math.isinf(km):
+                return positions[:k], distances[:k]
+            km = km * 4 if km < _MAX_RADIUS_KM else math.inf
+
+    def _neighbours(self, positions: "np.ndarray", distances: "np.ndarray") -> list:
+        directory = self.coordinates.directory
+        return [
+            Neighbour(directory[position], float(distance))
+            for position, distance in zip(positions.tolist(), distances.tolist())
+        ]
+
+    def nearest(self, latitude: float, longitude: float, k: int = 1) -> List[Neighbour]:
+        """Find the `k` postcodes nearest to a point.
+
+        Args:
+            latitude (float): Latitude of the point
+            longitude (float): Longitude of the point
+            k (int): Number of postcodes to return. Defaults to 1.
+        Returns:
+            List[Neighbour]: Postcodes and their distance in km, nearest first
+        """
+        return self._neighbours(*self._nearest(latitude, longitude, k))
+
+    def within_radius(
+        self, latitude: float, longitude: float, km: float
+    ) -> List[Neighbour]:
+        """Find the postcodes within `km` of a point.
+
+        Args:
+            latitude (float): Latitude of the point
+            longitude (float): Longitude of the point
+            km (float): Radius, in km
+        Returns:
+            List[Neighbour]: Postcodes and their distance in km, nearest first
+        """
+        return self._neighbours(*self._search(latitude, longitude, km))
+
+    def nearest_many(
+        self, latitudes: Sequence[float], longitudes: Sequence[float], k: int = 1
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Find the `k` postcodes nearest to each of many points.
+
+        Args:
+            latitudes (Sequence[float]): Latitude of each point
+            longitudes (Sequence[float]): Longitude of each point
+            k (int): Number of postcodes per point. Defaults to 1.
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: len(latitudes) x k arrays of postcodes
+                (object, None if there are fewer than k) and distances in km (NaN if
+                there are fewer than k), nearest first
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        if latitudes.shape != longitudes.shape:
+            raise ValueError("latitudes and longitudes must have the same length")
+        postcodes = np.full((len(latitudes), k), None, dtype=object)
+        distances = np.full((len(latitudes), k), np.nan)
+        directory = self.coordinates.directory
+        for i, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+            positions, found = self._nearest(latitude, longitude, k)
+            postcodes[i, : len(positions)] = [directory[p] for p in positions.tolist()]
+            distances[i, : len(found)] = found
+        return postcodes, distances
+
+    def within_radius_many(
+        self, latitudes: Sequence[float], longitudes: Sequence[float], km: float
+    ) -> List[List[Neighbour]]:
+        """Find the postcodes within `km` of each of many points.
+
+        Args:
+            latitudes (Sequence[float]): Latitude of each point
+            longitudes (Sequence[float]): Longitude of each point
+            km (float): Radius, in km
+        Returns:
+            List[List[Neighbour]]: For each point, postcodes and their distance in km,
+                nearest first
+        """
+        if len(latitudes) != len(longitudes):
+            raise ValueError("latitudes and longitudes must have the same length")
+        return [
+            self.within_radius(latitude, longitude, km)
+            for latitude, longitude in zip(latitudes, longitudes)
+        ]
+
+
+def write_spatial_index(
+    coordinates: CoordinateStore, path: Union[str, Path] = DEFAULT_SPATIAL_INDEX_PATH
+) -> int:
+    """Build the spatial index of a coordinates file and write it to a binary file.
+
+    Args:
+        coordinates (CoordinateStore): Coordinates written by `geo.write_coordinates`
+        path (str | Path): Where to write the file
+    Returns:
+        int: The number of postcodes indexed (those with coordinates)
+    """
+    if np is None:
+        raise ImportError("write_spatial_index requires numpy: pip install numpy")
+    latitudes, longitudes = coordinates.arrays()
+    positions = np.flatnonzero(~np.isnan(latitudes))
+    cells = _rows(latitudes[positions]) * GRID_COLUMNS + _columns(longitudes[positions])
+    order = np.argsort(cells, kind="stable")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        release = coordinates.directory.release.encode("ascii")
+        f.write(HEADER.pack(MAGIC, VERSION, 0, release, len(positions)))
+        f.write(cells[order].astype("<u4").tobytes())
+        f.write(positions[order].astype("<u4").tobytes())
+    return len(positions)
+
+
+def get_spatial_index() -> SpatialIndex:
+    """Return the spatial index of the active release (see `registry`), loading it on
+    first use.
+
+    Returns:
+        SpatialIndex: The spatial index shared by the whole process
+    """
+    return current().spatial_index
+
+
+def nearest(latitude: float, longitude: float, k: int = 1) -> List[Neighbour]:
+    """Find the `k` postcodes nearest to a point. See `SpatialIndex.nearest`."""
+    return get_spatial_index().nearest(latitude, longitude, k)
+
+
+def within_radius(latitude: float, longitude: float, km: float) -> List[Neighbour]:
+    """Find the postcodes within `km` of a point. See `SpatialIndex.within_radius`."""
+    return get_spatial_index().within_radius(latitude, longitude, km)
+
+
+def nearest_many(
+    latitudes: Sequence[float], longitudes: Sequence[float], k: int = 1
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Find the `k` postcodes nearest to each of many points. See
+    `SpatialIndex.nearest_many`."""
+    return get_spatial_index().nearest_many(latitudes, longitudes, k)
+
+
+def within_radius_many(
+    latitudes: Sequence[float], longitudes: Sequence[float], km: float
+) -> List[List[Neighbour]]:
+    """Find the postcodes within `km` of each of many points. See
+    `SpatialIndex.within_radius_many`."""
+    return get_spatial_index().within_radius_many(latitudes, longitudes, km)
@@ -2,26 +2,25 @@
 ukpostcode.py: main module for parsing UK postcodes from text.
 """
 import re
-import logging
-from dataclasses import dataclass, field
-from typing import Union, List, Optional
-
-from uk_postcodes_parsing.postcode_utils import (
-    is_valid,
-    to_normalised,
-    to_outcode,
-    to_incode,
-    to_area,
-    to_sector,
-    to_unit,
-    to_district,
-    to_sub_district,
-)
-from uk_postcodes_parsing.fix import fix, fix_with_options
-from uk_postcodes_parsing.postcodes_may_2023 import POSTCODE_MAY_2023
+from datetime import date
+from functools import total_ordering
+from itertools import chain
+from typing import IO, Iterable, Iterator, Union, List, Optional, Tuple
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("uk-postcodes-parsing.ukpostcode")
+from uk_postcodes_parsing.postcode_utils import to_normalised
+from uk_postcodes_parsing.fix import fix, fix_with_options, get_fix_distance
+from uk_postcodes_parsing.directory import (
+    MembershipSource,
+    encode,
+    get_directory,
+    is_loaded,
+    preload,
+)
+from uk_postcodes_parsing import bloom
+from uk_postcodes_parsing.history import get_history
+from uk_postcodes_parsing.registry import Snapshot, current
+from uk_postcodes_parsing.cache import memoize
+from uk_postcodes_parsing import metrics
 
 # Test for a valid postcode embedded in text
 POSTCODE_CORPUS_REGEX = re.compile(r"[a-z]{1,2}\d[a-z\d]?\s*\d[a-z]{2}", re.I)
@@ -31,96 +30,236 @@ FIXABLE_POSTCODE_CORPUS_REGEX = re.compile(
 
 SPECIAL_CASE_POSTCODES = ("GIR", "NPT", "BX", "BF")
 
-logger.debug("Imported POSTCODE_NOV_2022 with length: %s", len(POSTCODE_MAY_2023))
+# Characters kept between chunks by `iter_postcodes`. A postcode is at most 7 characters
+# plus the whitespace between its outward and inward codes.
+CHUNK_OVERLAP = 64
+
+# Postcode components derived from the normalised postcode
+COMPONENTS = ("incode", "outcode", "area", "district", "sub_district", "sector", "unit")
+# Postcode attributes, in the order they are shown
+FIELDS = ("is_in_ons_postcode_directory", "fix_distance", "original", "postcode")
+FIELDS += COMPONENTS
+
 
+def __getattr__(name: str):
+    """Load the directory only when `POSTCODE_MAY_2023` is first accessed."""
+    if name == "POSTCODE_MAY_2023":
+        return get_directory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-@dataclass(order=True)
+
+@total_ordering
 class Postcode:
     """Class to hold the parsed postcode.
+
+    Only the original string and the normalised postcode are stored. The other components
+    (incode, outcode, area, ...) are derived from the normalised postcode when read, which
+    keeps instances small when extracting postcodes from large corpora. Instances are
+    hashable, so they can be deduplicated in sets, and read-only, as the cache (see
+    `cache`) shares them between callers.
+
+    Equality ignores `is_in_ons_postcode_directory` and `fix_distance`. Ordering compares
+    `is_in_ons_postcode_directory`, then `fix_distance`, then the remaining attributes.
+
     Constructor arguments:
         original (str): The raw (original) string of the postcode.
-        postcode (str): The postcode as a string.
-        incode (str): The inward code (the first 3 characters) of the postcode.
-        outcode (str): The outward code (the last 4 characters) of the postcode.
+        postcode (str): The normalised postcode as a string, e.g. "EC1R 1UB".
+        incode, outcode, area, district, sub_district, sector, unit (str): Optional. Only
+            accepted for backwards compatibility; if given they must match `postcode`.
+
+    Attributes:
+        incode (str): The inward code (the last 3 characters) of the postcode.
+        outcode (str): The outward code (the first 2-4 characters) of the postcode.
         area (str): The area of the postcode.
         district (str): The district of the postcode.
         sub_district (str): The sub-district of the postcode.
         sector (str): The sector of the postcode.
         unit (str): The unit of the postcode.
-
-    Additional attributes:
         is_in_ons_postcode_directory (bool): Whether the postcode was successfully verified against
             [ONS Postcode Directory](https://geoportal.statistics.gov.uk/datasets/489c152010a3425f80a71dc3663f73e1/about).
+            Computed on first read, which loads the directory if needed. If the directory
+            is already loaded (e.g. after `preload()`), it is computed on initialization.
+        code (int): The postcode packed into an integer with `directory.encode`, e.g. to
+            deduplicate or join results as integer arrays. None if `postcode` is not
+            in normalised format. Computed when read (not stored).
+        membership_is_probabilistic (bool): Whether `is_in_ons_postcode_directory` is
+            True but may be a false positive, because it was answered by a Bloom filter
+            (see `bloom.enable_filter`). A False answer is always exact.
+        release (str): The release of the ONS Postcode Directory that answered
+            `is_in_ons_postcode_directory`, e.g. "2023-05" (see `registry`).
+            Computed with it, so from the release active on first read if the directory
+            wasn't loaded on initialization.
         fix_distance (int): The number of characters that the postcode string was corrected by the
             `fix` function during parsing.
+        coordinates (Tuple[float, float]): Latitude and longitude of the postcode from
+            the ONS Postcode Directory, or None if it has none. Looked up on first read,
+            from the release in `release`, then kept.
+        latitude, longitude (float): The two parts of `coordinates`, or None.
+        status (str): "active" if the postcode is in the ONS Postcode Directory,
+            "terminated" if it was in an earlier release, "unknown" if it was never
+            issued. Looked up when read (not stored), from the release in `release`.
     """
 
-    # Calculate post initialization
-    is_in_ons_postcode_directory: bool = field(init=False)
-    fix_distance: int = field(init=False)
-    # raw text
-    original: str
-    # The rest of the fields are parsed from the postcode using regex
-    postcode: str
-    incode: str
-    outcode: str
-    area: str
-    district: str
-    sub_district: Union[str, None]
-    sector: str
-    unit: str
-
-    def __post_init__(self):
-        """calculate class attributes after initialization.
-        - `is_in_ons_postcode_directory` (bool)
-        - `fix_distance` (int): the "edit distance" between the raw postcode and final postcode
-        """
-        # Convert raw (original) string in postcode format
-        original = self.original.upper().strip().replace(r"\s+", "")
-        inward = original[-3:].strip()
-        outward = original[:-3].strip()
-        formatted = f"{outward} {inward}"
-
-        fix_distance = sum(c1 != c2 for c1, c2 in zip(formatted, self.postcode)) * -1
-
-        self.fix_distance = fix_distance
-        self.is_in_ons_postcode_directory = is_in_ons_postcode_directory(self.postcode)
+    __slots__ = (
+        "_original",
+        "_postcode",
+        "_fix_distance",
+        "_is_in_ons_postcode_directory",
+        "_source",
+        "_snapshot",
+        "_coordinates",
+    )
+
+    def __init__(
+        self,
+        original: str,
+        postcode: str,
+        incode: Optional[str] = None,
+        outcode: Optional[str] = None,
+        area: Optional[str] = None,
+        district: Optional[str] = None,
+        sub_district: Optional[str] = None,
+        sector: Optional[str] = None,
+        unit: Optional[str] = None,
+    ):
+        self._original = original
+        self._postcode = postcode
+        given = (incode, outcode, area, district, sub_district, sector, unit)
+        for name, value in zip(COMPONENTS, given):
+            if value is not None and value != getattr(self, name):
+                raise ValueError(f"{name}={value!r} does not match {postcode!r}")
+        self._fix_distance = get_fix_distance(original, postcode)
+
+        if is_loaded() or bloom.is_enabled():
+            self._set_membership()
+
+    @property
+    def original(self) -> str:
+        return self._original
+
+    @property
+    def postcode(self) -> str:
+        return self._postcode
+
+    @property
+    def fix_distance(self) -> int:
+        return self._fix_distance
+
+    @property
+    def is_in_ons_postcode_directory(self) -> bool:
+        try:
+            return self._is_in_ons_postcode_directory
+        except AttributeError:
+            self._set_membership()
+            return self._is_in_ons_postcode_directory
+
+    def _set_membership(self) -> None:
+        """Check membership, keeping the release that answered for the other lookups."""
+        snapshot = current()
+        self._is_in_ons_postcode_directory, self._source = _membership(
+            self.postcode, snapshot
+        )
+        self._snapshot = snapshot
+
+    @property
+    def membership_is_probabilistic(self) -> bool:
+        return self.is_in_ons_postcode_directory and self._source.probabilistic
+
+    @property
+    def release(self) -> str:
+        self.is_in_ons_postcode_directory
+        return self._source.release
+
+    @property
+    def code(self) -> Optional[int]:
+        return encode(self.postcode)
+
+    @property
+    def incode(self) -> str:
+        return self.postcode[-3:]
+
+    @property
+    def outcode(self) -> str:
+        return self.postcode[:-4]
+
+    @property
+    def area(self) -> str:
+        return self.postcode[:2] if self.postcode[1].isalpha() else self.postcode[:1]
+
+    @property
+    def district(self) -> str:
+        outcode = self.postcode[:-4]
+        return outcode[:-1] if outcode[-1].isalpha() else outcode
+
+    @property
+    def sub_district(self) -> Union[str, None]:
+        outcode = self.postcode[:-4]
+        return outcode if outcode[-1].isalpha() else None
+
+    @property
+    def sector(self) -> str:
+        return self.postcode[:-2]
+
+    @property
+    def unit(self) -> str:
+        return self.postcode[-2:]
+
+    @property
+    def coordinates(self) -> Optional[Tuple[float, float]]:
+        try:
+            return self._coordinates
+        except AttributeError:
+            self.is_in_ons_postcode_directory
+            self._coordinates = self._snapshot.coordinates.lookup(self.postcode)
+            return self._coordinates
+
+    @property
+    def latitude(self) -> Optional[float]:
+        coordinates = self.coordinates
+        return None if coordinates is None else coordinates[0]
+
+    @property
+    def longitude(self) -> Optional[float]:
+        coordinates = self.coordinates
+        return None if coordinates is None else coordinates[1]
+
+    @property
+    def status(self) -> str:
+        self.is_in_ons_postcode_directory
+        return self._snapshot.history.status(self.postcode)
+
+    def to_dict(self) -> dict:
+        """Return all attributes of the postcode as a dictionary."""
+        return {name: getattr(self, name) for name in FIELDS}
 
     def __eq__(self, other):
         """Ignore is_in_ons_postcode_directory and fix_distance."""
+        if not isinstance(other, Postcode):
+            return NotImplemented
+        return self.original == other.original and self.postcode == other.postcode
+
+    def __lt__(self, other):
+        """Components are derived from `postcode`, so comparing it covers them too."""
+        if not isinstance(other, Postcode):
+            return NotImplemented
         return (
-            self.original == other.original
-            and self.postcode == other.postcode
-            and self.incode == other.incode
-            and self.outcode == other.outcode
-            and self.area == other.area
-            and self.district == other.district
-            and self.sub_district == other.sub_district
-            and self.sector == other.sector
-            and self.unit == other.unit
+            self.is_in_ons_postcode_directory,
+            self.fix_distance,
+            self.original,
+            self.postcode,
+        ) < (
+            other.is_in_ons_postcode_directory,
+            other.fix_distance,
+            other.original,
+            other.postcode,
         )
 
+    def __hash__(self):
+        return hash((self.original, self.postcode))
 
-def _parse(postcode: str) -> dict:
-    """Internal function to parse postcode string using `uk_postcodes_parsing.postcode_utils`
-
-    Args:
-        postcode (str): Postcode to parse. E.g. "EC1R 1UB".
-    Returns:
-        dict: Parsed postcode.
-    """
-    if not is_valid(postcode):
-        return None
-    return {
-        "postcode": to_normalised(postcode),
-        "incode": to_incode(postcode),
-        "outcode": to_outcode(postcode),
-        "area": to_area(postcode),
-        "district": to_district(postcode),
-        "sub_district": to_sub_district(postcode),
-        "sector": to_sector(postcode),
-        "unit": to_unit(postcode),
-    }
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in FIELDS)
+        return f"Postcode({fields})"
 
 
 def parse_all_options(postcode) -> List[Postcode]:
@@ -132,18 +271,30 @@ def parse_all_options(postcode) -> List[Postcode]:
     Returns:
         Postcode: Parsed postcode.
     """
-    if postcode.strip().upper().startswith(SPECIAL_CASE_POSTCODES):  # Edge case logging
-        logger.info("Found special case postcode: %s", postcode)
-    if is_valid(postcode):
-        return [Postcode(**_parse(postcode), original=postcode)]
+    if postcode.strip().upper().startswith(SPECIAL_CASE_POSTCODES):
+        metrics.count("special_case")
+    start = metrics.clock()
+    normalised = to_normalised(postcode)
+    metrics.record("components", start)
+    if normalised is not None:
+        metrics.count("parsed")
+        return [Postcode(postcode, normalised)]
     else:
+        start = metrics.clock()
         fixed_list = fix_with_options(postcode)
-        return [
-            Postcode(**_parse(fixed_postcode), original=postcode)
-            for fixed_postcode in fixed_list
-        ]
+        metrics.record("fix", start)
+        start = metrics.clock()
+        fixed_list = [to_normalised(fixed_postcode) for fixed_postcode in fixed_list]
+        metrics.record("components", start)
+        if fixed_list:
+            metrics.count("parsed", len(fixed_list))
+            metrics.count("fixed", len(fixed_list))
+        else:
+            metrics.count("failed")
+        return [Postcode(postcode, normalised) for normalised in fixed_list]
 
 
+@memoize
 def parse(postcode: str, attempt_fix: bool = True) -> Optional[Postcode]:
     """Parse a postcode
 
@@ -153,17 +304,26 @@ def parse(postcode: str, attempt_fix: bool = True) -> Optional[Postcode]:
     Returns:
         Postcode: Parsed postcode.
     """
-    if postcode.strip().upper().startswith(SPECIAL_CASE_POSTCODES):  # Edge case logging
-        logger.info("Found special case postcode: %s", postcode)
-    if is_valid(postcode):
-        return Postcode(**_parse(postcode), original=postcode)
+    if postcode.strip().upper().startswith(SPECIAL_CASE_POSTCODES):
+        metrics.count("special_case")
+    start = metrics.clock()
+    normalised = to_normalised(postcode)
+    metrics.record("components", start)
+    if normalised is not None:
+        metrics.count("parsed")
+        return Postcode(postcode, normalised)
     if attempt_fix:
+        start = metrics.clock()
         fixed = fix(postcode)
-        if is_valid(fixed):
-            logger.info("Postcode Fixed: '%s' => '%s'", postcode, fixed)
-            return Postcode(**_parse(fixed), original=postcode)
-        logger.error("Unable to fix postcode")
-    logger.error("Failed to parse postcode: %s", postcode)
+        metrics.record("fix", start)
+        start = metrics.clock()
+        normalised = to_normalised(fixed)
+        metrics.record("components", start)
+        if normalised is not None:
+            metrics.count("parsed")
+            metrics.count("fixed")
+            return Postcode(postcode, normalised)
+    metrics.count("failed")
     return None
 
 
@@ -185,8 +345,10 @@ def parse_from_corpus(
     if try_all_fix_options and not attempt_fix:
         raise ValueError("attempt_fix must be true if try_all_fix_options is True")
 
+    start = metrics.clock()
     if attempt_fix:
         postcodes = re.findall(FIXABLE_POSTCODE_CORPUS_REGEX, text)
+        metrics.record("scan", start)
         if try_all_fix_options:
             postcodes = [parse_all_options(postcode) for postcode in postcodes]
             postcodes = [item for sublist in postcodes for item in sublist]  # Flatten
@@ -196,18 +358,103 @@ def parse_from_corpus(
         return postcodes
     else:
         postcodes = re.findall(POSTCODE_CORPUS_REGEX, text)
+        metrics.record("scan", start)
         postcodes = [parse(postcode, attempt_fix=False) for postcode in postcodes]
         postcodes = [postcode for postcode in postcodes if postcode is not None]
         return postcodes
 
 
-def is_in_ons_postcode_directory(postcode: str) -> bool:
+def iter_postcodes(
+    stream: Union[IO[str], Iterable[str]],
+    chunk_size: int = 1 << 16,
+    attempt_fix: bool = False,
+    try_all_fix_options: bool = False,
+) -> Iterator[Tuple[int, Postcode]]:
+    """Parse postcodes from a text stream, one chunk at a time.
+
+    Yields the same postcodes as `parse_from_corpus` on the whole text, without holding
+    the whole text in memory. The last `CHUNK_OVERLAP` characters of every chunk are
+    carried over to the next one, so a postcode split across two chunks is found once.
+    (Only a postcode with more than ~50 whitespace characters between its outward and
+    inward codes can be missed at a chunk boundary.)
+
+    Args:
+        stream (IO[str] | Iterable[str]): A text file object, or an iterable of strings
+            such as the lines of a file.
+        chunk_size (int): Number of characters read from a file object at a time.
+            Defaults to 65536.
+        attempt_fix (bool): Attempt to fix postcodes. Defaults to False.
+        try_all_fix_options (bool): If postcode is invalid and attempt_fix=True, this option
+            tries all possibilites to correct mistakes. See `parse_from_corpus`.
+    Returns:
+        Iterator[Tuple[int, Postcode]]: The character offset of each postcode in the
+            stream, and the parsed postcode.
+    """
+    if try_all_fix_options and not attempt_fix:
+        raise ValueError("attempt_fix must be true if try_all_fix_options is True")
+    if hasattr(stream, "read"):
+        chunks = iter(lambda: stream.read(chunk_size), "")
+    else:
+        chunks = iter(stream)
+    return _iter_postcodes(chunks, attempt_fix, try_all_fix_options)
+
+
+def _iter_postcodes(
+    chunks: Iterator[str], attempt_fix: bool, try_all_fix_options: bool
+) -> Iterator[Tuple[int, Postcode]]:
+    regex = FIXABLE_POSTCODE_CORPUS_REGEX if attempt_fix else POSTCODE_CORPUS_REGEX
+    buffer = ""
+    offset = 0  # Position of `buffer` in the stream
+    for chunk in chain(chunks, [None]):  # None marks the end of the stream
+        if chunk is not None:
+            buffer += chunk
+            # Matches ending past `limit` may still grow, so wait for the next chunk
+            limit = max(len(buffer) - CHUNK_OVERLAP, 0)
+        else:
+            limit = len(buffer)
+        carry = limit
+        start = metrics.clock()
+        matches = list(regex.finditer(buffer))
+        metrics.record("scan", start)
+        for match in matches:
+            if match.end() > limit:
+                carry = min(match.start(), limit)
+                break
+            if try_all_fix_options:
+                postcodes = parse_all_options(match.group())
+            else:
+                postcode = parse(match.group(), attempt_fix=attempt_fix)
+                postcodes = [] if postcode is None else [postcode]
+            for postcode in postcodes:
+                yield offset + match.start(), postcode
+        buffer = buffer[carry:]
+        offset += carry
+
+
+def is_in_ons_postcode_directory(postcode: str, as_of: Optional[date] = None) -> bool:
     """Check if the postcode is valid with ons directory
 
     Args:
         postcode (str): The postcode to check
+        as_of (date): Check if the postcode was in the directory on this day instead,
+            e.g. for historical documents. Defaults to None (the current release).
 
     Returns:
         bool: True if the postcode is valid, False otherwise
     """
-    return postcode in POSTCODE_MAY_2023
+    if as_of is not None:
+        return get_history().is_active(postcode, as_of)
+    return _membership(postcode)[0]
+
+
+def _membership(
+    postcode: str, snapshot: Optional[Snapshot] = None
+) -> Tuple[bool, MembershipSource]:
+    """Check if the postcode is in the directory, or the filter if enabled, of the
+    active release (or `snapshot`), and return what answered."""
+    start = metrics.clock()
+    membership = bloom.get_membership(snapshot)
+    found = postcode in membership
+    metrics.record("lookup", start)
+    metrics.count("directory_hits" if found else "directory_misses")
+    return found, membership.source
@@ -0,0 +1,19 @@
+from pathlib import Path
+
+import pytest
+
+from uk_postcodes_parsing import build, registry
+
+ONSPD_DIR = Path(__file__).parent / "data" / "ONSPD_MAY_2023_UK"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def data_dir(tmp_path_factory):
+    """Answer lookups from the data files built from the synthetic ONSPD download, so
+    the tests don't depend on the packaged data."""
+    output = tmp_path_factory.mktemp("data")
+    build.build_directory(ONSPD_DIR, output, workers=1)
+    previous = registry._active
+    registry.activate(registry.load_release(output))
+    yield output
+    registry._active = previous
@@ -1,14 +1,28 @@
+import io
+import pickle
+
+import pytest
 import pandas as pd
 
-from uk_postcodes_parsing.fix import fix
+from uk_postcodes_parsing.fix import fix, fix_with_options
+from uk_postcodes_parsing import fix as fix_module
+from uk_postcodes_parsing import postcode_utils, registry
+from uk_postcodes_parsing.directory import encode
 from uk_postcodes_parsing import ukpostcode
 from uk_postcodes_parsing.ukpostcode import (
+    iter_postcodes,
     parse_from_corpus,
     Postcode,
 )
 
 
-def test_fix():
+@pytest.fixture
+def without_corrections(monkeypatch):
+    """Fix with the patterns only, as without a correction table."""
+    monkeypatch.setitem(registry.current()._stores, "corrections", None)
+
+
+def test_fix(without_corrections):
     # Trims postcode
     assert fix(" SW1A 2AA ") == "SW1A 2AA"
     # Upper case
@@ -146,7 +160,7 @@ def test_parsing_detailed():
         assert parsed_postcode.unit == df.iloc[i][".unit"]
 
 
-def test_sort_by_fix_distance():
+def test_sort_by_fix_distance(without_corrections):
     corpus = "this EC1r 1ub followed by to one, ecir iub e0 i00"
     lst = parse_from_corpus(corpus, attempt_fix=True)
     assert sorted(lst, reverse=True) == [
@@ -197,7 +211,7 @@ def test_sort_by_fix_distance():
     ]
 
 
-def test_parse_from_corpus():
+def test_parse_from_corpus(without_corrections):
     corpus = "sso 7hg HA0 1AQ"
     lst = parse_from_corpus(corpus)
     assert lst[0].is_in_ons_postcode_directory
@@ -234,3 +248,119 @@ def test_parse_from_corpus():
     assert "O00 4SS" in lst  # LNN
     assert "OO0 4SS" in lst  # LLN
     assert "O0O 4SS" in lst  # LNL
+
+
+def test_fix_with_correction_table(monkeypatch):
+    table = fix_module.correction_table(["SS0", "HA0", "SO1", "S01", "SW10"])
+    assert table["SSO"] == ["SS0"]
+    assert table["S01"] == ["S01", "SO1"]  # What the patterns give comes first
+    assert table["SW1O"] == ["SW10"]
+    monkeypatch.setitem(registry.current()._stores, "corrections", table)
+    assert fix("sso 7hg") == "SS0 7HG"
+    assert fix("SW1O OAA") == "SW10 0AA"
+    # Not in the table: no real outcode reads like this, unlike what the patterns give
+    assert fix("SWO OAA") == "SWO OAA"
+    assert fix_with_options("SOI OAA") == ["SO1 0AA", "S01 0AA"]
+    # Only outcodes that exist
+    assert fix_with_options("OOO 4SS") == []
+
+
+def test_fix_does_not_load_the_directory(monkeypatch):
+    snapshot = registry.Snapshot(registry.current().data_dir)
+    monkeypatch.setattr(registry, "_active", snapshot)
+    assert fix("ECIR 1UB") == "EC1R 1UB"
+    assert snapshot.is_loaded("corrections") and not snapshot.is_loaded("directory")
+
+
+def test_parse_from_corpus_with_correction_table():
+    # The table of the release, built from its directory
+    assert fix_module.get_corrections() is not None
+    lst = parse_from_corpus("sso 7hg HAO 1AQ", attempt_fix=True)
+    assert [postcode.postcode for postcode in lst] == ["SS0 7HG", "HA0 1AQ"]
+    assert all(postcode.is_in_ons_postcode_directory for postcode in lst)
+    assert (
+        parse_from_corpus("OOO 4SS", attempt_fix=True, try_all_fix_options=True) == []
+    )
+
+
+def test_to_components():
+    components = postcode_utils.to_components("ec1r   1ub")
+    assert components == postcode_utils.PostcodeComponents(
+        postcode="EC1R 1UB",
+        incode="1UB",
+        outcode="EC1R",
+        area="EC",
+        district="EC1",
+        sub_district="EC1R",
+        sector="EC1R 1",
+        unit="UB",
+    )
+    assert postcode_utils.to_components("E34SS").district == "E3"
+    assert postcode_utils.to_components("AA99 9AA").sub_district is None
+    # Any whitespace between outcode and incode is dropped
+    assert postcode_utils.to_components("EC1R\t1UB").outcode == "EC1R"
+    assert postcode_utils.to_components("0W1 0AA") is None
+
+
+def test_postcode_class():
+    postcode = Postcode(original="ec1r 1ub", postcode="EC1R 1UB")
+    assert postcode == ukpostcode.parse("ec1r 1ub")
+    assert postcode.to_dict() == {
+        "is_in_ons_postcode_directory": True,
+        "fix_distance": 0,
+        "original": "ec1r 1ub",
+        "postcode": "EC1R 1UB",
+        "incode": "1UB",
+        "outcode": "EC1R",
+        "area": "EC",
+        "district": "EC1",
+        "sub_district": "EC1R",
+        "sector": "EC1R 1",
+        "unit": "UB",
+    }
+    assert postcode.code == encode("EC1R 1UB")
+    # Stores only the original and normalised strings
+    assert not hasattr(postcode, "__dict__")
+    # Hashable, so results can be deduplicated
+    corpus = "EC1R 1UB, E3 4SS, EC1R 1UB"
+    assert len(set(parse_from_corpus(corpus))) == 2
+    assert pickle.loads(pickle.dumps(postcode)) == postcode
+    # Read-only, as cached instances are shared and their hash must not change
+    for name in ("original", "postcode", "fix_distance"):
+        with pytest.raises(AttributeError):
+            setattr(postcode, name, "E3 4SS")
+    # Components given to the constructor must match the postcode
+    with pytest.raises(ValueError):
+        Postcode(original="ec1r 1ub", postcode="EC1R 1UB", area="E")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 7, 64, 10_000])
+def test_iter_postcodes(chunk_size):
+    corpus = (
+        "see ec1r   1ub , and that e34ss. But also eh16 50y and ei412 or ehi6 50y. " * 3
+    )
+    for attempt_fix, try_all_fix_options in [
+        (False, False),
+        (True, False),
+        (True, True),
+    ]:
+        postcodes = list(
+            iter_postcodes(
+                io.StringIO(corpus),
+                chunk_size=chunk_size,
+                attempt_fix=attempt_fix,
+                try_all_fix_options=try_all_fix_options,
+            )
+        )
+        assert [postcode for _, postcode in postcodes] == parse_from_corpus(
+            corpus, attempt_fix, try_all_fix_options
+        )
+        for offset, postcode in postcodes:
+            assert corpus[offset:].startswith(postcode.original)
+
+    # Any iterable of strings, e.g. the lines of a file
+    lines = ["address: EC1R", " 1UB\n", "and E3 4SS\n"]
+    assert [(offset, p.postcode) for offset, p in iter_postcodes(lines)] == [
+        (9, "EC1R 1UB"),
+        (22, "E3 4SS"),
+    ]
@@ -0,0 +1,107 @@
+from itertools import islice
+
+import pytest
+
+from uk_postcodes_parsing import bloom, registry, ukpostcode
+from uk_postcodes_parsing.batch import (
+    parse_many,
+    parse_from_corpora,
+    extract_from_files,
+    extract_from_texts,
+    _init_worker,
+)
+
+
+POSTCODES = ["EC1R 1UB", "e3 4ss", "not a postcode", "EH16 50Y", "HA0 1AQ"] * 5
+CORPORA = [
+    "sso 7hg HA0 1AQ",
+    "this is a check ec1r 1ub , and that e3 4ss. But also eh16 50y",
+    "",
+] * 5
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_many(workers):
+    expected = [ukpostcode.parse(postcode) for postcode in POSTCODES]
+    result = list(parse_many(POSTCODES, workers=workers, chunksize=3))
+    assert result == expected
+    assert [p.is_in_ons_postcode_directory for p in result if p] == [
+        p.is_in_ons_postcode_directory for p in expected if p
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_from_corpora(workers):
+    expected = [
+        ukpostcode.parse_from_corpus(text, attempt_fix=True) for text in CORPORA
+    ]
+    result = parse_from_corpora(CORPORA, attempt_fix=True, workers=workers, chunksize=2)
+    assert list(result) == expected
+
+
+def test_parse_many_is_lazy():
+    def postcodes():
+        yield "EC1R 1UB"
+        yield "E3 4SS"
+        raise AssertionError("consumed more input than needed")
+
+    assert len(list(islice(parse_many(postcodes(), workers=1, chunksize=1), 1))) == 1
+
+
+@pytest.mark.parametrize("options", [{"chunksize": 0}, {"workers": 0}])
+def test_bad_options_raise_on_the_call(options):
+    # Without iterating the results
+    with pytest.raises(ValueError):
+        parse_many(POSTCODES, **options)
+    with pytest.raises(ValueError):
+        parse_from_corpora(CORPORA, **options)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("ordered", [True, False])
+def test_extract_from_texts(workers, ordered):
+    documents = [(f"doc{i}", text) for i, text in enumerate(CORPORA)]
+    expected = [
+        (document, offset, postcode)
+        for document, text in documents
+        for offset, postcode in ukpostcode.iter_postcodes([text], attempt_fix=True)
+    ]
+    result = extract_from_texts(
+        documents, attempt_fix=True, workers=workers, chunksize=2, ordered=ordered
+    )
+    result = list(result)
+    if ordered:
+        assert result == expected
+    else:
+        assert sorted(result, key=str) == sorted(expected, key=str)
+    assert ("doc1", 16, ukpostcode.parse("ec1r 1ub")) in result
+
+
+def test_extract_from_files(tmp_path):
+    paths = []
+    for i, text in enumerate(CORPORA[:3]):
+        paths.append(tmp_path / f"{i}.txt")
+        paths[-1].write_text(text)
+    result = list(extract_from_files(paths, workers=2))
+    assert [(document, offset) for document, offset, _ in result] == [
+        (str(paths[0]), 8),
+        (str(paths[1]), 16),
+        (str(paths[1]), 36),
+    ]
+    with pytest.raises(ValueError):
+        list(extract_from_files(paths, try_all_fix_options=True))
+
+
+def test_workers_use_the_release_and_filter_of_the_parent(data_dir, monkeypatch):
+    # What a spawned worker starts from: the packaged data, no filter
+    monkeypatch.setattr(registry, "_active", registry.Snapshot())
+    snapshot = registry.Snapshot(data_dir)
+    try:
+        _init_worker(snapshot, filter_enabled=True)
+        assert registry.current() is snapshot and bloom.is_enabled()
+        assert snapshot.is_loaded("filter") and not snapshot.is_loaded("directory")
+
+        _init_worker(snapshot, filter_enabled=False)
+        assert not bloom.is_enabled() and snapshot.is_loaded("directory")
+    finally:
+        bloom.disable_filter()
@@ -0,0 +1,89 @@
+import pickle
+import random
+
+import numpy as np
+import pytest
+
+from uk_postcodes_parsing import bloom, columnar, registry, ukpostcode
+from uk_postcodes_parsing.directory import PostcodeDirectory, write_directory, encode
+
+UNITS = "ABDEFGHJLNPQRSTUWXYZ"
+
+
+@pytest.fixture
+def directory(tmp_path):
+    rng = random.Random(0)
+    postcodes = {
+        f"{rng.choice(['EC', 'SW', 'E', 'N'])}{rng.randint(1, 20)} "
+        f"{rng.randint(0, 9)}{rng.choice(UNITS)}{rng.choice(UNITS)}"
+        for _ in range(20_000)
+    }
+    write_directory(sorted(postcodes) + ["EC1R 1UB"], tmp_path / "postcodes.bin", "t")
+    return PostcodeDirectory(tmp_path / "postcodes.bin")
+
+
+@pytest.fixture
+def enabled(directory, tmp_path, monkeypatch):
+    path = tmp_path / "postcodes.bloom"
+    bloom.write_filter(directory, path, samples=1000)
+    monkeypatch.setattr(registry, "_active", registry.Snapshot(tmp_path))
+    yield bloom.enable_filter()
+    bloom.disable_filter()
+
+
+def test_filter_size():
+    assert bloom.filter_size(1_000_000, 0.01) == (9585088, 7)
+    assert bloom.filter_size(0, 0.5) == (64, 32)
+    with pytest.raises(ValueError):
+        bloom.filter_size(10, 1)
+
+
+@pytest.mark.parametrize("false_positive_rate", [0.1, 0.01, 0.001])
+def test_write_filter(directory, tmp_path, false_positive_rate):
+    path = tmp_path / "postcodes.bloom"
+    measured = bloom.write_filter(directory, path, false_positive_rate, samples=50_000)
+    postcode_filter = bloom.PostcodeFilter(path)
+    assert postcode_filter.release == "t" and len(postcode_filter) == len(directory)
+    assert postcode_filter.false_positive_rate == measured
+    assert measured == pytest.approx(false_positive_rate, rel=0.5)
+    assert path.stat().st_size < len(directory) * 4  # Smaller than the directory
+
+    # No false negatives, and the scalar and vectorised checks agree
+    assert all(postcode in postcode_filter for postcode in directory)
+    codes = np.arange(encode("E1 0AA"), encode("E1 0AA") + 20_000)
+    found = postcode_filter.contains_codes(codes)
+    assert found.tolist() == [postcode_filter.contains_code(c) for c in codes.tolist()]
+    assert found[directory.contains_codes(codes)].all()
+    assert not postcode_filter.contains_codes(np.array([-1])).any()
+    assert "not a postcode" not in postcode_filter
+
+
+def test_not_a_filter(tmp_path):
+    (tmp_path / "postcodes.bloom").write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        bloom.PostcodeFilter(tmp_path / "postcodes.bloom")
+
+
+def test_enable_filter(enabled, directory):
+    assert bloom.is_enabled() and bloom.get_membership() is enabled
+    assert ukpostcode.is_in_ons_postcode_directory("EC1R 1UB")
+
+    postcode = ukpostcode.parse("ec1r 1ub")
+    assert postcode.is_in_ons_postcode_directory
+    assert postcode.membership_is_probabilistic
+    assert pickle.loads(pickle.dumps(postcode)).membership_is_probabilistic
+    # Not being in the directory is always exact
+    missing = next(f"W1 {i}AA" for i in range(10) if f"W1 {i}AA" not in enabled)
+    postcode = ukpostcode.parse(missing)
+    assert not postcode.is_in_ons_postcode_directory
+    assert not postcode.membership_is_probabilistic
+
+    columns = columnar.parse_array(["EC1R 1UB", "nope"])
+    assert columns.in_directory.tolist() == [True, False]
+
+    bloom.disable_filter()
+    assert not bloom.is_enabled()
+    assert bloom.get_membership() is not enabled
+    postcode = ukpostcode.parse("EC1R 1UB")
+    assert postcode.is_in_ons_postcode_directory
+    assert not postcode.membership_is_probabilistic
@@ -0,0 +1,91 @@
+import json
+import shutil
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+from uk_postcodes_parsing import build, cli, registry
+from uk_postcodes_parsing.country import CountryStore
+from uk_postcodes_parsing.directory import PostcodeDirectory
+from uk_postcodes_parsing.fix import load_corrections
+from uk_postcodes_parsing.geo import CoordinateStore
+from uk_postcodes_parsing.history import PostcodeHistory
+from uk_postcodes_parsing.spatial import SpatialIndex
+
+# Synthetic download with the layout and columns of the real ONSPD
+ONSPD_DIR = Path(__file__).parent / "data" / "ONSPD_MAY_2023_UK"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_build_directory(tmp_path, workers):
+    manifest = build.build_directory(ONSPD_DIR, tmp_path, workers=workers, chunk_size=3)
+    assert manifest["release"] == "2023-05"
+    assert manifest["postcodes"] == 11  # Terminated and GIR 0AA are left out
+    assert manifest["terminated"] == 3
+    assert manifest["with_coordinates"] == 10  # EC1R 9ZZ has no grid reference
+    assert json.loads((tmp_path / build.MANIFEST_NAME).read_text()) == manifest
+    assert manifest["false_positive_rate"]["target"] == 0.01
+    assert 0 <= manifest["false_positive_rate"]["measured"] < 0.1
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        build.DATA_FILES + (build.MANIFEST_NAME,)
+    )
+
+    directory = PostcodeDirectory(tmp_path / "postcodes.bin")
+    assert directory.release == "2023-05"
+    assert "EC1R 1UB" in directory and "EH16 5AY" in directory
+    assert "EC1R 1XX" not in directory
+    coordinates = CoordinateStore(tmp_path / "coordinates.bin", directory)
+    assert coordinates.lookup("EH16 5AY") == pytest.approx((55.9306, -3.1648))
+    assert coordinates.lookup("EC1R 9ZZ") is None
+    spatial = SpatialIndex(tmp_path / "spatial.bin", coordinates)
+    assert spatial.nearest(55.93, -3.16)[0].postcode == "EH16 5AY"
+    history = PostcodeHistory(tmp_path / "history.bin", directory)
+    assert history.dates("E3 4SS") == (date(2001, 6, 1), None)
+    assert history.dates("EC1R 1XX") == (date(1985, 3, 1), date(2010, 7, 1))
+    assert history.status("EH16 5AZ") == "terminated"
+    countries = CountryStore(tmp_path / "countries.bin", directory)
+    assert countries.lookup("EH16 5AY") == "Scotland"
+    assert countries.lookup("E3 4SS") == "England"
+    corrections = load_corrections(tmp_path / "corrections.json", directory.release)
+    assert corrections["EIO"] == ["E10"] and corrections["SSO"] == ["SS0"]
+
+
+def test_verify_manifest(tmp_path):
+    build.build_directory(ONSPD_DIR, tmp_path, release="test", workers=1)
+    assert set(build.verify_manifest(tmp_path)) == set(build.DATA_FILES)
+    with open(tmp_path / "history.bin", "ab") as f:
+        f.write(b"\0")
+    with pytest.raises(ValueError):
+        build.verify_manifest(tmp_path)
+
+
+def test_release_from_path():
+    assert build.release_from_path("downloads/ONSPD_NOV_2022_UK") == "2022-11"
+    assert build.release_from_path("onspd") == ""
+
+
+def test_release_must_fit_the_headers(tmp_path):
+    for release in ("ONSPD_AUGUST_2023_UK_FULL", "2023-05\u2019", ""):
+        with pytest.raises(ValueError):
+            build.build_directory(ONSPD_DIR, tmp_path, release=release, workers=1)
+    assert not any(tmp_path.iterdir())  # Rejected before writing anything
+    build.build_directory(ONSPD_DIR, tmp_path, release="x" * 16, workers=1)
+    assert registry.load_release(tmp_path).release == "x" * 16
+
+
+def test_cli(tmp_path, capsys):
+    assert cli.main(["build-directory", str(ONSPD_DIR), "--output", str(tmp_path)]) == 0
+    assert "Wrote 11 postcodes" in capsys.readouterr().out
+    assert PostcodeDirectory(tmp_path / "postcodes.bin").release == "2023-05"
+
+    assert cli.main(["build-directory", str(tmp_path), "--output", str(tmp_path)]) == 1
+    assert "No ONSPD CSV files" in capsys.readouterr().err
+
+    # A download renamed without its release needs --release
+    onspd_dir = tmp_path / "onspd"
+    shutil.copytree(ONSPD_DIR, onspd_dir)
+    args = ["build-directory", str(onspd_dir), "--output", str(tmp_path / "out")]
+    assert cli.main(args) == 1
+    assert "No release" in capsys.readouterr().err
+    assert cli.main(args + ["--release", "2023-05"]) == 0
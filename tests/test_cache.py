@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from uk_postcodes_parsing import cache, registry, ukpostcode
+from uk_postcodes_parsing.fix import fix, fix_with_options
+
+
+@pytest.fixture
+def enabled_cache():
+    cache.enable_cache(maxsize=2)
+    yield
+    cache.disable_cache()
+
+
+def test_cache_disabled_by_default():
+    assert cache.cache_info() == {}
+    assert ukpostcode.parse("EC1R 1UB") is not ukpostcode.parse("EC1R 1UB")
+
+
+def test_cache_hits_and_evictions(enabled_cache):
+    first = ukpostcode.parse("ec1r 1ub")
+    assert ukpostcode.parse("ec1r 1ub") is first
+    # Keyed on the flags as well as the string
+    ukpostcode.parse("ec1r 1ub", attempt_fix=False)
+    ukpostcode.parse("e3 4ss")
+    assert cache.cache_info()["parse"] == cache.CacheInfo(
+        hits=1, misses=3, evictions=1, maxsize=2, currsize=2
+    )
+
+    cache.cache_clear()
+    assert cache.cache_info()["parse"].currsize == 0
+    assert ukpostcode.parse("ec1r 1ub") == first
+
+
+def test_cached_fix(enabled_cache, monkeypatch):
+    monkeypatch.setitem(
+        registry.current()._stores, "corrections", None
+    )  # Fix with the patterns
+    assert fix("SW1A OAA") == fix("SW1A OAA") == "SW1A 0AA"
+    options = fix_with_options("OOO 4SS")
+    options.clear()  # Callers can't modify the cached list
+    assert len(fix_with_options("OOO 4SS")) == 3
+    assert cache.cache_info()["fix"].hits == 1
+    assert cache.cache_info()["fix_with_options"].hits == 1
+
+
+def test_cache_is_thread_safe(enabled_cache):
+    cache.enable_cache(maxsize=16)
+    postcodes = [f"EC1R {i}UB" for i in range(10)] * 50
+
+    def work():
+        for postcode in postcodes:
+            assert ukpostcode.parse(postcode).original == postcode
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    info = cache.cache_info()["parse"]
+    assert info.hits + info.misses == 4 * len(postcodes)
+    assert info.currsize == 10
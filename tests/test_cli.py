@@ -0,0 +1,63 @@
+import io
+import csv
+import json
+
+from uk_postcodes_parsing import cli
+
+
+def test_extract_files(tmp_path, capsys):
+    (tmp_path / "a.txt").write_text("send to ec1r 1ub\nor E3 4SS\n")
+    (tmp_path / "b.txt").write_text("EH16 50Y\n")
+
+    assert cli.main(["extract", str(tmp_path / "*.txt"), "--attempt-fix"]) == 0
+    rows = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(row["document"], row["offset"], row["postcode"]) for row in rows] == [
+        (str(tmp_path / "a.txt"), 8, "EC1R 1UB"),
+        (str(tmp_path / "a.txt"), 20, "E3 4SS"),
+        (str(tmp_path / "b.txt"), 0, "EH16 5OY"),
+    ]
+    assert rows[2]["fix_distance"] == -1
+    assert rows[0]["is_in_ons_postcode_directory"] is True
+
+    args = ["extract", str(tmp_path), "--lines", "--format", "csv", "--stats"]
+    assert cli.main(args + ["--workers", "2", "--unordered"]) == 0
+    out, err = capsys.readouterr()
+    rows = list(csv.DictReader(io.StringIO(out)))
+    assert sorted((row["document"], row["postcode"]) for row in rows) == [
+        (f"{tmp_path / 'a.txt'}:1", "EC1R 1UB"),
+        (f"{tmp_path / 'a.txt'}:2", "E3 4SS"),
+    ]
+    assert err.startswith("3 documents, 2 postcodes in")
+
+
+def test_extract_stdin(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("hi EC1R 1UB and sw1a 2aa"))
+    output = tmp_path / "out.jsonl"
+    assert cli.main(["extract", "--output", str(output)]) == 0
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [(row["document"], row["offset"]) for row in rows] == [("-", 3), ("-", 16)]
+
+    # Mixed with files, stdin is streamed too, in the order of the inputs
+    (tmp_path / "a.txt").write_text("E3 4SS")
+    stdin = io.StringIO("hi EC1R 1UB\nand sw1a 2aa")
+    monkeypatch.setattr("sys.stdin", stdin)
+    args = ["extract", str(tmp_path / "a.txt"), "-", str(tmp_path / "a.txt")]
+    assert cli.main(args + ["--output", str(output), "--workers", "2"]) == 0
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [(row["document"], row["postcode"]) for row in rows] == [
+        (str(tmp_path / "a.txt"), "E3 4SS"),
+        ("-", "EC1R 1UB"),
+        ("-", "SW1A 2AA"),
+        (str(tmp_path / "a.txt"), "E3 4SS"),
+    ]
+    assert not stdin.closed
+
+    stdin = io.StringIO("hi EC1R 1UB\nand sw1a 2aa")
+    monkeypatch.setattr("sys.stdin", stdin)
+    assert cli.main(["extract", "-", "--lines", "--output", str(output)]) == 0
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [row["document"] for row in rows] == ["-:1", "-:2"]
+    assert not stdin.closed  # Left to the caller
+
+    assert cli.main(["extract", str(tmp_path / "missing.txt")]) == 1
+    assert "No such file" in capsys.readouterr().err
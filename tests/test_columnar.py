@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from uk_postcodes_parsing import ukpostcode
+from uk_postcodes_parsing.columnar import parse_array
+
+
+def test_parse_array_matches_parse():
+    values = ["ec1r 1ub", "EH16 50Y", "not a postcode", None, "ec1r 1ub", "AA9A 9AA"]
+    columns = parse_array(pd.Series(values))
+
+    assert columns.is_valid.tolist() == [True, True, False, False, True, True]
+    for i, value in enumerate(values):
+        postcode = ukpostcode.parse(value) if value else None
+        if postcode is None:
+            assert columns.postcode[i] is None
+            assert columns.sub_district[i] is None
+            continue
+        for name in ["postcode", "outcode", "incode", "area", "district"]:
+            assert getattr(columns, name)[i] == getattr(postcode, name)
+        for name in ["sub_district", "sector", "unit"]:
+            assert getattr(columns, name)[i] == getattr(postcode, name)
+        assert columns.fix_distance[i] == postcode.fix_distance
+        assert columns.in_directory[i] == postcode.is_in_ons_postcode_directory
+
+
+def test_parse_array_inputs():
+    values = np.array(["EC1R 1UB", "EC1R IUB"])
+    assert parse_array(values).postcode.tolist() == ["EC1R 1UB", "EC1R 1UB"]
+    assert parse_array(values, attempt_fix=False).is_valid.tolist() == [True, False]
+    assert len(parse_array([]).postcode) == 0
+
+    frame = pd.DataFrame(parse_array(["E3 4SS"]).to_dict())
+    assert frame.loc[0, "district"] == "E3"
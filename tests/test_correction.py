@@ -0,0 +1,39 @@
+import pytest
+
+from uk_postcodes_parsing.directory import PostcodeDirectory, write_directory
+from uk_postcodes_parsing.correction import Correction, Corrector, confusion_matrix
+
+
+@pytest.fixture
+def corrector(tmp_path):
+    path = tmp_path / "postcodes.bin"
+    postcodes = ["EC1R 1UB", "EC1R 1US", "E3 4SS", "SS0 7HG", "S50 7HG", "B8 1AA"]
+    write_directory(postcodes, path)
+    return Corrector(PostcodeDirectory(path))
+
+
+def test_correct(corrector):
+    assert corrector.correct("EC1R 1UB") == [Correction("EC1R 1UB", 1.0)]
+    # I => 1 twice, 8 => B: 0.9 * 0.9 * 0.8
+    assert corrector.correct("ecir iu8") == [Correction("EC1R 1UB", 0.648)]
+    # Both readings are real postcodes, the exact one scores higher
+    assert corrector.correct("5S0 7HG") == [
+        Correction("SS0 7HG", 0.8),
+        Correction("S50 7HG", 0.64),
+    ]
+    assert corrector.correct("5S0 7HG", k=1) == [Correction("SS0 7HG", 0.8)]
+    assert corrector.correct("BB IAA") == [Correction("B8 1AA", 0.72)]
+
+
+def test_correct_only_returns_real_postcodes(corrector):
+    assert corrector.correct("EC1R 1UZ") == []
+    assert corrector.correct("XX1 1XX") == []
+    assert corrector.correct("EC1") == []
+    assert corrector.correct("") == []
+
+
+def test_confusion_matrix():
+    matrix = confusion_matrix([("0", "O", 0.9)])
+    assert matrix == {"0": {"O": 0.9}, "O": {"0": 0.9}}
+    with pytest.raises(ValueError):
+        confusion_matrix([("0", "O", 1.5)])
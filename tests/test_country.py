@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from uk_postcodes_parsing import country
+from uk_postcodes_parsing.directory import PostcodeDirectory, write_directory
+
+
+@pytest.fixture
+def store(tmp_path):
+    postcodes = ["EC1R 1UB", "EH16 5AY", "CF10 1AA", "BT1 1AA", "GY1 1AA"]
+    write_directory(postcodes, tmp_path / "postcodes.bin", "t")
+    directory = PostcodeDirectory(tmp_path / "postcodes.bin")
+    ons_codes = ["E92000001", "S92000003", "W92000004", "N92000002", "", "E92000001"]
+    # Postcodes not in the directory are skipped, unknown codes are stored as unknown
+    written = country.write_countries(
+        directory, postcodes + ["ZZ1 1ZZ"], ons_codes, tmp_path / "countries.bin"
+    )
+    assert written == 4
+    return country.CountryStore(tmp_path / "countries.bin", directory)
+
+
+def test_lookup(store):
+    assert store.lookup("EC1R 1UB") == "England"
+    assert store.lookup("EH16 5AY") == "Scotland"
+    assert store.lookup("BT1 1AA") == "Northern Ireland"
+    assert store.lookup("GY1 1AA") is None  # No country
+    assert store.lookup("ZZ1 1ZZ") is None  # Not in the directory
+    assert store.lookup("not a postcode") is None
+
+
+def test_indices(store):
+    # Directory order: BT1 1AA, CF10 1AA, EC1R 1UB, EH16 5AY, GY1 1AA
+    indices = store.indices(np.array([-1, 0, 1, 2, 3, 4]))
+    assert indices.dtype == np.uint8
+    names = [country.COUNTRIES[i] for i in indices]
+    assert names == [None, "Northern Ireland", "Wales", "England", "Scotland", None]
+
+
+def test_store_must_match_directory(store, tmp_path):
+    write_directory(["EC1R 1UB"], tmp_path / "other.bin", "t")
+    with pytest.raises(ValueError):
+        country.CountryStore(store.path, PostcodeDirectory(tmp_path / "other.bin"))
+
+
+def test_country_index():
+    assert country.COUNTRIES[country.country_index("S92000003")] == "Scotland"
+    assert country.country_index(" W92000004 ") == 2
+    assert country.country_index("S99999999") == 0
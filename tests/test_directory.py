@@ -0,0 +1,226 @@
+import pickle
+import multiprocessing
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from uk_postcodes_parsing.directory import (
+    PostcodeDirectory,
+    write_directory,
+    encode,
+    decode,
+    encode_many,
+    decode_many,
+    code_range,
+    MAX_CODE,
+    _write_codes,
+)
+
+SMAPS = Path("/proc/self/smaps_rollup")
+
+
+def test_encode_round_trip():
+    for postcode in ["A9 9AA", "A99 9AA", "A9A 9AA", "AA9 9AA", "AA99 9AA", "AA9A 9AA"]:
+        assert decode(encode(postcode)) == postcode
+    # Only normalised postcodes can be encoded
+    assert encode("ec1r 1ub") is None
+    assert encode("EC1R1UB") is None
+    assert encode("GIR 0AA") is None
+
+
+def test_encode_keeps_hierarchy_contiguous():
+    postcodes = ["E1 6AN", "E10 5AA", "E1W 1AA", "E2 7AA", "EC1R 1UB", "EC1A 1BB"]
+    ordered = sorted(postcodes, key=encode)
+    # District E1 (including sub-district E1W) sorts before E10
+    assert ordered == ["E1 6AN", "E1W 1AA", "E10 5AA", "E2 7AA", "EC1A 1BB", "EC1R 1UB"]
+
+
+def test_encode_many():
+    postcodes = ["A9 9AA", "A99 9AA", "A9A 9AA", "AA9 9AA", "AA99 9AA", "AA9A 9AA"]
+    postcodes += ["ZZ99 9ZZ", "EC1R 1UB", "E1W 1AA"]
+    invalid = ["ec1r 1ub", "EC1R1UB", "GIR 0AA", "EC1R  1UB", "E1A1 1AA", "", None]
+    codes = encode_many(postcodes + invalid)
+    assert codes.dtype == np.int64
+    assert codes.tolist() == [encode(p) for p in postcodes] + [-1] * len(invalid)
+    assert codes.max() < MAX_CODE
+    assert decode_many(codes).tolist() == postcodes + [""] * len(invalid)
+    assert decode_many([MAX_CODE]).tolist() == [""]
+    assert len(encode_many([])) == 0 and len(decode_many([])) == 0
+
+
+def test_code_range():
+    start, stop = code_range("EC1R 1")
+    codes = encode_many(["EC1R 0ZZ", "EC1R 1AA", "EC1R 1ZZ", "EC1R 2AA"])
+    assert ((codes >= start) & (codes < stop)).tolist() == [False, True, True, False]
+    # District E1 includes sub-district E1W, but not E10
+    start, stop = code_range("E1")
+    assert start <= encode("E1W 1AA") < stop <= encode("E10 5AA")
+    assert code_range("EC1R 1U") is None
+
+
+def test_directory_lookup(tmp_path):
+    path = tmp_path / "postcodes.bin"
+    postcodes = ["EC1R 1UB", "E3 4SS", "HA0 1AQ", "SW1A 2AA"]
+    assert write_directory(postcodes + ["HA0 1AQ"], path, release="test") == 4
+
+    directory = PostcodeDirectory(path)
+    assert directory.release == "test"
+    assert len(directory) == 4
+    assert sorted(directory) == sorted(postcodes)
+    for postcode in postcodes:
+        assert postcode in directory
+    assert "SW1A 2AB" not in directory
+    assert "ec1r 1ub" not in directory  # Expects normalised format
+    assert "" not in directory
+
+    code = encode("E3 4SS")
+    codes = np.array([code, code + 2**32, -1, MAX_CODE])
+    # Codes out of range don't wrap onto real ones
+    assert directory.positions(codes).tolist() == [directory.position(code), -1, -1, -1]
+    assert directory.contains_codes(codes).tolist() == [True, False, False, False]
+
+
+def test_empty_directory(tmp_path):
+    path = tmp_path / "postcodes.bin"
+    write_directory([], path)
+    directory = PostcodeDirectory(path)
+    assert len(directory) == 0
+    assert "EC1R 1UB" not in directory
+
+
+def test_directory_loaded_on_first_read(data_dir, monkeypatch):
+    from uk_postcodes_parsing import directory, registry, ukpostcode
+
+    monkeypatch.setattr(registry, "_active", registry.Snapshot(data_dir))
+    postcode = ukpostcode.parse("HA0 1AQ")
+    assert postcode.postcode == "HA0 1AQ"
+    assert not directory.is_loaded()
+    assert postcode.is_in_ons_postcode_directory
+    assert directory.is_loaded()
+
+
+def test_preload_in_background(data_dir, monkeypatch):
+    from uk_postcodes_parsing import directory, registry, ukpostcode
+
+    monkeypatch.setattr(registry, "_active", registry.Snapshot(data_dir))
+    thread = ukpostcode.preload(background=True)
+    thread.join()
+    assert directory.is_loaded()
+    # Once loaded, the directory flag is filled in eagerly
+    postcode = ukpostcode.parse("HA0 1AQ")
+    assert hasattr(postcode, "_is_in_ons_postcode_directory")
+
+
+def test_directory_outcodes(tmp_path):
+    path = tmp_path / "postcodes.bin"
+    write_directory(["E1W 1AA", "E1 6AN", "E1 6AW", "E10 5AA", "EC1R 1UB"], path)
+    directory = PostcodeDirectory(path)
+    assert directory.outcodes() == ["E1", "E1W", "E10", "EC1R"]
+
+    start = encode("E1 6AA")
+    assert directory.index_range(start, start + 676) == (0, 2)
+    start = encode("E1 7AA")
+    assert directory.index_range(start, start + 676) == (2, 2)
+
+
+def test_directory_prefix_queries(tmp_path):
+    path = tmp_path / "postcodes.bin"
+    postcodes = ["E1 6AN", "E1 6AW", "E1W 1AA", "E10 5AA", "EC1R 1UB", "EC1R 3AA"]
+    write_directory(postcodes, path)
+    directory = PostcodeDirectory(path)
+
+    assert directory.postcodes_in("E") == ["E1 6AN", "E1 6AW", "E1W 1AA", "E10 5AA"]
+    # District E1 includes sub-district E1W, but not district E10
+    assert directory.postcodes_in("E1") == ["E1 6AN", "E1 6AW", "E1W 1AA"]
+    assert directory.postcodes_in("E1W") == ["E1W 1AA"]
+    assert directory.postcodes_in("EC1R 1") == ["EC1R 1UB"]
+    assert directory.postcodes_in("EC1R 1UB") == ["EC1R 1UB"]
+    assert directory.postcodes_in("EC1R 2") == []
+    assert directory.postcodes_in("e1") == []
+    assert directory.count("EC") == 2
+    assert directory.count("EC1R") == 2
+    assert directory.count("not a prefix") == 0
+
+    assert directory.exists_outcode("E1")
+    assert directory.exists_outcode("E1W")
+    assert not directory.exists_outcode("E2")
+    assert not directory.exists_outcode("E1W 1")
+    assert directory.exists_sector("EC1R 3")
+    assert not directory.exists_sector("EC1R 2")
+    assert not directory.exists_sector("EC1R")
+
+
+def test_directory_complete(tmp_path):
+    path = tmp_path / "postcodes.bin"
+    postcodes = ["E1 6AN", "E1 6AW", "E1W 1AA", "E10 5AA", "E3 4SS", "EC1R 1UB"]
+    write_directory(postcodes, path)
+    directory = PostcodeDirectory(path)
+
+    assert directory.complete("e1") == ["E1 6AN", "E1 6AW", "E1W 1AA", "E10 5AA"]
+    assert directory.complete("E1 ") == ["E1 6AN", "E1 6AW"]
+    assert directory.complete("e1  6a", limit=1) == ["E1 6AN"]
+    assert directory.complete("E", limit=2) == ["E1 6AN", "E1 6AW"]
+    assert directory.complete("EC1R 1UB") == ["EC1R 1UB"]
+    assert directory.complete("EC2") == []
+    assert directory.complete("1") == []
+
+
+def test_pickle_shares_the_file(tmp_path):
+    path = tmp_path / "postcodes.bin"
+    write_directory(["EC1R 1UB", "E3 4SS"], path, release="test")
+    directory = PostcodeDirectory(path)
+    data = pickle.dumps(directory)
+    assert len(data) < 200  # The path, not the postcodes
+    copy = pickle.loads(data)
+    assert copy.path == path and copy.release == "test"
+    assert list(copy) == list(directory)
+
+
+def _memory() -> dict:
+    """Resident and anonymous (private heap) memory of this process, in bytes."""
+    fields = dict(line.split(":") for line in SMAPS.read_text().splitlines()[1:])
+    return {name: int(fields[name].split()[0]) * 1024 for name in ("Rss", "Anonymous")}
+
+
+def _worker(directory: PostcodeDirectory, barrier, results) -> None:
+    before = _memory()
+    directory = pickle.loads(directory)
+    directory.warm()
+    found = sum(directory.contains_code(code) for code in range(0, 20_000, 7))
+    barrier.wait()  # All workers have the file mapped
+    after = _memory()
+    results.put(
+        (found, after["Rss"] - before["Rss"], after["Anonymous"] - before["Anonymous"])
+    )
+
+
+@pytest.mark.skipif(
+    not SMAPS.exists() or "fork" not in multiprocessing.get_all_start_methods(),
+    reason="Needs Linux",
+)
+def test_workers_share_directory_pages(tmp_path):
+    path = tmp_path / "postcodes.bin"
+    _write_codes(range(0, 4_000_000, 2), path)  # 2M postcodes, 8 MB
+    data = pickle.dumps(PostcodeDirectory(path))
+    context = multiprocessing.get_context("fork")
+    workers = 4
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(data, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    measured = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+
+    size = path.stat().st_size
+    for found, rss, anonymous in measured:
+        assert found == len(range(0, 20_000, 14))
+        # Every page of the file is resident in each worker, but shared: the private
+        # heap of a worker grows by a tiny fraction of the directory
+        assert rss > 0.9 * size
+        assert anonymous < 0.05 * size
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from uk_postcodes_parsing import enrich
+from uk_postcodes_parsing.directory import encode
+
+
+def test_encode_column():
+    values = [" ec1r1ub", "EH16\t5AY", "e10  5ab", "SW1A\xa02AA", "EC1R 1UB"]
+    invalid = [None, float("nan"), 12, "", "not a postcode", "GIR 0AA", "E" * 40]
+    # Whitespace inside the outward or inward code, rejected by `to_normalised` too
+    invalid += ["E C1R1UB", "EC1R1 UB", "EC1R 1 UB"]
+    codes = enrich.encode_column(pd.Series(values + invalid + ["ecir 1ub"]))
+    expected = [encode(p) for p in ["EC1R 1UB", "EH16 5AY", "E10 5AB", "SW1A 2AA"]]
+    assert codes.tolist() == expected + [encode("EC1R 1UB")] + [-1] * 11
+    fixed = enrich.encode_column(["ecir 1ub", "ecir 1ub", None], attempt_fix=True)
+    assert fixed.tolist() == [encode("EC1R 1UB")] * 2 + [-1]
+
+
+def test_lookup():
+    values = ["eh16 5ay", "EC1R 1XX", "EC1R 9ZZ", "ZZ1 1ZZ", None]
+    columns = enrich.lookup(values, enrich.ATTRIBUTES)
+    assert columns["postcode"].tolist() == [
+        "EH16 5AY",
+        "EC1R 1XX",
+        "EC1R 9ZZ",
+        "ZZ1 1ZZ",
+        None,
+    ]
+    assert columns["in_directory"].tolist() == [True, False, True, False, False]
+    assert columns["status"].tolist() == [
+        "active",
+        "terminated",
+        "active",
+        "unknown",
+        "unknown",
+    ]
+    # Only postcodes in the directory have a country (EC1R 9ZZ has no coordinates)
+    assert columns["country"].tolist() == ["Scotland", None, "England", None, None]
+    assert columns["latitude"][0] == pytest.approx(55.9306)
+    assert np.isnan(columns["latitude"][1:]).all()  # EC1R 9ZZ has no coordinates
+    with pytest.raises(ValueError):
+        enrich.lookup(values, ["population"])
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100_000])
+def test_enrich_dataframe(chunk_size):
+    df = pd.DataFrame(
+        {"id": [1, 2, 3, 4], "pc": ["E3 4SS", "eh165ay", "oops", "EC1R 1XX"]},
+        index=[10, 20, 30, 40],
+    )
+    enriched = enrich.enrich(df, "pc", chunk_size=chunk_size)
+    assert list(df.columns) == ["id", "pc"]  # Not modified
+    assert list(enriched.columns) == [
+        "id",
+        "pc",
+        "pc_country",
+        "pc_latitude",
+        "pc_longitude",
+        "pc_status",
+    ]
+    assert enriched.index.tolist() == [10, 20, 30, 40]
+    assert enriched["pc_country"].tolist() == ["England", "Scotland", None, None]
+    assert enriched["pc_status"].tolist() == [
+        "active",
+        "active",
+        "unknown",
+        "terminated",
+    ]
+    assert enriched["pc_longitude"].iloc[1] == pytest.approx(-3.1648)
+
+    renamed = enrich.enrich(df, "pc", ["in_directory"], prefix="")
+    assert renamed["in_directory"].tolist() == [True, True, False, False]
+    assert list(enrich.enrich(df.iloc[:0], "pc").columns) == list(enriched.columns)
+
+
+def test_iter_enrich():
+    df = pd.DataFrame({"pc": ["E3 4SS", "oops", "EH16 5AY"] * 3})
+    chunks = [df.iloc[i : i + 4] for i in range(0, len(df), 4)]
+    enriched = pd.concat(enrich.iter_enrich(chunks, "pc", ["country"]))
+    pd.testing.assert_frame_equal(enriched, enrich.enrich(df, "pc", ["country"]))
+
+
+def test_enrich_arrow():
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table({"pc": ["E3 4SS", None, "eh16 5ay"]})
+    enriched = enrich.enrich(table, "pc", ["country", "latitude"])
+    assert enriched.column_names == ["pc", "pc_country", "pc_latitude"]
+    assert enriched.column("pc_country").to_pylist() == ["England", None, "Scotland"]
+    assert enriched.column("pc_latitude").null_count == 1
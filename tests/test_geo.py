@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+import pytest
+
+from uk_postcodes_parsing import geo, registry, ukpostcode
+from uk_postcodes_parsing.directory import PostcodeDirectory, encode, write_directory
+
+COORDINATES = {
+    "EC1R 1UB": (51.5236, -0.1100),
+    "SW1A 2AA": (51.5034, -0.1276),
+    "EH16 5AY": (55.9306, -3.1648),
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    write_directory(list(COORDINATES) + ["E3 4SS"], tmp_path / "postcodes.bin", "t")
+    directory = PostcodeDirectory(tmp_path / "postcodes.bin")
+    latitudes, longitudes = zip(*COORDINATES.values())
+    # Postcodes not in the directory and unknown (ONSPD 99.999999) latitudes are skipped
+    written = geo.write_coordinates(
+        directory,
+        list(COORDINATES) + ["ZZ1 1ZZ", "E3 4SS"],
+        latitudes + (50.0, 99.999999),
+        longitudes + (0.0, 0.0),
+        tmp_path / "coordinates.bin",
+    )
+    assert written == 3
+    return geo.CoordinateStore(tmp_path / "coordinates.bin", directory)
+
+
+def test_lookup(store):
+    latitude, longitude = store.lookup("EH16 5AY")
+    assert latitude == pytest.approx(55.9306) and longitude == pytest.approx(-3.1648)
+    assert store.lookup("E3 4SS") is None  # No coordinates
+    assert store.lookup("ZZ1 1ZZ") is None  # Not in the directory
+    assert store.lookup("eh16 5ay") is None
+
+
+def test_geocode(store):
+    postcodes = ["SW1A 2AA", "E3 4SS", "not a postcode", ukpostcode.parse("EC1R 1UB")]
+    latitudes, longitudes = store.geocode(np.array(postcodes, dtype=object))
+    assert latitudes.dtype == np.float32
+    assert latitudes[[0, 3]] == pytest.approx([51.5034, 51.5236])
+    assert longitudes[[0, 3]] == pytest.approx([-0.1276, -0.1100])
+    assert np.isnan(latitudes[1:3]).all() and np.isnan(longitudes[1:3]).all()
+    # Arrays of strings are encoded at once
+    strings = np.array(postcodes[:3] + ["EC1R 1UB"])
+    assert np.array_equal(store.geocode(strings)[0], latitudes, equal_nan=True)
+
+
+def test_at(store):
+    latitudes, longitudes = store.arrays()
+    assert len(latitudes) == len(store.directory) and not latitudes.flags.writeable
+    position = store.directory.position(encode("SW1A 2AA"))
+    at = store.at(np.array([position, -1]))
+    assert at[0][0] == latitudes[position] and at[1][0] == longitudes[position]
+    assert np.isnan(at[0][1]) and np.isnan(at[1][1])
+
+
+def test_store_must_match_directory(store, tmp_path):
+    write_directory(["EC1R 1UB"], tmp_path / "other.bin", "t")
+    with pytest.raises(ValueError):
+        geo.CoordinateStore(store.path, PostcodeDirectory(tmp_path / "other.bin"))
+
+
+def test_distances(store, monkeypatch):
+    monkeypatch.setitem(registry.current()._stores, "coordinates", store)
+    # Clerkenwell to Downing Street, and London to Edinburgh
+    distances = geo.distance_matrix(["EC1R 1UB", "SW1A 2AA"], ["SW1A 2AA", "EH16 5AY"])
+    assert distances.shape == (2, 2)
+    assert distances[0, 0] == pytest.approx(2.56, abs=0.01)
+    assert distances[1, 0] == 0
+    assert distances[0, 1] == pytest.approx(529.5, abs=1)
+    assert geo.pairwise_distance(["EC1R 1UB", "E3 4SS"], ["SW1A 2AA"] * 2)[
+        0
+    ] == pytest.approx(distances[0, 0])
+    assert math.isnan(geo.pairwise_distance(["E3 4SS"], ["SW1A 2AA"])[0])
+    with pytest.raises(ValueError):
+        geo.pairwise_distance(["EC1R 1UB"], [])
+
+    postcode = ukpostcode.parse("ec1r 1ub")
+    assert postcode.latitude == pytest.approx(51.5236)
+    assert postcode.longitude == pytest.approx(-0.1100)
+    assert ukpostcode.parse("E3 4SS").latitude is None
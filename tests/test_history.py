@@ -0,0 +1,103 @@
+from datetime import date, datetime
+
+import pytest
+
+from uk_postcodes_parsing import history, registry, ukpostcode
+from uk_postcodes_parsing.directory import (
+    PostcodeDirectory,
+    encode_many,
+    write_directory,
+)
+
+
+@pytest.fixture
+def postcode_history(tmp_path):
+    write_directory(["EC1R 1UB", "E3 4SS", "SW1A 2AA"], tmp_path / "postcodes.bin", "t")
+    directory = PostcodeDirectory(tmp_path / "postcodes.bin")
+    rows = [
+        ("EC1R 1UB", date(1980, 1, 1), None),
+        ("E3 4SS", datetime(2001, 6, 15), None),
+        ("SW1A 2AA", None, None),
+        ("EC1R 1XX", date(1985, 3, 1), date(2010, 7, 1)),
+        ("EC1R 1XY", float("nan"), datetime(1999, 12, 31, 23, 59)),
+        ("EC1R 1XZ", date(1990, 1, 1), None),  # Not active and never terminated
+    ]
+    written = history.write_history(directory, *zip(*rows), tmp_path / "history.bin")
+    assert written == (2, 2)
+    return history.PostcodeHistory(tmp_path / "history.bin", directory)
+
+
+def test_status_and_dates(postcode_history):
+    assert postcode_history.status("EC1R 1UB") == history.ACTIVE
+    assert postcode_history.status("EC1R 1XX") == history.TERMINATED
+    assert postcode_history.status("EC1R 1XZ") == history.UNKNOWN
+    assert postcode_history.status("not a postcode") == history.UNKNOWN
+
+    assert postcode_history.dates("E3 4SS") == (date(2001, 6, 15), None)
+    assert postcode_history.dates("EC1R 1XX") == (date(1985, 3, 1), date(2010, 7, 1))
+    assert postcode_history.dates("EC1R 1XY") == (None, date(1999, 12, 31))
+    assert postcode_history.dates("ZZ1 1ZZ") == (None, None)
+
+
+def test_statuses(postcode_history):
+    codes = encode_many(["EC1R 1UB", "EC1R 1XY", "EC1R 1XZ", "ZZ1 1ZZ", "oops"])
+    assert postcode_history.statuses(codes).tolist() == [
+        history.ACTIVE,
+        history.TERMINATED,
+        history.UNKNOWN,
+        history.UNKNOWN,
+        history.UNKNOWN,
+    ]
+
+
+def test_is_active(postcode_history):
+    assert postcode_history.is_active("E3 4SS", date(2001, 6, 15))
+    assert not postcode_history.is_active("E3 4SS", date(2001, 6, 14))
+    assert postcode_history.is_active("SW1A 2AA", date(1971, 1, 1))  # Unknown start
+    assert postcode_history.is_active("EC1R 1XX", datetime(2010, 6, 30, 12))
+    assert not postcode_history.is_active("EC1R 1XX", date(2010, 7, 1))
+    assert not postcode_history.is_active("EC1R 1XX", date(1985, 2, 28))
+    assert postcode_history.is_active("EC1R 1XY", date(1980, 1, 1))
+    assert not postcode_history.is_active("EC1R 1XZ", date(2000, 1, 1))
+
+
+def test_write_history_from_arrays(postcode_history, tmp_path):
+    np = pytest.importorskip("numpy")
+    directory = postcode_history.directory
+    codes = encode_many(["EC1R 1UB", "EC1R 1XX", "E3 4SS", "EC1R 1XX", "nope"])
+    introduced = np.array([100, 200, 300, 400, 500], dtype=np.uint16)
+    terminated = np.array([0, 900, 0, 1000, 600], dtype=np.uint16)
+    args = (directory, codes, introduced, terminated)
+    # Same file as from Python values, the last row of a postcode winning
+    assert history._write_history(*args, tmp_path / "a.bin") == (2, 1)
+    positions = directory.positions(codes)
+    assert history._write_history_arrays(
+        directory, positions, *args[1:], tmp_path / "b.bin"
+    ) == (2, 1)
+    assert (tmp_path / "a.bin").read_bytes() == (tmp_path / "b.bin").read_bytes()
+    written = history.PostcodeHistory(tmp_path / "b.bin", directory)
+    assert written.dates("EC1R 1XX") == (
+        history._to_date(400),
+        history._to_date(1000),
+    )
+
+
+def test_history_must_match_directory(postcode_history, tmp_path):
+    write_directory(["EC1R 1UB"], tmp_path / "other.bin", "t")
+    with pytest.raises(ValueError):
+        history.PostcodeHistory(
+            postcode_history.path, PostcodeDirectory(tmp_path / "other.bin")
+        )
+    with pytest.raises(ValueError):
+        history.write_history(
+            postcode_history.directory, ["E3 4SS"], [date(1960, 1, 1)], [None]
+        )
+
+
+def test_postcode_status(postcode_history, monkeypatch):
+    monkeypatch.setitem(registry.current()._stores, "history", postcode_history)
+    assert ukpostcode.parse("ec1r 1ub").status == "active"
+    assert ukpostcode.parse("EC1R 1XX").status == "terminated"
+    assert ukpostcode.parse("EC1R 1XZ").status == "unknown"
+    assert ukpostcode.is_in_ons_postcode_directory("EC1R 1XX", as_of=date(2000, 1, 1))
+    assert not ukpostcode.is_in_ons_postcode_directory("EC1R 1XX")
@@ -0,0 +1,69 @@
+import logging
+
+import pytest
+
+from uk_postcodes_parsing import cache, metrics, ukpostcode
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    cache.disable_cache()
+    metrics.reset()
+    yield
+    metrics.disable_timing()
+    metrics.reset()
+
+
+def test_counters():
+    ukpostcode.parse("EC1R 1UB")
+    ukpostcode.parse("ecir iub")
+    ukpostcode.parse("not a postcode")
+    ukpostcode.parse("GIR 0AA", attempt_fix=False)
+    ukpostcode.is_in_ons_postcode_directory("EC1R 1UB")
+    ukpostcode.is_in_ons_postcode_directory("ZZ1 1ZZ")
+    counters = metrics.snapshot()["counters"]
+    assert counters["parsed"] == 2
+    assert counters["fixed"] == 1
+    assert counters["failed"] == 2  # "GIR 0AA" isn't a standard postcode
+    assert counters["special_case"] == 1
+    assert counters["directory_hits"] >= 1 and counters["directory_misses"] >= 1
+    metrics.reset()
+    assert set(metrics.snapshot()["counters"].values()) == {0}
+
+
+def test_timing_is_opt_in():
+    ukpostcode.parse_from_corpus("check ec1r 1ub and ecir iub", attempt_fix=True)
+    assert metrics.snapshot()["timers"] == {}
+
+    calls = []
+    metrics.enable_timing(lambda stage, seconds: calls.append((stage, seconds)))
+    postcodes = ukpostcode.parse_from_corpus(
+        "check ec1r 1ub and ecir iub", attempt_fix=True
+    )
+    [postcode.is_in_ons_postcode_directory for postcode in postcodes]
+    list(ukpostcode.iter_postcodes(["check e3 4ss"]))
+    timers = metrics.snapshot()["timers"]
+    assert set(timers) == set(metrics.STAGES)
+    # `iter_postcodes` scans its chunk, then what is left at the end of the stream
+    assert timers["scan"].count == 3 and timers["fix"].count == 1
+    assert 0 <= timers["fix"].max <= timers["fix"].total
+    assert len(calls) == sum(timer.count for timer in timers.values())
+
+    metrics.disable_timing()
+    ukpostcode.parse("e3 4ss")
+    assert metrics.snapshot()["timers"] == timers
+
+    # Started while timing was disabled: not timed from the epoch of perf_counter
+    start = metrics.clock()
+    metrics.enable_timing()
+    metrics.record("fix", start)
+    metrics.disable_timing()
+    assert metrics.snapshot()["timers"] == timers
+
+
+def test_no_logging_per_call(caplog):
+    with caplog.at_level(logging.DEBUG):
+        ukpostcode.parse("not a postcode")
+        ukpostcode.parse("ecir iub")
+        ukpostcode.parse("GIR 0AA")
+    assert caplog.records == []
@@ -0,0 +1,210 @@
+import gc
+import shutil
+import threading
+import weakref
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from uk_postcodes_parsing import (
+    bloom,
+    build,
+    cache,
+    directory,
+    enrich,
+    fix,
+    geo,
+    history,
+    registry,
+    spatial,
+    ukpostcode,
+)
+from uk_postcodes_parsing.country import get_countries
+
+ONSPD_DIR = Path(__file__).parent / "data" / "ONSPD_MAY_2023_UK"
+VALUES = ["E3 4SS", "EC1R 1UB", "EH16 5AY", "E1 6AN", "SW1A 2AA", "nope"]
+
+
+@pytest.fixture(scope="module")
+def releases(tmp_path_factory):
+    """Two releases built from the synthetic ONSPD download. The second one drops the
+    E1 postcodes, so the positions of the postcodes after them differ."""
+    output = tmp_path_factory.mktemp("releases")
+    onspd_dir = output / "ONSPD_AUG_2023_UK"
+    shutil.copytree(ONSPD_DIR, onspd_dir)
+    csv = next(onspd_dir.rglob("*_E.csv"))
+    lines = csv.read_text().splitlines(keepends=True)
+    csv.write_text("".join(line for line in lines if not line.startswith("E1")))
+    build.build_directory(ONSPD_DIR, output / "2023-05", "2023-05", workers=1)
+    build.build_directory(onspd_dir, output / "2023-08", "2023-08", workers=1)
+    return output
+
+
+@pytest.fixture(autouse=True)
+def restore(monkeypatch):
+    """Put the active release back after each test."""
+    monkeypatch.setattr(registry, "_active", registry._active)
+    yield
+    bloom.disable_filter()
+    cache.disable_cache()
+
+
+def test_reload(releases):
+    before = ukpostcode.parse("EC1R 1UB")
+    assert before.release == registry.current().release
+
+    assert registry.reload(releases / "2023-08") == "2023-08"
+    snapshot = registry.current()
+    assert snapshot.release == "2023-08"
+    assert directory.get_directory() is snapshot.directory
+    assert geo.get_coordinates().directory is snapshot.directory
+    assert get_countries() is snapshot.countries
+    assert history.get_history() is snapshot.history
+    assert spatial.get_spatial_index() is snapshot.spatial_index
+    assert fix.get_corrections() is snapshot.corrections
+
+    postcode = ukpostcode.parse("EC1R 9ZZ")
+    assert postcode.is_in_ons_postcode_directory and postcode.release == "2023-08"
+    assert postcode.status == "active"
+    assert before.release != "2023-08"  # Kept from the release that answered
+
+
+def test_snapshot_opens_files_on_first_use(releases):
+    snapshot = registry.Snapshot(releases / "2023-08")
+    assert snapshot.release == "2023-08"
+    assert not snapshot.is_loaded("directory")
+    assert "E1 6AN" not in snapshot.coordinates.directory
+    assert snapshot.is_loaded("directory") and snapshot.is_loaded("coordinates")
+
+
+def test_in_flight_lookups_keep_their_release(releases):
+    registry.reload(releases / "2023-05")
+    old = directory.get_directory()
+    old_ref = weakref.ref(old)
+    registry.reload(releases / "2023-08")
+    assert "E1 6AN" in old and old.release == "2023-05"
+    assert "E1 6AN" not in directory.get_directory()
+
+    # The old release is unmapped once nothing uses it
+    del old
+    gc.collect()
+    assert old_ref() is None
+
+
+def test_postcode_lookups_use_the_release_that_answered(releases):
+    registry.reload(releases / "2023-05")
+    postcode = ukpostcode.parse("E1 6AN")
+    assert postcode.is_in_ons_postcode_directory
+    registry.reload(releases / "2023-08")
+    # Not in the new release, but the coordinates and status match the answer
+    assert postcode.coordinates == (postcode.latitude, postcode.longitude)
+    assert postcode.latitude is not None and postcode.status == "active"
+    assert ukpostcode.parse("E1 6AN").latitude is None
+
+
+def test_parse_during_reload(releases):
+    registry.reload(releases / "2023-05")
+    stop = threading.Event()
+    answered = []
+
+    def parse():
+        while not stop.is_set():
+            postcode = ukpostcode.parse("E1 6AN")
+            answered.append((postcode.is_in_ons_postcode_directory, postcode.release))
+
+    thread = threading.Thread(target=parse)
+    thread.start()
+    for i in range(20):
+        registry.reload(releases / ("2023-08", "2023-05")[i % 2], verify=False)
+    stop.set()
+    thread.join()
+    assert answered and set(answered) <= {(True, "2023-05"), (False, "2023-08")}
+
+
+def test_activate_during_first_load(releases):
+    for _ in range(20):
+        registry.activate(registry.Snapshot(releases / "2023-05"))
+        new = registry.load_release(releases / "2023-08", verify=False)
+        barrier = threading.Barrier(2)
+        loaded = []
+
+        def first_load():
+            barrier.wait()
+            loaded.append(geo.get_coordinates())
+
+        thread = threading.Thread(target=first_load)
+        thread.start()
+        barrier.wait()
+        registry.activate(new, warm=False)
+        thread.join()
+        # Whichever release the first load saw, it can't replace the new one
+        assert loaded[0].directory.release in ("2023-05", "2023-08")
+        assert directory.get_directory() is new.directory
+        assert geo.get_coordinates() is new.coordinates
+
+
+def test_enrich_during_reload(releases):
+    snapshots = [
+        registry.load_release(releases / release) for release in ("2023-05", "2023-08")
+    ]
+    attributes = ("in_directory", "country", "latitude")
+    expected = []
+    for snapshot in snapshots:
+        registry.activate(snapshot)
+        expected.append(enrich.lookup(VALUES * 100, attributes))
+    assert expected[0]["in_directory"].tolist() != expected[1]["in_directory"].tolist()
+
+    stop = threading.Event()
+    results = []
+
+    def lookup():
+        while not stop.is_set():
+            results.append(enrich.lookup(VALUES * 100, attributes))
+
+    thread = threading.Thread(target=lookup)
+    thread.start()
+    for i in range(50):
+        registry.activate(snapshots[i % 2], warm=False)
+    stop.set()
+    thread.join()
+    assert results
+    for columns in results:
+        # Every row answered by a single release
+        assert any(
+            all(
+                np.array_equal(columns[name], answer[name], name == "latitude")
+                for name in attributes
+            )
+            for answer in expected
+        )
+
+
+def test_reload_keeps_filter_and_clears_cache(releases):
+    registry.reload(releases / "2023-05")
+    bloom.enable_filter()
+    cache.enable_cache()
+    assert ukpostcode.parse("EC1R 9ZZ").release == "2023-05"
+
+    registry.reload(releases / "2023-08")
+    postcode = ukpostcode.parse("EC1R 9ZZ")
+    assert postcode.release == "2023-08" and postcode.membership_is_probabilistic
+    assert bloom.get_membership() is registry.current().filter
+
+
+def test_reload_rejects_bad_release(releases, tmp_path):
+    registry.reload(releases / "2023-05")
+    for name in build.DATA_FILES + (build.MANIFEST_NAME,):
+        (tmp_path / name).write_bytes((releases / "2023-08" / name).read_bytes())
+    with open(tmp_path / "coordinates.bin", "r+b") as f:
+        f.seek(-1, 2)
+        f.write(b"\xff")
+    with pytest.raises(ValueError):
+        registry.reload(tmp_path)
+    assert registry.current().release == "2023-05"  # Nothing swapped
+
+    (tmp_path / "postcodes.bloom").unlink()
+    bloom.enable_filter()
+    with pytest.raises(ValueError):
+        registry.reload(tmp_path, verify=False)
+    assert registry.current().release == "2023-05"
@@ -0,0 +1,96 @@
+import mmap
+import random
+
+import pytest
+
+from uk_postcodes_parsing import ukpostcode
+from uk_postcodes_parsing.scanner import scan, scan_file
+
+CORPORA = [
+    "sso 7hg HA0 1AQ",
+    "this is a check ec1r 1ub , and that e3 4ss. But also eh16 50y",
+    "SW1A2AA, sw1a oaa and E1W 1AA\nE10 5AA\te1 6an",
+    "",
+]
+
+
+@pytest.mark.parametrize("attempt_fix", [False, True])
+@pytest.mark.parametrize("text", CORPORA)
+def test_same_as_parse_from_corpus(text, attempt_fix):
+    found = list(scan(text, attempt_fix=attempt_fix))
+    assert [postcode for _, _, postcode in found] == ukpostcode.parse_from_corpus(
+        text, attempt_fix=attempt_fix
+    )
+    for start, end, postcode in found:
+        assert text[start:end] == postcode.original
+
+
+def test_fixable_matches_are_not_split():
+    text = "send to EHI6 5AY"
+    assert [p.postcode for p in ukpostcode.parse_from_corpus(text)] == ["HI6 5AY"]
+    assert list(scan(text)) == []
+    assert [p.postcode for _, _, p in scan(text, attempt_fix=True)] == ["EH16 5AY"]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_spans_of_noisy_text(seed):
+    rng = random.Random(seed)
+    text = "".join(rng.choice("AEHSW01O5IUB  \n") for _ in range(2000))
+    found = list(scan(text, attempt_fix=True))
+    assert found
+    for (_, end, _), (start, _, _) in zip(found, found[1:]):
+        assert end <= start
+    for start, end, postcode in found:
+        assert text[start:end] == postcode.original
+    strict = list(scan(text))
+    assert all(postcode.fix_distance == 0 for _, _, postcode in strict)
+    assert set(strict) <= set(found)
+
+
+@pytest.mark.parametrize("convert", [bytes, bytearray, memoryview])
+def test_byte_buffers(convert):
+    text = "£100 to ec1r 1ub, café at sw1a oaa"
+    data = text.encode("utf-8")
+    found = list(scan(convert(data), attempt_fix=True))
+    assert [postcode.postcode for _, _, postcode in found] == ["EC1R 1UB", "SW1A 0AA"]
+    for start, end, postcode in found:
+        assert data[start:end].decode() == postcode.original
+    # Offsets are in bytes, after the 2-byte pound sign and e acute
+    assert [start for start, _, _ in found] == [
+        data.index(b"ec1r"),
+        data.index(b"sw1a"),
+    ]
+
+
+def test_mmap_and_file(tmp_path):
+    path = tmp_path / "ocr.txt"
+    path.write_text(CORPORA[1])
+    expected = [
+        (start, end, postcode) for start, end, postcode in scan(CORPORA[1], True)
+    ]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        assert list(scan(m, attempt_fix=True)) == expected
+    assert list(scan_file(path, attempt_fix=True)) == expected
+    (tmp_path / "empty.txt").write_bytes(b"")
+    assert list(scan_file(tmp_path / "empty.txt")) == []
+
+
+def test_try_all_fix_options():
+    text = "ecir iub"
+    expected = ukpostcode.parse_from_corpus(text, True, try_all_fix_options=True)
+    found = list(scan(text.encode(), True, try_all_fix_options=True))
+    assert [postcode for _, _, postcode in found] == expected
+    assert {(start, end) for start, end, _ in found} == {(0, 8)}
+    with pytest.raises(ValueError):
+        list(scan(text, try_all_fix_options=True))
+
+
+def test_word_boundaries():
+    text = "ref XEC1R 1UB7, order 12E3 4SS and EC1R 1UB."
+    assert [p.postcode for _, _, p in scan(text)] == ["EC1R 1UB", "E3 4SS", "EC1R 1UB"]
+    found = list(scan(text, word_boundaries=True))
+    assert [(start, postcode.postcode) for start, _, postcode in found] == [
+        (text.rindex("EC1R"), "EC1R 1UB")
+    ]
+    found = list(scan(text.encode(), word_boundaries=True))
+    assert [postcode.postcode for _, _, postcode in found] == ["EC1R 1UB"]
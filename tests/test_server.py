@@ -0,0 +1,175 @@
+import json
+import threading
+from http.client import HTTPConnection
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import quote, urlsplit
+from urllib.request import Request, urlopen
+
+import pytest
+
+from uk_postcodes_parsing import bloom, metrics, registry, ukpostcode
+from uk_postcodes_parsing.server import MicroBatcher, PostcodeServer
+
+
+@pytest.fixture(scope="module")
+def url():
+    server = PostcodeServer(("127.0.0.1", 0), max_delay=0.01)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://%s:%s" % server.server_address[:2]
+    server.shutdown()
+    server.server_close()
+
+
+def get(url, path):
+    with urlopen(url + path) as response:
+        return json.load(response)["result"]
+
+
+def post(url, path, body):
+    request = Request(url + path, json.dumps(body).encode(), method="POST")
+    with urlopen(request) as response:
+        return json.load(response)["result"]
+
+
+def test_parse(url):
+    assert get(url, "/parse?postcode=" + quote("ec1r 1ub")) == (
+        ukpostcode.parse("ec1r 1ub").to_dict()
+    )
+    assert get(url, "/parse?postcode=" + quote("ecir iub")) == (
+        ukpostcode.parse("ecir iub").to_dict()
+    )
+    assert get(url, "/parse?attempt_fix=false&postcode=" + quote("ecir iub")) is None
+    assert post(url, "/parse", {"postcode": "E3 4SS"})["postcode"] == "E3 4SS"
+
+
+def test_validate(url):
+    result = get(url, "/validate?postcode=" + quote("ec1r 1ub"))
+    assert result == {
+        "postcode": "ec1r 1ub",
+        "is_valid": True,
+        "normalised": "EC1R 1UB",
+        "is_in_ons_postcode_directory": True,
+    }
+    result = get(url, "/validate?postcode=nope")
+    assert not result["is_valid"] and not result["is_in_ons_postcode_directory"]
+
+
+def test_extract(url):
+    text = "this is a check ec1r 1ub , and that e3 4ss. But also eh16 50y"
+    expected = [p.to_dict() for p in ukpostcode.parse_from_corpus(text, True)]
+    assert post(url, "/extract", {"text": text, "attempt_fix": True}) == expected
+    assert get(url, "/extract?attempt_fix=true&text=" + quote(text)) == expected
+
+
+def test_batch_endpoints(url):
+    postcodes = ["EC1R 1UB", "nope", "e3 4ss", "EC1R 1UB"]
+    assert post(url, "/parse/batch", {"postcodes": postcodes}) == [
+        None if p is None else p.to_dict() for p in map(ukpostcode.parse, postcodes)
+    ]
+    metrics.reset()
+    validated = post(url, "/validate/batch", {"postcodes": postcodes})
+    assert [v["is_valid"] for v in validated] == [True, False, True, True]
+    # Looked up like `parse` does, once per distinct postcode
+    assert metrics.snapshot()["counters"]["directory_hits"] == 2
+    texts = ["sso 7hg HA0 1AQ", ""]
+    result = post(url, "/extract/batch", {"texts": texts, "attempt_fix": True})
+    assert result == [
+        [p.to_dict() for p in ukpostcode.parse_from_corpus(text, True)]
+        for text in texts
+    ]
+    assert len(result[0]) > 0
+
+
+def test_concurrent_requests_are_batched(url):
+    postcodes = ["EC1R 1UB", "E3 4SS", "HA0 1AQ", "SW1A 2AA"] * 16
+    with ThreadPoolExecutor(16) as executor:
+        results = list(
+            executor.map(lambda p: get(url, "/parse?postcode=" + quote(p)), postcodes)
+        )
+    assert [result["postcode"] for result in results] == postcodes
+    stats = get(url, "/stats")
+    assert stats["batches"]["parse"]["mean_size"] > 1
+    assert stats["endpoints"]["/parse"]["count"] >= len(postcodes)
+    assert (
+        0
+        < stats["endpoints"]["/parse"]["p50_ms"]
+        <= stats["endpoints"]["/parse"]["p99_ms"]
+    )
+
+
+@pytest.mark.parametrize(
+    "path, body, status",
+    [
+        ("/parse", None, 400),
+        ("/parse", {"postcode": 1}, 400),
+        ("/parse/batch", {"postcodes": "EC1R 1UB"}, 400),
+        ("/extract", {"text": "", "try_all_fix_options": True}, 400),
+        ("/nope", None, 404),
+    ],
+)
+def test_errors(url, path, body, status):
+    data = None if body is None else json.dumps(body).encode()
+    with pytest.raises(HTTPError) as error:
+        urlopen(Request(url + path, data, method="GET" if body is None else "POST"))
+    assert error.value.code == status
+    assert "error" in json.load(error.value)
+
+
+@pytest.mark.parametrize(
+    "length, status",
+    [
+        ("abc", 400),
+        ("-1", 400),
+        ("1.5", 400),
+        (str(PostcodeServer.max_body_size + 1), 413),
+    ],
+)
+def test_bad_content_length(url, length, status):
+    address = urlsplit(url)
+    connection = HTTPConnection(address.hostname, address.port, timeout=5)
+    connection.putrequest("POST", "/parse")
+    connection.putheader("Content-Length", length)
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == status and "error" in json.load(response)
+    connection.close()
+
+
+def test_bugs_are_internal_errors(url, monkeypatch):
+    def parse(postcode, attempt_fix=True):
+        raise KeyError(postcode)
+
+    monkeypatch.setattr(ukpostcode, "parse", parse)
+    with pytest.raises(HTTPError) as error:
+        post(url, "/parse", {"postcode": "EC1R 1UB"})
+    assert error.value.code == 500  # Not a missing endpoint
+
+
+def test_server_loads_only_the_filter_if_enabled(data_dir, monkeypatch):
+    snapshot = registry.Snapshot(data_dir)
+    monkeypatch.setattr(registry, "_active", snapshot)
+    bloom.enable_filter()
+    try:
+        server = PostcodeServer(("127.0.0.1", 0))
+        server.server_close()
+    finally:
+        bloom.disable_filter()
+    assert snapshot.is_loaded("filter") and not snapshot.is_loaded("directory")
+
+
+def test_micro_batcher():
+    batches = []
+
+    def double(items):
+        batches.append(items)
+        return [2 * item for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_delay=0.05)
+    futures = [batcher.submit(i) for i in range(10)]
+    assert [future.result() for future in futures] == [2 * i for i in range(10)]
+    batcher.close()
+    assert all(len(batch) <= 4 for batch in batches) and len(batches) < 10
+    with pytest.raises(RuntimeError):
+        batcher.submit(1)
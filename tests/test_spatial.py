@@ -0,0 +1,73 @@
+import random
+
+import numpy as np
+import pytest
+
+from uk_postcodes_parsing import geo, spatial
+from uk_postcodes_parsing.directory import PostcodeDirectory, write_directory, decode
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("spatial")
+    rng = random.Random(0)
+    postcodes = sorted({decode(rng.randrange(2**30)) for _ in range(2000)})
+    write_directory(postcodes, tmp_path / "postcodes.bin", "t")
+    directory = PostcodeDirectory(tmp_path / "postcodes.bin")
+    # Points around London, plus one in the Channel Islands and one off the grid
+    latitudes = [rng.uniform(51.3, 51.7) for _ in postcodes[2:]] + [49.2, 45.0]
+    longitudes = [rng.uniform(-0.5, 0.3) for _ in postcodes[2:]] + [-2.1, -2.0]
+    geo.write_coordinates(
+        directory, postcodes, latitudes, longitudes, tmp_path / "coordinates.bin"
+    )
+    coordinates = geo.CoordinateStore(tmp_path / "coordinates.bin", directory)
+    assert spatial.write_spatial_index(coordinates, tmp_path / "spatial.bin") == 2000
+    return spatial.SpatialIndex(tmp_path / "spatial.bin", coordinates)
+
+
+def brute_force(index, latitude, longitude):
+    latitudes, longitudes = index.coordinates.geocode(list(index.coordinates.directory))
+    distances = geo.haversine(latitude, longitude, latitudes, longitudes)
+    order = np.argsort(distances, kind="stable")
+    return [index.coordinates.directory[i] for i in order], distances[order]
+
+
+@pytest.mark.parametrize("point", [(51.5, -0.1), (51.31, 0.29), (52.5, -1.9), (0, 0)])
+def test_nearest_matches_brute_force(index, point):
+    postcodes, distances = brute_force(index, *point)
+    neighbours = index.nearest(*point, k=5)
+    assert [neighbour.postcode for neighbour in neighbours] == postcodes[:5]
+    assert [neighbour.distance for neighbour in neighbours] == pytest.approx(
+        distances[:5]
+    )
+
+
+@pytest.mark.parametrize("km", [0.5, 2, 10, 50])
+def test_within_radius_matches_brute_force(index, km):
+    postcodes, distances = brute_force(index, 51.5, -0.1)
+    neighbours = index.within_radius(51.5, -0.1, km)
+    assert [neighbour.postcode for neighbour in neighbours] == [
+        postcode for postcode, distance in zip(postcodes, distances) if distance <= km
+    ]
+
+
+def test_points_outside_the_grid(index):
+    assert index.nearest(49.2, -2.1)[0].distance == pytest.approx(0, abs=1e-3)
+    assert index.nearest(45.0, -2.0)[0].distance == pytest.approx(0, abs=1e-3)
+    assert index.within_radius(45.0, -2.0, 1)[0].distance == pytest.approx(0, abs=1e-3)
+
+
+def test_batches(index):
+    latitudes, longitudes = [51.5, 51.6, 49.2], [-0.1, 0.0, -2.1]
+    postcodes, distances = index.nearest_many(latitudes, longitudes, k=3)
+    assert postcodes.shape == distances.shape == (3, 3)
+    for i, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+        assert list(postcodes[i]) == [
+            neighbour.postcode for neighbour in index.nearest(latitude, longitude, k=3)
+        ]
+    assert index.within_radius_many(latitudes, longitudes, 2) == [
+        index.within_radius(latitude, longitude, 2)
+        for latitude, longitude in zip(latitudes, longitudes)
+    ]
+    postcodes, distances = index.nearest_many([51.5], [-0.1], k=2001)
+    assert postcodes[0, -1] is None and np.isnan(distances[0, -1])